@@ -20,11 +20,14 @@
 
 import httpx
 from fastapi import APIRouter
+from fastapi import Query
+from fastapi.concurrency import run_in_threadpool
 from fastapi_sqlalchemy import db
 from fastapi_utils.cbv import cbv
 from logger import LoggerFactory
 
 from api.api_manifest.service import Manifest
+from api.api_manifest.utils import create_attributes
 from config import ConfigClass
 from models import attributes as models
 from models import manifest
@@ -32,12 +35,13 @@ from models.base_models import APIResponse
 from models.base_models import EAPIResponseCode
 from models.manifest_sql import DataAttributeModel
 from resources.error_handler import catch_internal
+from resources.http_clients import http_clients
+from resources.job_manager import JobQueueFull
+from resources.job_manager import attach_jobs
 
-from .utils import attach_attributes
-from .utils import get_file_node_bygeid
-from .utils import get_files_recursive
-from .utils import get_folder_node_bygeid
+from .utils import attach_attributes_bygeids
 from .utils import has_valid_attributes
+from .utils import run_attach_job
 
 router = APIRouter()
 _API_NAMESPACE = "file_attributes_restful"
@@ -51,7 +55,7 @@ class AttachAttributes:
 
     @router.post('/files/attributes/attach', summary="Attach attributes on file", tags=['files'])
     @catch_internal(_API_NAMESPACE)
-    def post(self, data: models.AttachAttributesPOST):
+    async def post(self, data: models.AttachAttributesPOST, async_: bool = Query(False, alias='async')):
         api_response = models.AttachPOSTResponse()
         self._logger.info(f"file data payload: {data}")
 
@@ -59,7 +63,7 @@ class AttachAttributes:
         global_entity_id = data.global_entity_id
         attributes = data.attributes
 
-        manifest = Manifest.get_by_id(manifest_id)
+        manifest = await run_in_threadpool(Manifest.get_by_id, manifest_id)
         if not manifest:
             api_response.code = EAPIResponseCode.bad_request
             api_response.error_msg = "can not get manifest data with manifest_id: {}".format(
@@ -68,88 +72,49 @@ class AttachAttributes:
             return api_response.json_response()
         self._logger.info(f"file manifest: {manifest}")
 
-        sql_attributes = manifest['attributes']
-        result_list = []
-
-        valid, error_msg = has_valid_attributes(sql_attributes, attributes)
+        valid, error_msg = await run_in_threadpool(has_valid_attributes, manifest_id, attributes)
         if not valid:
             api_response.code = EAPIResponseCode.bad_request
             api_response.error_msg = error_msg
             return api_response.json_response()
 
-        for geid in global_entity_id:
-            file_node = get_file_node_bygeid(geid)
-
-            if not file_node:
-                folder_node = get_folder_node_bygeid(geid)
-                child_files = get_files_recursive(geid, [])
-                if len(child_files) == 0:
-                    continue
-
-                for child_file in child_files:
-                    # Make sure it's Greenroom file
-                    if "manifest_id" in child_file:
-                        result_list.append({
-                            "name": child_file["name"],
-                            "geid": child_file["global_entity_id"],
-                            "operation_status": "TERMINATED",
-                            "error_type": "attributes_duplicate"
-                        })
-                        continue
-
-                    is_success = attach_attributes(
-                        manifest, attributes, child_file, self._logger)
-                    if is_success:
-                        result_list.append({
-                            "name": child_file["name"],
-                            "geid": child_file["global_entity_id"],
-                            "operation_status": "SUCCEED"
-                        })
-                    else:
-                        result_list.append({
-                            "name": child_file["name"],
-                            "geid": child_file["global_entity_id"],
-                            "operation_status": "TERMINATED",
-                            "error_type": "internal_error"
-                        })
-            else:
-                if "manifest_id" in file_node:
-                    result_list.append({
-                        "name": file_node["name"],
-                        "geid": file_node["global_entity_id"],
-                        "operation_status": "TERMINATED",
-                        "error_type": "attributes_duplicate"
-                    })
-                    continue
-
-                is_success = attach_attributes(
-                    manifest, attributes, file_node, self._logger)
-
-                if is_success:
-                    result_list.append({
-                        "name": file_node["name"],
-                        "geid": file_node["global_entity_id"],
-                        "operation_status": "SUCCEED"
-                    })
-                else:
-                    result_list.append({
-                        "name": file_node["name"],
-                        "geid": file_node["global_entity_id"],
-                        "operation_status": "TERMINATED",
-                        "error_type": "internal_error"
-                    })
+        if async_:
+            try:
+                job = attach_jobs.submit(run_attach_job, manifest, attributes, global_entity_id, self._logger)
+            except JobQueueFull as e:
+                api_response.code = EAPIResponseCode.too_many_requests
+                api_response.error_msg = str(e)
+                return api_response.json_response()
+            api_response.result = {"job_id": job.job_id, "status": job.status}
+            api_response.code = EAPIResponseCode.success
+            return api_response.json_response()
 
+        result_list = await attach_attributes_bygeids(manifest, attributes, global_entity_id, self._logger)
         api_response.result = result_list
         api_response.code = EAPIResponseCode.success
         api_response.total = len(result_list)
 
         return api_response.json_response()
 
+    @router.get('/files/attributes/attach/jobs/{job_id}', response_model=models.AttachJobGETResponse,
+                summary="Get the status of an asynchronous attach job", tags=['files'])
+    @catch_internal(_API_NAMESPACE)
+    async def get_job(self, job_id: str):
+        api_response = models.AttachJobGETResponse()
+        job = attach_jobs.get(job_id)
+        if not job:
+            api_response.code = EAPIResponseCode.not_found
+            api_response.error_msg = attach_jobs.describe_missing(job_id)
+            return api_response.json_response()
+        api_response.result = job.to_dict()
+        api_response.total = job.processed
+        return api_response.json_response()
+
 
 @cbv(router)
 class RestfulAttributes:
     @router.post('/attributes', response_model=manifest.POSTAttributesResponse, summary="Bulk create attributes", tags=['attributes'])
-    def post(self, data: manifest.POSTAttributesRequest):
+    async def post(self, data: manifest.POSTAttributesRequest):
         api_response = APIResponse()
         attributes = data.attributes
         for item in attributes:
@@ -165,11 +130,10 @@ class RestfulAttributes:
 
             # check if connect to any files
             if not model_data["optional"]:
-                with httpx.Client() as client:
-                    response = client.post(
-                        ConfigClass.NEO4J_SERVICE_V1 + "nodes/File/query/count",
-                        json={"manifest_id": model_data["manifest_id"]}
-                    )
+                response = await http_clients.neo4j.post(
+                    ConfigClass.NEO4J_SERVICE_V1 + "nodes/File/query/count",
+                    json={"manifest_id": model_data["manifest_id"]}
+                )
                 try:
                     response.raise_for_status()
                 except httpx.HTTPError as exc:
@@ -180,10 +144,7 @@ class RestfulAttributes:
                     api_response.result = "Can't add required attributes to manifest attached to files"
                     _logger.error(api_response.result)
                     return api_response.json_response()
-            attribute = DataAttributeModel(**model_data)
-            db.session.add(attribute)
-            db.session.commit()
-            db.session.refresh(attribute)
+            await run_in_threadpool(create_attributes, [model_data])
         api_response.result = "Success"
         return api_response.json_response()
 
@@ -215,6 +176,7 @@ class RestfulAttribute:
         db.session.add(attribute)
         db.session.commit()
         db.session.refresh(attribute)
+        Manifest.invalidate(manifest_id=attribute.manifest_id)
         my_res.result = attribute.to_dict()
         return my_res.json_response()
 
@@ -231,7 +193,9 @@ class RestfulAttribute:
             _logger.error(my_res.error_msg)
             return my_res.json_response()
 
+        manifest_id = attribute.manifest_id
         db.session.delete(attribute)
         db.session.commit()
+        Manifest.invalidate(manifest_id=manifest_id)
         my_res.result = "Success"
         return my_res.json_response()
@@ -18,50 +18,35 @@
 # permissions and limitations under the Licence.
 # 
 
+import asyncio
 import time
 
 import httpx
 from logger import LoggerFactory
 
+from api.api_manifest.service import Manifest
 from config import ConfigClass
+from models.meta import invalidate_file_meta
+from resources.folder_traversal import walk_folder_files
+from resources.http_clients import http_clients
+from resources.node_ids import node_ids
 
 logger = LoggerFactory(__name__).get_logger()
 
 
-def get_file_node_bygeid(geid):
-    post_data = {"global_entity_id": geid, "archived": False}
-    with httpx.Client() as client:
-        response = client.post(
-            ConfigClass.NEO4J_SERVICE_V1 + f"nodes/File/query",
-            json=post_data
-        )
+async def get_nodes_bygeids(geids):
+    response = await http_clients.neo4j.post(
+        ConfigClass.NEO4J_SERVICE_V1 + "nodes/query/geids",
+        json={"geids": geids}
+    )
     try:
         response.raise_for_status()
     except httpx.HTTPError as exc:
         logger.error("HTTP Exception", exc_info=True)
         raise exc
-
-    if not response.json():
-        return None
-    return response.json()[0]
-
-
-def get_folder_node_bygeid(geid):
-    post_data = {"global_entity_id": geid, "archived": False}
-    with httpx.Client() as client:
-        response = client.post(
-            ConfigClass.NEO4J_SERVICE_V1 + f"nodes/Folder/query",
-            json=post_data
-        )
-    try:
-        response.raise_for_status()
-    except httpx.HTTPError as exc:
-        logger.error("HTTP Exception", exc_info=True)
-        raise exc
-
-    if not response.json():
-        return None
-    return response.json()[0]
+    nodes = response.json()["result"]
+    node_ids.remember(nodes)
+    return {node["global_entity_id"]: node for node in nodes}
 
 
 def is_valid_file(file_node, project_role, username):
@@ -80,30 +65,15 @@ def is_valid_file(file_node, project_role, username):
         return True
 
 
-def has_valid_attributes(attributes, received_attributes):
-    for attr in attributes:
-        if not attr["optional"] and not attr["name"] in received_attributes:
-            return False, "Missing required attribute"
-        if attr["type"] == "multiple_choice":
-            value = received_attributes.get(attr["name"])
-            if value:
-                if not value in attr["value"].split(","):
-                    return False, "Invalid choice field"
-            else:
-                if not attr["optional"]:
-                    return False, "Field required"
-        if attr["type"] == "text":
-            value = received_attributes.get(attr["name"])
-            if value:
-                if len(value) > 100:
-                    return False, "text too long"
-            else:
-                if not attr["optional"]:
-                    return False, "Field required"
-    return True, ""
-
-
-def attach_attributes(manifest, attributes, file_node, _logger):
+def has_valid_attributes(manifest_id, received_attributes):
+    validator = Manifest.get_validator(manifest_id)
+    if not validator:
+        return True, ""
+    return validator.validate(received_attributes)
+
+
+def build_attribute_updates(manifest, attributes):
+    """Build the Neo4j properties and the ES attributes for an attach; they are the same for every file."""
     post_data = {
         "manifest_id": manifest['id'],
     }
@@ -136,17 +106,15 @@ def attach_attributes(manifest, attributes, file_node, _logger):
                 "name": manifest['name'],
                 "value": value
             })
+    return post_data, es_attributes
+
+
+async def attach_attributes(file_node, post_data, es_attributes, _logger):
     file_id = file_node["id"]
-    with httpx.Client() as client:
-        response = client.put(
-            ConfigClass.NEO4J_SERVICE_V1 + f"nodes/File/node/{file_id}",
-            json=post_data
-        )
-    try:
-        response.raise_for_status()
-    except httpx.HTTPError as exc:
-        logger.error("HTTP Exception", exc_info=True)
-        raise exc
+    response = await http_clients.neo4j.put(
+        ConfigClass.NEO4J_SERVICE_V1 + f"nodes/File/node/{file_id}",
+        json=post_data
+    )
     if response.status_code != 200:
         _logger.error('Update Neo4j Node failed: {}'.format(response.text))
         return False
@@ -159,16 +127,10 @@ def attach_attributes(manifest, attributes, file_node, _logger):
             "time_lastmodified": time.time()
         }
     }
-    with httpx.Client() as client:
-        es_res = client.put(
-            ConfigClass.PROVENANCE_SERVICE_V1 + 'entity/file',
-            json=es_payload
-        )
-    try:
-        es_res.raise_for_status()
-    except httpx.HTTPError as exc:
-        logger.error("HTTP Exception", exc_info=True)
-        raise exc
+    es_res = await http_clients.provenance.put(
+        ConfigClass.PROVENANCE_SERVICE_V1 + 'entity/file',
+        json=es_payload
+    )
     if es_res.status_code != 200:
         _logger.error('Update Elastic Search Entity failed: {}'.format(es_res.text))
         return False
@@ -176,38 +138,90 @@ def attach_attributes(manifest, attributes, file_node, _logger):
     return True
 
 
-def get_files_recursive(folder_geid, all_files=[]):
-    payload = {
-        "start_label": "Folder",
-        "end_labels": ["File", "Folder"],
-        "query": {
-            "start_params": {
-                "global_entity_id": folder_geid,
-            },
-            "end_params": {
-                "Folder": {
-                    "archived": False
-                },
-                "File": {
-                    "archived": False
-                }
-            }
-        }
+async def attach_attributes_batch(manifest, attributes, file_nodes, _logger):
+    """Attach attributes to a batch of files, at most ATTRIBUTE_ATTACH_CONCURRENCY files in flight.
+
+    Returns one boolean per file, in the order of file_nodes. A failed update only fails its own file.
+    """
+    post_data, es_attributes = build_attribute_updates(manifest, attributes)
+    semaphore = asyncio.Semaphore(ConfigClass.ATTRIBUTE_ATTACH_CONCURRENCY)
+
+    async def attach(file_node):
+        async with semaphore:
+            try:
+                return await attach_attributes(file_node, post_data, es_attributes, _logger)
+            except httpx.HTTPError:
+                _logger.error("HTTP Exception", exc_info=True)
+                return False
+
+    return await asyncio.gather(*[attach(file_node) for file_node in file_nodes])
+
+
+def attach_result(file_node, error_type=None):
+    result = {
+        "name": file_node["name"],
+        "geid": file_node["global_entity_id"],
+        "operation_status": "TERMINATED" if error_type else "SUCCEED",
     }
-    with httpx.Client() as client:
-        resp = client.post(
-            ConfigClass.NEO4J_SERVICE_V2 + "relations/query",
-            json=payload
-        )
-    try:
-        resp.raise_for_status()
-    except httpx.HTTPError as exc:
-        logger.error("HTTP Exception", exc_info=True)
-        raise exc
-    for node in resp.json()["results"]:
-        if "File" in node["labels"]:
-            all_files.append(node)
-        else:
-            get_files_recursive(node["global_entity_id"], all_files=all_files)
+    if error_type:
+        result["error_type"] = error_type
+    return result
+
+
+async def attach_attributes_bygeids(manifest, attributes, geids, _logger, on_result=None):
+    """Attach attributes to the given files and to every file below the given folders.
+
+    All geids are resolved with a single lookup, folders are walked level by level, and files without a manifest
+    are attached in batches of ATTRIBUTE_ATTACH_BATCH_SIZE. Returns the per-file result list, in walk order;
+    on_result, if given, is called with each result as soon as it is known.
+    """
+    nodes = await get_nodes_bygeids(geids)
+    result_list = []
+    pending = []
+    # the files below a folder may sit in another project than the folder itself
+    updated_projects = set()
+
+    async def flush():
+        succeeded = await attach_attributes_batch(manifest, attributes, [node for _, node in pending], _logger)
+        for (index, file_node), is_success in zip(pending, succeeded):
+            result_list[index] = attach_result(file_node, None if is_success else "internal_error")
+            if is_success:
+                updated_projects.add(file_node.get("project_code"))
+            if on_result:
+                on_result(result_list[index])
+        pending.clear()
+
+    async def add(file_node):
+        if "manifest_id" in file_node:
+            result_list.append(attach_result(file_node, "attributes_duplicate"))
+            if on_result:
+                on_result(result_list[-1])
+            return
+        # keep the slot so results stay in walk order once the batch is written
+        result_list.append(None)
+        pending.append((len(result_list) - 1, file_node))
+        if len(pending) >= ConfigClass.ATTRIBUTE_ATTACH_BATCH_SIZE:
+            await flush()
 
-    return all_files
+    try:
+        for geid in geids:
+            node = nodes.get(geid)
+            if not node or node.get("archived"):
+                continue
+            if "File" in node["labels"]:
+                await add(node)
+            elif "Folder" in node["labels"]:
+                async for child_file in walk_folder_files(geid):
+                    await add(child_file)
+        if pending:
+            await flush()
+    finally:
+        # files written before a failure midway are changed all the same
+        invalidate_file_meta(updated_projects)
+    return result_list
+
+
+async def run_attach_job(job, manifest, attributes, geids, _logger):
+    result_list = await attach_attributes_bygeids(manifest, attributes, geids, _logger, on_result=job.add_result)
+    # progress arrives in completion order; keep the final list in walk order like the synchronous response
+    job.results = result_list
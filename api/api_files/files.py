@@ -19,35 +19,58 @@
 # 
 
 import math
-import os
 import time
 import copy
 
-import httpx
 from fastapi import APIRouter
-from fastapi_sqlalchemy import db
+from fastapi.concurrency import run_in_threadpool
 from fastapi_utils.cbv import cbv
 from logger import LoggerFactory
 
+from api.api_files.utils import INCLUDE_TOTAL_MODES
+from api.api_files.utils import build_file_entity
+from api.api_files.utils import build_trash_es_update
+from api.api_files.utils import build_trash_file
 from api.api_files.utils import check_attributes
+from api.api_files.utils import check_input_file
+from api.api_files.utils import create_files_batch
+from api.api_files.utils import create_trash_batch
+from api.api_files.utils import count_relations
 from api.api_files.utils import get_file_node_bygeid
+from api.api_files.utils import greenroom_attributes
 from api.api_files.utils import has_valid_attributes
 from api.api_files.utils import get_container_id
+from api.api_files.utils import listing_count_key
+from api.api_manifest.service import Manifest
+from api.api_manifest.validator import ManifestValidator
+from api.api_manifest.validator import TEXT_MAX_LENGTH
 from config import ConfigClass
 from models import files as models
 from models import folders as folder_models
 from models import manifest
 from models.base_models import APIResponse
 from models.base_models import EAPIResponseCode
-from models.manifest_sql import DataAttributeModel
-from models.manifest_sql import DataManifestModel
+from models.meta import invalidate_file_meta
+from resources.cache import RefreshingCache
+from resources.container_registry import containers
 from resources.error_handler import catch_internal
+from resources.http_clients import http_clients
+from resources.node_ids import node_ids
 
 router = APIRouter()
 _logger = LoggerFactory('api_files').get_logger()
 
 _API_NAMESPACE = 'file_entity_restful'
 
+# counts for include_total=estimate, keyed by container, labels and filter so every page of a listing shares one
+listing_count_cache = RefreshingCache(
+    'listing_count',
+    ConfigClass.LISTING_COUNT_CACHE_SIZE,
+    ConfigClass.LISTING_COUNT_CACHE_TTL,
+    ConfigClass.LISTING_COUNT_CACHE_STALE_TTL,
+    ConfigClass.LISTING_COUNT_REFRESH_INTERVAL,
+)
+
 
 @cbv(router)
 class CreateFile:
@@ -56,100 +79,34 @@ class CreateFile:
 
     @router.post('/', response_model=models.CreateFilePOSTResponse, summary='Create file')
     @catch_internal(_API_NAMESPACE)
-    def post(self, data: models.CreateFilePOST):
+    async def post(self, data: models.CreateFilePOST):
         api_response = models.CreateFilePOSTResponse()
         self._logger.info(f'file data payload: {data}')
-        full_path = data.full_path
         original_geid = data.original_geid
-        payload = data.__dict__.copy()
-        self._logger.info(f'file payload: {payload}')
-        payload['name'] = os.path.basename(full_path)
-        payload['path'] = os.path.dirname(full_path)
-        payload['archived'] = False
-
-        process_pipeline = payload.get('process_pipeline', None)
-
-        es_payload = {
-            'global_entity_id': payload['global_entity_id'],
-            'data_type': 'File',
-            'operator': payload['uploader'],
-            'file_size': payload['file_size'],
-            'tags': payload['tags'],
-            'archived': False,
-            'location': payload['location'],
-            'time_lastmodified': time.time(),
-            'process_pipeline': payload['process_pipeline'],
-            'uploader': payload['uploader'],
-            'file_name': payload['name'],
-            'time_created': time.time(),
-            'atlas_guid': payload['guid'],
-            'full_path': payload['full_path'],
-            'display_path': payload['display_path'],
-            "dcm_id": payload['dcm_id'],
-            'project_code': payload['project_code'],
-            'list_priority': 20,
-        }
-
-        if 'version_id' in payload:
-            es_payload['version'] = payload['version_id']
-
-        if data.input_file_id:
-            del payload['input_file_id']
-            if not data.process_pipeline:
-                api_response.code = EAPIResponseCode.bad_request
-                api_response.error_msg = 'Missing required field process_pipeline for input_file_id'
-                return api_response.json_response()
-            if not data.operator:
-                api_response.code = EAPIResponseCode.bad_request
-                api_response.error_msg = 'Missing required field operator for input_file_id'
-                return api_response.json_response()
+        process_pipeline = data.process_pipeline
 
-        extra_labels = []
-        if data.namespace == 'greenroom':
-            extra_labels.append('Greenroom')
-            es_payload['zone'] = 'Greenroom'
-        else:
-            extra_labels.append('Core')
-            es_payload['zone'] = 'Core'
-
-        # create neo4j payload
-        neo4j_payload = {
-            "global_entity_id": payload["global_entity_id"],
-            "extra_labels": extra_labels,
-            "list_priority": 20,
-            "uploader": payload["uploader"],
-            "file_size": payload["file_size"],
-            "tags": payload["tags"],
-            "location": payload["location"],
-            "process_pipeline": payload["process_pipeline"],
-            "name": payload["name"],
-            "guid": payload["guid"],
-            "full_path": payload["full_path"],
-            "display_path": payload["display_path"],
-            "dcm_id": payload["dcm_id"],
-            "project_code": payload["project_code"],
-            "path": payload["path"],
-            "version_id": payload["version_id"],
-            "operator": payload["operator"],
-            "archived": payload["archived"],
-            "parent_folder_geid": payload["parent_folder_geid"],
-        }
+        error_msg = check_input_file(data)
+        if error_msg:
+            api_response.code = EAPIResponseCode.bad_request
+            api_response.error_msg = error_msg
+            return api_response.json_response()
+        neo4j_payload, es_payload = build_file_entity(data)
 
         # Create node
-        with httpx.Client() as client:
-            response = client.post(ConfigClass.NEO4J_SERVICE_V1 + 'nodes/File', json=neo4j_payload)
+        response = await http_clients.neo4j.post(ConfigClass.NEO4J_SERVICE_V1 + 'nodes/File', json=neo4j_payload)
 
         if response.status_code != 200:
             api_response.code = EAPIResponseCode.internal_error
             api_response.error_msg = f'Neo4j error: {response.json()}'
             return api_response.json_response()
         file_node = response.json()[0]
+        node_ids.remember([file_node])
 
         self._logger.info(f'File Node: {str(file_node)}')
 
         if data.parent_folder_geid:
             # Create Folder to File relation
-            respon_parent_folder_query = folder_models.http_query_node(
+            respon_parent_folder_query = await folder_models.http_query_node(
                 data.namespace, {'global_entity_id': data.parent_folder_geid}
             )
             if not respon_parent_folder_query.status_code == 200:
@@ -172,8 +129,7 @@ class CreateFile:
             parent_folder_node = parent_folder_node[0]
             relation_payload = {'start_id': parent_folder_node['id'], 'end_id': file_node['id']}
 
-            with httpx.Client() as client:
-                response = client.post(ConfigClass.NEO4J_SERVICE_V1 + 'relations/own', json=relation_payload)
+            response = await http_clients.neo4j.post(ConfigClass.NEO4J_SERVICE_V1 + 'relations/own', json=relation_payload)
 
             if response.status_code != 200:
                 api_response.code = EAPIResponseCode.internal_error
@@ -182,18 +138,19 @@ class CreateFile:
         else:
             # Create Container to file relation
             query_params = {'code': data.project_code}
-            container_id = get_container_id(query_params)
+            container_id = await get_container_id(query_params)
             # relation_payload = {"start_id": data.project_id,
             #                     "end_id": file_node["id"]}
             relation_payload = {'start_id': container_id, 'end_id': file_node['id']}
 
-            with httpx.Client() as client:
-                response = client.post(ConfigClass.NEO4J_SERVICE_V1 + 'relations/own', json=relation_payload)
+            response = await http_clients.neo4j.post(ConfigClass.NEO4J_SERVICE_V1 + 'relations/own', json=relation_payload)
             if response.status_code != 200:
                 api_response.code = EAPIResponseCode.internal_error
                 api_response.error_msg = f'Neo4j error: {response.json()}'
                 return api_response.json_response()
 
+        invalidate_file_meta([data.project_code])
+
         # Create input to processed relation
         # curretly wouldn't be triggered by dataops_util
         if data.input_file_id:
@@ -203,10 +160,9 @@ class CreateFile:
                 'properties': {'operator': data.operator},
             }
             self._logger.debug('CreateFile relation_payload: ' + str(relation_payload))
-            with httpx.Client() as client:
-                response = client.post(
-                    ConfigClass.NEO4J_SERVICE_V1 + f'relations/{data.process_pipeline}', json=relation_payload
-                )
+            response = await http_clients.neo4j.post(
+                ConfigClass.NEO4J_SERVICE_V1 + f'relations/{data.process_pipeline}', json=relation_payload
+            )
             if response.status_code != 200:
                 api_response.code = EAPIResponseCode.internal_error
                 api_response.error_msg = f'Neo4j error: {response.json()}'
@@ -216,45 +172,24 @@ class CreateFile:
         if process_pipeline != 'data_delete':
             try:
                 if process_pipeline == 'data_transfer' and original_geid:
-                    with httpx.Client() as client:
-                        response = client.post(
-                            ConfigClass.NEO4J_SERVICE_V1 + 'nodes/File/query', json={'global_entity_id': original_geid}
-                        )
+                    response = await http_clients.neo4j.post(
+                        ConfigClass.NEO4J_SERVICE_V1 + 'nodes/File/query', json={'global_entity_id': original_geid}
+                    )
                     gr_file_node = response.json()[0]
                     self._logger.info(f'Greenroom File Node: {str(gr_file_node)}')
                     if 'manifest_id' in gr_file_node:
                         manifest_id = gr_file_node['manifest_id']
-                        full_path = gr_file_node['full_path']
 
                         attributes = []
-                        with httpx.Client() as client:
-                            res = client.get(ConfigClass.NEO4J_SERVICE_V1 + f'manifest/{manifest_id}')
+                        res = await http_clients.neo4j.get(ConfigClass.NEO4J_SERVICE_V1 + f'manifest/{manifest_id}')
                         if res.status_code == 200:
-                            manifest_data = res.json()
-                            manifest = manifest_data['result']
-                            sql_attributes = manifest['attributes']
-
-                            for sql_attribute in sql_attributes:
-                                attribute_value = gr_file_node.get('attr_' + sql_attribute['name'], '')
-
-                                if sql_attribute['type'] == 'multiple_choice':
-                                    attribute_value = []
-                                    attribute_value.append(gr_file_node.get('attr_' + sql_attribute['name'], ''))
-
-                                attributes.append(
-                                    {
-                                        'attribute_name': sql_attribute['name'],
-                                        'name': manifest['name'],
-                                        'value': attribute_value,
-                                    }
-                                )
+                            attributes = greenroom_attributes(gr_file_node, res.json()['result'])
                         es_payload['attributes'] = attributes
             except Exception as e:
                 self._logger.error(str(e))
 
             self._logger.info('es_payload: ' + str(es_payload))
-            with httpx.Client() as client:
-                es_res = client.post(ConfigClass.PROVENANCE_SERVICE_V1 + 'entity/file', json=es_payload)
+            es_res = await http_clients.provenance.post(ConfigClass.PROVENANCE_SERVICE_V1 + 'entity/file', json=es_payload)
             self._logger.info(f'Elastic Search Result: {es_res.json()}')
             if es_res.status_code != 200:
                 api_response.code = EAPIResponseCode.internal_error
@@ -265,6 +200,28 @@ class CreateFile:
         return api_response.json_response()
 
 
+@cbv(router)
+class CreateFileBatch:
+    def __init__(self):
+        self._logger = LoggerFactory('api_file').get_logger()
+
+    @router.post('/batch', response_model=models.CreateFilesBatchPOSTResponse, summary='Create files in batch')
+    @catch_internal(_API_NAMESPACE)
+    async def post(self, data: models.CreateFilesBatchPOST):
+        """
+            Create many files at once, reporting the status of each file
+        """
+        api_response = models.CreateFilesBatchPOSTResponse()
+        if not data.payload:
+            api_response.code = EAPIResponseCode.bad_request
+            api_response.error_msg = 'payload is required'
+            return api_response.json_response()
+        self._logger.info(f'file batch of {len(data.payload)} files')
+        api_response.result = await create_files_batch(data.payload, self._logger)
+        api_response.total = len([item for item in api_response.result if item['status'] == 'success'])
+        return api_response.json_response()
+
+
 @cbv(router)
 class DatasetFileQuery:
     # @router.post('/{dataset_id}/query', response_model=models.DatasetFileQueryPOSTResponse,
@@ -275,7 +232,7 @@ class DatasetFileQuery:
         summary='Query on files by Container',
     )
     # def post(self, dataset_id, data: models.DatasetFileQueryPOST):
-    def post(self, project_geid, data: models.DatasetFileQueryPOST):
+    async def post(self, project_geid, data: models.DatasetFileQueryPOST):
         api_response = models.DatasetFileQueryPOSTResponse()
         page = data.page
         page_size = data.page_size
@@ -284,6 +241,10 @@ class DatasetFileQuery:
             api_response.code = EAPIResponseCode.bad_request
             api_response.error_msg = 'Invalid order_type'
             return api_response.json_response()
+        if data.include_total not in INCLUDE_TOTAL_MODES:
+            api_response.code = EAPIResponseCode.bad_request
+            api_response.error_msg = 'Invalid include_total'
+            return api_response.json_response()
         page_kwargs = {
             'order_by': data.order_by,
             'order_type': order_type,
@@ -300,7 +261,7 @@ class DatasetFileQuery:
         if not query:
             query = None
         query_params = {'global_entity_id': project_geid}
-        container_id = get_container_id(query_params)
+        container_id = await get_container_id(query_params)
         relation_payload = {
             **page_kwargs,
             'label': 'own',
@@ -310,17 +271,19 @@ class DatasetFileQuery:
             'end_params': query,
             'partial': data.partial,
         }
-        with httpx.Client() as client:
-            response = client.post(ConfigClass.NEO4J_SERVICE_V1 + 'relations/query', json=relation_payload)
+        response = await http_clients.neo4j.post(ConfigClass.NEO4J_SERVICE_V1 + 'relations/query', json=relation_payload)
         nodes = [x['end_node'] for x in response.json()]
 
-        with httpx.Client() as client:
-            response = client.post(ConfigClass.NEO4J_SERVICE_V1 + 'relations/query/count', json=relation_payload)
-        total = response.json()['count']
+        total = None
+        if data.include_total == 'exact':
+            total = await count_relations(relation_payload)
+        elif data.include_total == 'estimate':
+            key = listing_count_key(container_id, labels, query, data.partial)
+            total = await listing_count_cache.get_or_load(key, lambda: count_relations(relation_payload))
         api_response.result = nodes
         api_response.total = total
         api_response.page = page
-        api_response.num_of_pages = math.ceil(total / page_size)
+        api_response.num_of_pages = math.ceil(total / page_size) if total is not None else None
         return api_response.json_response()
 
 
@@ -330,12 +293,9 @@ class TrashCreate:
         self._logger = LoggerFactory('api_delete_file').get_logger()
 
     @router.post('/trash', response_model=models.CreateTrashPOSTResponse, summary='Create TrashFile')
-    def post(self, data: models.CreateTrashPOST):
+    async def post(self, data: models.CreateTrashPOST):
         api_response = models.CreateTrashPOSTResponse()
-        full_path = data.full_path
         trash_full_path = data.trash_full_path
-        name = os.path.basename(trash_full_path)
-        trash_path = os.path.dirname(trash_full_path)
 
         self._logger.info('global_entity_id: ' + data.geid)
 
@@ -345,45 +305,20 @@ class TrashCreate:
         else:
             payload = {'full_path': data.full_path}
 
-        with httpx.Client() as client:
-            response = client.post(ConfigClass.NEO4J_SERVICE_V1 + 'nodes/File/query', json=payload)
+        response = await http_clients.neo4j.post(ConfigClass.NEO4J_SERVICE_V1 + 'nodes/File/query', json=payload)
         file_node = response.json()[0]
-        labels = file_node.get('labels')
-        labels.remove('File')
-
-        trash_file_data = {
-            'name': name,
-            'path': trash_path,
-            'full_path': trash_full_path,
-            'description': file_node.get('description'),
-            'file_size': file_node.get('file_size'),
-            'guid': file_node.get('guid'),
-            'manifest_id': file_node.get('manifest_id', None),
-            'dcm_id': file_node.get('dcm_id', None),
-            'archived': True,
-            'extra_labels': labels,
-            'uploader': file_node.get('uploader'),
-            'tags': file_node.get('tags'),
-            'global_entity_id': data.trash_geid,
-        }
-
-        for key, value in file_node.items():
-            if key.startswith('attr_'):
-                trash_file_data[key] = value
+        # Get dataset, the file carries its project code
+        container_id = await containers.get_id(code=file_node.get('project_code'))
+        if container_id is None:
+            api_response.code = EAPIResponseCode.not_found
+            api_response.error_msg = f'Project not found: {file_node.get("project_code")}'
+            return api_response.json_response()
+        trash_file_data = build_trash_file(file_node, data.trash_geid, trash_full_path)
 
         # Create TrashFile
-        with httpx.Client() as client:
-            response = client.post(ConfigClass.NEO4J_SERVICE_V1 + 'nodes/TrashFile', json=trash_file_data)
+        response = await http_clients.neo4j.post(ConfigClass.NEO4J_SERVICE_V1 + 'nodes/TrashFile', json=trash_file_data)
         trash_file = response.json()[0]
 
-        # Get dataset
-        get_connected = ConfigClass.NEO4J_SERVICE_V1 + 'relations/connected/{}'.format(file_node['global_entity_id'])
-        with httpx.Client() as client:
-            response = client.get(get_connected)
-        connected_nodes = response.json()['result']
-        dataset = [connected for connected in connected_nodes if 'Container' in connected['labels']][0]
-        container_id = dataset['id']
-
         # Create File to TrashFile relation
         relation_payload = {
             'start_id': file_node['id'],
@@ -391,30 +326,18 @@ class TrashCreate:
             'properties': {'operator': file_node.get('operator')},
         }
 
-        with httpx.Client() as client:
-            client.post(ConfigClass.NEO4J_SERVICE_V1 + 'relations/deleted', json=relation_payload)
+        await http_clients.neo4j.post(ConfigClass.NEO4J_SERVICE_V1 + 'relations/deleted', json=relation_payload)
         # Create Container to file relation
         relation_payload = {'start_id': container_id, 'end_id': trash_file['id']}
 
-        with httpx.Client() as client:
-            client.post(ConfigClass.NEO4J_SERVICE_V1 + 'relations/own', json=relation_payload)
+        await http_clients.neo4j.post(ConfigClass.NEO4J_SERVICE_V1 + 'relations/own', json=relation_payload)
+        invalidate_file_meta([file_node.get('project_code')])
         api_response.result = trash_file
 
         # Update Elastic Search Entity
-        es_payload = {
-            'global_entity_id': file_node['global_entity_id'],
-            'updated_fields': {
-                'name': name,
-                'path': trash_path,
-                'full_path': trash_full_path,
-                'archived': True,
-                'process_pipeline': 'data_delete',
-                'time_lastmodified': time.time(),
-            },
-        }
+        es_payload = build_trash_es_update(file_node['global_entity_id'], trash_full_path)
         self._logger.info(f'es delete file payload: {es_payload}')
-        with httpx.Client() as client:
-            es_res = client.put(ConfigClass.PROVENANCE_SERVICE_V1 + 'entity/file', json=es_payload)
+        es_res = await http_clients.provenance.put(ConfigClass.PROVENANCE_SERVICE_V1 + 'entity/file', json=es_payload)
         self._logger.info(f'es delete file response: {es_res.text}')
         if es_res.status_code != 200:
             api_response.code = EAPIResponseCode.internal_error
@@ -424,6 +347,29 @@ class TrashCreate:
         return api_response.json_response()
 
 
+@cbv(router)
+class TrashCreateBatch:
+    def __init__(self):
+        self._logger = LoggerFactory('api_delete_file').get_logger()
+
+    @router.post('/trash/batch', response_model=models.CreateTrashBatchPOSTResponse,
+                 summary='Create TrashFiles in batch')
+    @catch_internal(_API_NAMESPACE)
+    async def post(self, data: models.CreateTrashBatchPOST):
+        """
+            Move many files to the trash at once, reporting the status of each file
+        """
+        api_response = models.CreateTrashBatchPOSTResponse()
+        if not data.payload:
+            api_response.code = EAPIResponseCode.bad_request
+            api_response.error_msg = 'payload is required'
+            return api_response.json_response()
+        self._logger.info(f'trash batch of {len(data.payload)} files')
+        api_response.result = await create_trash_batch(data.payload, self._logger)
+        api_response.total = len([item for item in api_response.result if item['status'] == 'success'])
+        return api_response.json_response()
+
+
 @cbv(router)
 class FileManifest:
     # @router.put('/file/manifest', response_model=manifest.PUTAttachResponse, summary="Edit attached manifest")
@@ -433,7 +379,7 @@ class FileManifest:
         summary='Edit attached manifest',
         tags=['files'],
     )
-    def put(
+    async def put(
         self,
         request: dict,
         file_geid: str,
@@ -442,67 +388,63 @@ class FileManifest:
         data = request
 
         # file_node = get_file_node_bygeid(data["global_entity_id"])
-        file_node = get_file_node_bygeid(file_geid)
+        file_node = await get_file_node_bygeid(file_geid)
         # data.pop("global_entity_id")
-        manifest_obj = db.session.query(DataManifestModel).get(file_node['manifest_id'])
+        validator = await run_in_threadpool(Manifest.get_validator, file_node['manifest_id'])
+        if not validator:
+            # an unknown manifest has no attributes, so every submitted key is rejected below
+            validator = ManifestValidator({'id': file_node['manifest_id'], 'name': None, 'attributes': []})
 
         # Check required attributes
-        attributes = (
-            db.session.query(DataAttributeModel)
-            .filter_by(manifest_id=file_node['manifest_id'])
-            .order_by(DataAttributeModel.id.asc())
-        )
-        valid_attributes = []
         es_attributes = []
-        for attr in attributes:
-            valid_attributes.append(attr.name)
-            if not attr.optional and not attr.name in data:
+        for name, attr_type, required in validator.ordered:
+            if required and not name in data:
                 api_response.result = 'Missing required attribute'
                 api_response.code = EAPIResponseCode.bad_request
                 return api_response.json_response()
-            if attr.type.value == 'multiple_choice':
-                if not data[attr.name] in attr.value.split(','):
-                    if not data[attr.name] and attr.optional:
+            if attr_type == 'multiple_choice':
+                if not data.get(name) in validator.choices[name]:
+                    if not data.get(name) and not required:
                         continue
                     api_response.result = 'Invalid attribute value'
                     api_response.code = EAPIResponseCode.bad_request
                     _logger.error(api_response.result)
                     return api_response.json_response()
                 attribute_value = []
-                attribute_value.append(data[attr.name])
-                es_attributes.append({'attribute_name': attr.name, 'name': manifest_obj.name, 'value': attribute_value})
-            if attr.type.value == 'text':
-                value = data[attr.name]
+                attribute_value.append(data[name])
+                es_attributes.append({'attribute_name': name, 'name': validator.manifest_name, 'value': attribute_value})
+            if attr_type == 'text':
+                value = data.get(name)
                 if value:
-                    if len(value) > 100:
+                    if len(value) > TEXT_MAX_LENGTH:
                         api_response.result = 'text to long'
                         api_response.code = EAPIResponseCode.bad_request
                         _logger.error(api_response.result)
                         return api_response.json_response()
-                    es_attributes.append({'attribute_name': attr.name, 'name': manifest_obj.name, 'value': value})
+                    es_attributes.append({'attribute_name': name, 'name': validator.manifest_name, 'value': value})
         post_data = {
             'manifest_id': file_node['manifest_id'],
         }
+        unknown = validator.unknown_names(data)
+        if unknown:
+            api_response.result = 'Not a valid attribute'
+            api_response.code = EAPIResponseCode.bad_request
+            _logger.error(api_response.result)
+            return api_response.json_response()
         for key, value in data.items():
-            if key not in valid_attributes:
-                api_response.result = 'Not a valid attribute'
-                api_response.code = EAPIResponseCode.bad_request
-                _logger.error(api_response.result)
-                return api_response.json_response()
             post_data['attr_' + key] = value
 
         file_id = file_node['id']
-        with httpx.Client() as client:
-            response = client.put(ConfigClass.NEO4J_SERVICE_V1 + f'nodes/File/node/{file_id}', json=post_data)
+        response = await http_clients.neo4j.put(ConfigClass.NEO4J_SERVICE_V1 + f'nodes/File/node/{file_id}', json=post_data)
         api_response.result = response.json()[0]
+        invalidate_file_meta([file_node.get('project_code')])
 
         # Update Elastic Search Entity
         es_payload = {
             'global_entity_id': file_node['global_entity_id'],
             'updated_fields': {'attributes': es_attributes, 'time_lastmodified': time.time()},
         }
-        with httpx.Client() as client:
-            es_res = client.put(ConfigClass.PROVENANCE_SERVICE_V1 + 'entity/file', json=es_payload)
+        es_res = await http_clients.provenance.put(ConfigClass.PROVENANCE_SERVICE_V1 + 'entity/file', json=es_payload)
         if es_res.status_code != 200:
             api_response.code = EAPIResponseCode.internal_error
             api_response.error_msg = f'Elastic Search Error: {es_res.json()}'
@@ -523,25 +465,22 @@ class ValidateManifest:
         api_response = APIResponse()
         manifest_name = data.manifest_name
         project_code = data.project_code
-        manifest = db.session.query(DataManifestModel).filter_by(project_code=project_code, name=manifest_name).first()
+        manifest = next(
+            (item for item in Manifest.get_by_project_name(project_code) if item['name'] == manifest_name), None
+        )
         if not manifest:
             api_response.code = EAPIResponseCode.not_found
             api_response.result = f'Manifest not found'
             _logger.error(api_response.result)
             return api_response.json_response()
-
-        attributes = db.session.query(DataAttributeModel).filter_by(manifest_id=manifest.id)
-        valid_attributes = []
-        for attr in attributes:
-            valid_attributes.append(attr.name)
+        validator = Manifest.get_validator(manifest['id'])
 
         attributes = data.attributes or {}
-        for key, value in attributes.items():
-            if key not in valid_attributes:
-                api_response.code = EAPIResponseCode.bad_request
-                api_response.result = 'Invalid attribute'
-                _logger.error(api_response.result)
-                return api_response.json_response()
+        if validator.unknown_names(attributes):
+            api_response.code = EAPIResponseCode.bad_request
+            api_response.result = 'Invalid attribute'
+            _logger.error(api_response.result)
+            return api_response.json_response()
 
         valid, error_msg = check_attributes(attributes)
         if not valid:
@@ -551,7 +490,7 @@ class ValidateManifest:
             return api_response.json_response()
 
         # Check required attributes
-        valid, error_msg = has_valid_attributes(manifest.id, data.__dict__)
+        valid, error_msg = has_valid_attributes(manifest['id'], data.__dict__)
         if not valid:
             api_response.result = error_msg
             api_response.code = EAPIResponseCode.bad_request
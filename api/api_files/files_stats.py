@@ -18,20 +18,82 @@
 # permissions and limitations under the Licence.
 # 
 
+import asyncio
+
 from fastapi import APIRouter
 from fastapi_utils.cbv import cbv
 from logger import LoggerFactory
 
 import models.files as files_models
-import models.project as project_models
+from config import ConfigClass
 from models.base_models import APIResponse
 from models.base_models import EAPIResponseCode
+from resources.cache import RefreshingCache
+from resources.container_registry import containers
 from resources.error_handler import catch_internal
+from resources.helpers import gather_with_timeouts
 from resources.helpers import get_file_count_neo4j
 from resources.helpers import get_operation_logs_total
 
 router = APIRouter()
 _API_NAMESPACE = "api_files_stats"
+_logger = LoggerFactory(_API_NAMESPACE).get_logger()
+
+# partial results are answered but never cached, so a failed count is retried on the next call
+file_stats_cache = RefreshingCache(
+    'file_stats',
+    ConfigClass.FILE_STATS_CACHE_SIZE,
+    ConfigClass.FILE_STATS_CACHE_TTL,
+    ConfigClass.FILE_STATS_CACHE_STALE_TTL,
+    ConfigClass.FILE_STATS_REFRESH_INTERVAL,
+    should_cache=lambda result: not result["errors"],
+)
+
+
+def stats_bucket(date):
+    try:
+        return int(float(date)) // ConfigClass.FILE_STATS_BUCKET_SECONDS
+    except (TypeError, ValueError):
+        return date
+
+
+async def count_files(project_code, start_date, end_date, operator):
+    # stats from auditlogs and from neo4j count, fetched concurrently
+    calls = {
+        name: get_operation_logs_total(project_code, operation_type, start_date, end_date, "file", operator=operator)
+        for name, operation_type in [
+            ("uploaded", "data_upload"), ("downloaded", "data_download"), ("approved", "data_transfer")
+        ]
+    }
+    calls.update({
+        name: get_file_count_neo4j(project_code, zone, uploader=operator)
+        for name, zone in [("greenroom", "Greenroom"), ("core", "Core")]
+    })
+    return await gather_with_timeouts(calls, ConfigClass.FILE_STATS_CALL_TIMEOUT)
+
+
+async def project_stats(project_info, start_date, end_date, operator):
+    stats, errors = await count_files(project_info['code'], start_date, end_date, operator)
+    for name, error in errors.items():
+        _logger.error(f"FilesDailyStats {name} failed for {project_info.get('global_entity_id')}: {error}")
+    return {
+        **stats,
+        "project_info": project_info,
+        "errors": errors
+    }
+
+
+async def compute_file_stats(project_geid, start_date, end_date, operator):
+    # the counts need the project code, so its lookup is bounded like each of them; project_info is read fresh
+    # rather than from the container registry, which only keeps the identity of a project
+    timeout = ConfigClass.FILE_STATS_CALL_TIMEOUT
+    try:
+        project_info = await asyncio.wait_for(containers.load(project_geid), timeout)
+    except asyncio.TimeoutError:
+        raise Exception(f"project lookup timed out after {timeout}s")
+    if not project_info:
+        raise Exception(f"project not found: {project_geid}")
+    return await project_stats(project_info, start_date, end_date, operator)
 
 
 @cbv(router)
@@ -42,7 +104,7 @@ class FilesStats:
     @router.get('/project/{project_geid}/files/statistics', response_model=files_models.FilesStatsGETResponse,
                 summary="FilesDailyStats Restful")
     @catch_internal(_API_NAMESPACE)
-    def get(self, project_geid, start_date, end_date, operator=None):
+    async def get(self, project_geid, start_date, end_date, operator=None):
         '''
         Get function to extract daily file statistics
         '''
@@ -51,32 +113,38 @@ class FilesStats:
             f"FilesDailyStats project_geid: {project_geid}")
         api_response = APIResponse()
         api_response.code = EAPIResponseCode.success
-        # get project
-        project_info = project_models.http_query_node({
-            "global_entity_id": project_geid
-        }).json()[0]
-        # get stats from auditlogs
-        stats_from_auditlogs = [get_operation_logs_total(
-            project_info['code'],
-            operation_type,
-            start_date,
-            end_date,
-            "file",
-            operator=operator
-        ) for operation_type in ["data_upload", "data_download", "data_transfer"]]
-        # get stats from neo4j count
-        stats_from_neo4j = [get_file_count_neo4j(
-            project_info['code'],
-            zone,
-            uploader=operator
-        ) for zone in ["Greenroom", "Core"]]
-        # return response
-        api_response.result = {
-            "uploaded": stats_from_auditlogs[0],
-            "downloaded": stats_from_auditlogs[1],
-            "approved": stats_from_auditlogs[2],
-            "greenroom": stats_from_neo4j[0],
-            "core": stats_from_neo4j[1],
-            "project_info": project_info
-        }
+        # dates are bucketed so dashboards polling with a moving window share one entry
+        key = (project_geid, stats_bucket(start_date), stats_bucket(end_date), operator)
+        api_response.result = await file_stats_cache.get_or_load(
+            key, lambda: compute_file_stats(project_geid, start_date, end_date, operator)
+        )
+        return api_response.json_response()
+
+    @router.post('/projects/files/statistics', response_model=files_models.FilesStatsBatchPOSTResponse,
+                 summary="FilesDailyStats for many projects")
+    @catch_internal(_API_NAMESPACE)
+    async def post(self, data: files_models.FilesStatsBatchPOST):
+        '''
+        Get the daily file statistics of several projects at once
+        '''
+        self._logger.info(f"FilesDailyStats batch for {len(data.project_geids)} projects")
+        api_response = APIResponse()
+        api_response.code = EAPIResponseCode.success
+        projects = await containers.load_many(data.project_geids)
+        # the counts are per project upstream, so projects are fanned out with a cap
+        semaphore = asyncio.Semaphore(ConfigClass.FILE_STATS_BATCH_CONCURRENCY)
+
+        async def stats_for(project_info):
+            key = (project_info['global_entity_id'], stats_bucket(data.start_date), stats_bucket(data.end_date),
+                   data.operator)
+            async with semaphore:
+                return await file_stats_cache.get_or_load(
+                    key, lambda: project_stats(project_info, data.start_date, data.end_date, data.operator)
+                )
+
+        found = [geid for geid in data.project_geids if geid in projects]
+        results = await asyncio.gather(*[stats_for(projects[geid]) for geid in found])
+        api_response.result = {geid: None for geid in data.project_geids}
+        api_response.result.update(zip(found, results))
+        api_response.total = len(found)
         return api_response.json_response()
@@ -23,8 +23,9 @@ from fastapi_utils.cbv import cbv
 from models import files as models
 from models.base_models import EAPIResponseCode
 from config import ConfigClass
+from resources.container_registry import containers
+from resources.http_clients import http_clients
 import math
-import httpx
 
 router = APIRouter()
 @cbv(router)
@@ -33,7 +34,7 @@ class DatasetFileQueryV2:
     @router.post('/{project_geid}/query', response_model=models.DatasetFileQueryPOSTResponse,
                  summary="Query on files by dataset")
     # def post(self, dataset_id, data: models.DatasetFileQueryPOSTV2):
-    def post(self, project_geid, data: models.DatasetFileQueryPOSTV2):
+    async def post(self, project_geid, data: models.DatasetFileQueryPOSTV2):
         api_response = models.DatasetFileQueryPOSTResponse()
         page = data.page
         page_size = data.page_size
@@ -56,23 +57,15 @@ class DatasetFileQueryV2:
             return api_response.json_response()
 
         try:
-            query_params ={
-                "global_entity_id": project_geid
-            }
-            container_id = get_container_id(query_params)
-            with httpx.Client() as client:
-                response = client.get(ConfigClass.NEO4J_SERVICE_V1 + f"nodes/Container/node/{container_id}")
-
-            if response.status_code != 200:
-                error_msg = response.json()
-                api_response.code = EAPIResponseCode.internal_error
-                api_response.error_msg = f"Neo4j error: {error_msg}"
-                return api_response.json_response()
-            dataset = response.json()[0]
+            dataset = await containers.get(global_entity_id=project_geid)
         except Exception as e:
             api_response.code = EAPIResponseCode.internal_error
             api_response.error_msg = "Neo4j error: " + str(e)
             return api_response.json_response()
+        if not dataset:
+            api_response.code = EAPIResponseCode.not_found
+            api_response.error_msg = "Project not found"
+            return api_response.json_response()
 
 
         for label in labels:
@@ -91,8 +84,7 @@ class DatasetFileQueryV2:
             },
         }
         try:
-            with httpx.Client() as client:
-                response = client.post(ConfigClass.NEO4J_SERVICE_V2 + "relations/query", json=relation_payload)
+            response = await http_clients.neo4j.post(ConfigClass.NEO4J_SERVICE_V2 + "relations/query", json=relation_payload)
 
             if response.status_code != 200:
                 error_msg = response.json()
@@ -105,7 +97,7 @@ class DatasetFileQueryV2:
             api_response.error_msg = "Neo4j error: " + str(e)
             return api_response.json_response()
 
-        total = response.json()["total"]
+        total = nodes["total"]
         api_response.result = nodes["results"]
         api_response.total = total
         api_response.page = page
@@ -116,7 +108,7 @@ class DatasetFileQueryV2:
 @cbv(router)
 class FolderFileQueryV2:
     @router.post('/folder/{folder_geid}/query', response_model=models.DatasetFileQueryPOSTResponse, summary="Query on files by dataset")
-    def post(self, folder_geid, data: models.DatasetFileQueryPOSTV2):
+    async def post(self, folder_geid, data: models.DatasetFileQueryPOSTV2):
         api_response = models.DatasetFileQueryPOSTResponse()
         page = data.page
         page_size = data.page_size
@@ -152,28 +144,13 @@ class FolderFileQueryV2:
                 "end_params": query,
             },
         }
-        with httpx.Client() as client:
-            response = client.post(ConfigClass.NEO4J_SERVICE_V2 + "relations/query", json=relation_payload)
+        response = await http_clients.neo4j.post(ConfigClass.NEO4J_SERVICE_V2 + "relations/query", json=relation_payload)
 
         nodes = response.json()
 
-        total = response.json()["total"]
+        total = nodes["total"]
         api_response.result = nodes["results"]
         api_response.total = total
         api_response.page = page
         api_response.num_of_pages = math.ceil(total / page_size)
         return api_response.json_response()
-
-
-def get_container_id(query_params):
-    url = ConfigClass.NEO4J_SERVICE_V1 + f"nodes/Container/query"
-    payload = {
-        **query_params
-    }
-    with httpx.Client() as client:
-        response = client.post(url, json=payload)
-
-    if response.status_code != 200 or response.json() == []:
-        return None
-    container = response.json()[0]
-    return str(container["id"])
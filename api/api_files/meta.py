@@ -18,67 +18,105 @@
 # permissions and limitations under the Licence.
 # 
 
+import asyncio
+import copy
 import math
 import json
-import httpx
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from fastapi_utils.cbv import cbv
+from logger import LoggerFactory
 from models.meta import MetaGET, MetaGETResponse, get_parent_connections, GETFileDetail, POSTFileDetail, \
-        POSTFileDetailResponse
+        POSTFileDetailResponse, routing_cache, MetaExportGET, file_meta_cache, file_meta_cache_key, listing_project_code
 from models.base_models import EAPIResponseCode, APIResponse
 from config import ConfigClass
-from .utils import get_source_label, get_query_labels, convert_query
+from resources.http_clients import http_clients
+from resources.node_loader import node_loader
+from .utils import get_source_label, get_query_labels, convert_query, \
+    iter_nodes_by_geids, prefetch, encode_ndjson, iter_listing
 
 router = APIRouter()
+_logger = LoggerFactory('api_files_meta').get_logger()
+
+NDJSON = "application/x-ndjson"
+
+
+def listing_relation_payload(geid, source_type, zone, query, partial):
+    """
+        relations/query payload for the files under geid, without paging; raises ValueError on a bad
+        source_type or zone
+    """
+    start_label = get_source_label(source_type)
+    if not start_label:
+        raise ValueError("Invalid source_type")
+    labels = get_query_labels(zone, source_type)
+    if not labels:
+        raise ValueError("Invalid zone")
+    return {
+        "start_label": start_label,
+        "end_labels": labels,
+        "query": {
+            "start_params": {"global_entity_id": geid},
+            "end_params": convert_query(labels, query, partial, source_type),
+        },
+    }
 
 
 @cbv(router)
 class FileBulkDetail:
     @router.post('/bulk/detail', response_model=POSTFileDetailResponse, summary="Get files by geid")
-    def post(self, data: POSTFileDetail):
+    async def post(self, data: POSTFileDetail, request: Request):
+        """
+            Geids are fetched BULK_DETAIL_CHUNK_SIZE at a time. Clients that accept application/x-ndjson get the nodes
+            streamed as they arrive; the others get the whole {"result": [...]} body once every chunk is read, so a
+            failure still answers 500
+        """
         api_response = APIResponse()
         if not data.geids:
             api_response.code = EAPIResponseCode.bad_request
             api_response.error_msg = "geids is required"
             return api_response.json_response()
-        with httpx.Client() as client:
-            response = client.post(ConfigClass.NEO4J_SERVICE_V1 + f"nodes/query/geids", json={"geids": data.geids})
+        streamed = NDJSON in request.headers.get("accept", "")
         try:
-            response.raise_for_status()
+            if streamed:
+                batches = await prefetch(iter_nodes_by_geids(data.geids))
+            else:
+                nodes = [node async for batch in iter_nodes_by_geids(data.geids) for node in batch]
         except Exception as e:
             api_response.code = EAPIResponseCode.internal_error
             api_response.error_msg = "Neo4j error: " + str(e)
             return api_response.json_response()
 
-        return response.json()
+        if streamed:
+            return StreamingResponse(encode_ndjson(batches, _logger), media_type=NDJSON)
+        return JSONResponse({"result": nodes, "code": 200, "error_msg": ""})
 
 
 @cbv(router)
 class FileDetail:
     @router.get('/detail/{file_geid}', response_model=GETFileDetail, summary="Get detail of single file by geid")
-    def get(self, file_geid):
+    async def get(self, file_geid):
         api_response = APIResponse()
-        with httpx.Client() as client:
-            response = client.get(ConfigClass.NEO4J_SERVICE_V1 + f"nodes/geid/{file_geid}")
+        # concurrent detail requests are merged into one nodes/query/geids call
         try:
-            response.raise_for_status()
+            node = await node_loader.load(file_geid)
         except Exception as e:
             api_response.code = EAPIResponseCode.internal_error
             api_response.error_msg = "Neo4j error: " + str(e)
             return api_response.json_response()
 
-        if not response.json():
+        if not node:
             api_response.code = EAPIResponseCode.not_found
             api_response.error_msg = "File not found"
             return api_response.json_response()
-        api_response.result = response.json()[0]
+        api_response.result = node
         return api_response.json_response()
 
 
 @cbv(router)
 class FileMeta:
     @router.get('/meta/{geid}', response_model=MetaGETResponse, summary="Query on files by dataset or folder")
-    def get(self, geid, params: MetaGET = Depends(MetaGET)):
+    async def get(self, geid, params: MetaGET = Depends(MetaGET)):
         """
             Get and filter file meta from Neo4j given a Dataset or Folder geid
         """
@@ -109,54 +147,81 @@ class FileMeta:
         else:
             query = {}
 
-        start_label = get_source_label(source_type)
-        if not start_label:
-            api_response.code = EAPIResponseCode.bad_request
-            api_response.error_msg = "Invalid source_type"
-            return api_response.json_response()
-
-        labels = get_query_labels(zone, source_type)
-        if not labels:
+        try:
+            relation_payload = {**page_kwargs, **listing_relation_payload(geid, source_type, zone, query, partial)}
+        except ValueError as e:
             api_response.code = EAPIResponseCode.bad_request
-            api_response.error_msg = "Invalid zone"
+            api_response.error_msg = str(e)
             return api_response.json_response()
 
-        neo4j_query = convert_query(labels, query, partial, source_type)
+        cache_key = file_meta_cache_key(geid, params)
+        cached = file_meta_cache.get(cache_key)
+        if cached is not None:
+            return Response(content=cached[1], media_type="application/json")
 
-        relation_payload = {
-            **page_kwargs,
-            "start_label": start_label,
-            "end_labels": labels,
-            "query": {
-                "start_params": {"global_entity_id": geid},
-                "end_params": neo4j_query,
-            },
-        }
-        try:
-            with httpx.Client() as client:
-                response = client.post(ConfigClass.NEO4J_SERVICE_V2 + "relations/query", json=relation_payload)
+        async def query_nodes():
+            response = await http_clients.neo4j.post(ConfigClass.NEO4J_SERVICE_V2 + "relations/query",
+                                                     json=relation_payload)
             response.raise_for_status()
-            if response.status_code != 200:
-                error_msg = response.json()
-                api_response.code = EAPIResponseCode.internal_error
-                api_response.error_msg = f"Neo4j error: {error_msg}"
-                return api_response.json_response()
-            nodes = response.json()
+            return response.json()
 
-            # get routing
-            routing = get_parent_connections(geid)
+        async def query_routing():
+            # the routing does not depend on the listing, so both are requested at once
+            cached = routing_cache.get(geid)
+            if cached is None:
+                cached = await get_parent_connections(geid)
+                routing_cache.set(geid, cached)
+            return copy.deepcopy(cached)
 
+        try:
+            nodes, routing = await asyncio.gather(query_nodes(), query_routing())
         except Exception as e:
             api_response.code = EAPIResponseCode.internal_error
             api_response.error_msg = "Neo4j error: " + str(e)
             return api_response.json_response()
 
-        total = response.json()["total"]
+        total = nodes["total"]
+        results = nodes["results"]
         api_response.result = {
-            "data": nodes["results"],
+            "data": results,
             "routing": routing
         }
         api_response.total = total
         api_response.page = page
         api_response.num_of_pages = math.ceil(total / page_size)
-        return api_response.json_response()
+        response = api_response.json_response()
+        project_code = listing_project_code(results, routing)
+        if project_code and len(response.body) <= ConfigClass.FILE_META_CACHE_MAX_ENTRY_BYTES:
+            file_meta_cache.set(cache_key, (project_code, response.body))
+        return response
+
+
+@cbv(router)
+class FileMetaExport:
+    @router.get('/meta/{geid}/export', summary="Export every file under a dataset or folder as NDJSON")
+    async def get(self, geid, params: MetaExportGET = Depends(MetaExportGET)):
+        """
+            Stream the whole listing of FileMeta, one node per line, read from Neo4j EXPORT_PAGE_SIZE at a time
+        """
+        api_response = APIResponse()
+        if not params.order_type.lower() in ["desc", "asc"]:
+            api_response.code = EAPIResponseCode.bad_request
+            api_response.error_msg = "Invalid order_type"
+            return api_response.json_response()
+        query = json.loads(params.query) if params.query else {}
+        partial = json.loads(params.partial) if params.partial else []
+        try:
+            relation_payload = listing_relation_payload(geid, params.source_type, params.zone, query, partial)
+        except ValueError as e:
+            api_response.code = EAPIResponseCode.bad_request
+            api_response.error_msg = str(e)
+            return api_response.json_response()
+
+        pages = iter_listing(relation_payload, params.order_by, params.order_type, ConfigClass.EXPORT_PAGE_SIZE)
+        try:
+            pages = await prefetch(pages)
+        except Exception as e:
+            api_response.code = EAPIResponseCode.internal_error
+            api_response.error_msg = "Neo4j error: " + str(e)
+            return api_response.json_response()
+        return StreamingResponse(encode_ndjson(pages, _logger), media_type=NDJSON)
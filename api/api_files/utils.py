@@ -18,38 +18,21 @@
 # permissions and limitations under the Licence.
 # 
 
-import re
+import asyncio
+import json
+import os
 import time
 
 import httpx
-from fastapi_sqlalchemy import db
 
+from api.api_manifest.service import Manifest
+from api.api_manifest.validator import ManifestValidator
 from config import ConfigClass
-from models.manifest_sql import DataAttributeModel
-
-
-def get_files_recursive(folder_geid, all_files=[]):
-    query = {
-        "start_label": "Folder",
-        "end_labels": ["File", "Folder"],
-        "query": {
-            "start_params": {
-                "global_entity_id": folder_geid,
-            },
-            "end_params": {
-                "archived": False
-            }
-        }
-    }
-    with httpx.Client() as client:
-        resp = client.post(ConfigClass.NEO4J_SERVICE_V2 + "relations/query", json=query)
-    for node in resp.json()["results"]:
-        if "File" in node["labels"]:
-            all_files.append(node)
-        else:
-            get_files_recursive(node["global_entity_id"], all_files=all_files)
-
-    return all_files
+from models.meta import invalidate_file_meta
+from resources.container_registry import containers
+from resources.helpers import chunked
+from resources.http_clients import http_clients
+from resources.node_ids import node_ids
 
 
 # TODO remove the label checking by get by geid
@@ -127,48 +110,157 @@ def convert_query(labels, query, partial, source_type):
     return neo4j_query
 
 
-def get_file_node_bygeid(geid):
+async def get_file_node_bygeid(geid):
     post_data = {"global_entity_id": geid}
-    with httpx.Client() as client:
-        response = client.post(
-            ConfigClass.NEO4J_SERVICE_V1 + f"nodes/File/query", json=post_data
-        )
+    response = await http_clients.neo4j.post(
+        ConfigClass.NEO4J_SERVICE_V1 + f"nodes/File/query", json=post_data
+    )
     if not response.json():
         return None
     return response.json()[0]
 
 
-def get_folder_node_bygeid(geid):
+async def get_folder_node_bygeid(geid):
     # no call for this function found
     post_data = {"global_entity_id": geid}
-    with httpx.Client() as client:
-        response = client.post(
-            ConfigClass.NEO4J_SERVICE_V1 + f"nodes/Folder/query", json=post_data
-        )
+    response = await http_clients.neo4j.post(
+        ConfigClass.NEO4J_SERVICE_V1 + f"nodes/Folder/query", json=post_data
+    )
     if not response.json():
         return None
     return response.json()[0]
 
 
-def get_trashfile_node_bygeid(geid):
+async def get_trashfile_node_bygeid(geid):
     # no call for this function found
     post_data = {"global_entity_id": geid}
-    with httpx.Client() as client:
-        response = client.post(ConfigClass.NEO4J_SERVICE_V1 + f"nodes/TrashFile/query", json=post_data)
+    response = await http_clients.neo4j.post(ConfigClass.NEO4J_SERVICE_V1 + f"nodes/TrashFile/query", json=post_data)
     if not response.json():
         return None
     return response.json()[0]
 
 
-def get_file_node(full_path):
+async def get_file_node(full_path):
     post_data = {"full_path": full_path}
-    with httpx.Client() as client:
-        response = client.post(ConfigClass.NEO4J_SERVICE_V1 + f"nodes/File/query", json=post_data)
+    response = await http_clients.neo4j.post(ConfigClass.NEO4J_SERVICE_V1 + f"nodes/File/query", json=post_data)
     if not response.json():
         return None
     return response.json()[0]
 
 
+def check_input_file(data):
+    """Return the error of a file create payload whose input file relation cannot be made, or None."""
+    if data.input_file_id:
+        if not data.process_pipeline:
+            return 'Missing required field process_pipeline for input_file_id'
+        if not data.operator:
+            return 'Missing required field operator for input_file_id'
+    return None
+
+
+def build_file_entity(data):
+    """Return the neo4j node payload and the elastic search entity of a file to create."""
+    name = os.path.basename(data.full_path)
+    path = os.path.dirname(data.full_path)
+    zone = 'Greenroom' if data.namespace == 'greenroom' else 'Core'
+    es_payload = {
+        'global_entity_id': data.global_entity_id,
+        'data_type': 'File',
+        'operator': data.uploader,
+        'file_size': data.file_size,
+        'tags': data.tags,
+        'archived': False,
+        'location': data.location,
+        'time_lastmodified': time.time(),
+        'process_pipeline': data.process_pipeline,
+        'uploader': data.uploader,
+        'file_name': name,
+        'time_created': time.time(),
+        'atlas_guid': data.guid,
+        'full_path': data.full_path,
+        'display_path': data.display_path,
+        'dcm_id': data.dcm_id,
+        'project_code': data.project_code,
+        'list_priority': 20,
+        'version': data.version_id,
+        'zone': zone,
+    }
+    neo4j_payload = {
+        'global_entity_id': data.global_entity_id,
+        'extra_labels': [zone],
+        'list_priority': 20,
+        'uploader': data.uploader,
+        'file_size': data.file_size,
+        'tags': data.tags,
+        'location': data.location,
+        'process_pipeline': data.process_pipeline,
+        'name': name,
+        'guid': data.guid,
+        'full_path': data.full_path,
+        'display_path': data.display_path,
+        'dcm_id': data.dcm_id,
+        'project_code': data.project_code,
+        'path': path,
+        'version_id': data.version_id,
+        'operator': data.operator,
+        'archived': False,
+        'parent_folder_geid': data.parent_folder_geid,
+    }
+    return neo4j_payload, es_payload
+
+
+def build_trash_file(file_node, trash_geid, trash_full_path):
+    """Return the neo4j payload of the TrashFile replacing file_node, with its labels and attributes."""
+    trash_file_data = {
+        'name': os.path.basename(trash_full_path),
+        'path': os.path.dirname(trash_full_path),
+        'full_path': trash_full_path,
+        'description': file_node.get('description'),
+        'file_size': file_node.get('file_size'),
+        'guid': file_node.get('guid'),
+        'manifest_id': file_node.get('manifest_id', None),
+        'dcm_id': file_node.get('dcm_id', None),
+        'archived': True,
+        'extra_labels': [label for label in file_node.get('labels', []) if label != 'File'],
+        'uploader': file_node.get('uploader'),
+        'tags': file_node.get('tags'),
+        'global_entity_id': trash_geid,
+    }
+    for key, value in file_node.items():
+        if key.startswith('attr_'):
+            trash_file_data[key] = value
+    return trash_file_data
+
+
+def build_trash_es_update(geid, trash_full_path):
+    return {
+        'global_entity_id': geid,
+        'updated_fields': {
+            'name': os.path.basename(trash_full_path),
+            'path': os.path.dirname(trash_full_path),
+            'full_path': trash_full_path,
+            'archived': True,
+            'process_pipeline': 'data_delete',
+            'time_lastmodified': time.time(),
+        },
+    }
+
+
+def greenroom_attributes(gr_file_node, manifest):
+    """Copy the manifest attributes of a greenroom file into elastic search attributes of its core copy."""
+    attributes = []
+    for sql_attribute in manifest['attributes']:
+        attribute_value = gr_file_node.get('attr_' + sql_attribute['name'], '')
+        if sql_attribute['type'] == 'multiple_choice':
+            attribute_value = [attribute_value]
+        attributes.append({
+            'attribute_name': sql_attribute['name'],
+            'name': manifest['name'],
+            'value': attribute_value,
+        })
+    return attributes
+
+
 def is_greenroom(file_node):
     if "Greenroom" not in file_node["labels"]:
         return False
@@ -177,39 +269,18 @@ def is_greenroom(file_node):
 
 
 def has_valid_attributes(manifest_id, data):
-    attributes = db.session.query(DataAttributeModel).filter_by(manifest_id=manifest_id).order_by(DataAttributeModel.id.asc())
-    for attr in attributes:
-        if not attr.optional and not attr.name in data.get("attributes", {}):
-            return False, "Missing required attribute"
-        if attr.type.value == "multiple_choice":
-            value = data.get("attributes", {}).get(attr.name)
-            if value:
-                if not value in attr.value.split(","):
-                    return False, "Invalid choice field"
-            else:
-                if not attr.optional:
-                    return False, "Field required"
-        if attr.type.value == "text":
-            value = data.get("attributes", {}).get(attr.name)
-            if value:
-                if len(value) > 100:
-                    return False, "text to long"
-            else:
-                if not attr.optional:
-                    return False, "Field required"
-    return True, ""
+    validator = Manifest.get_validator(manifest_id)
+    if not validator:
+        return True, ""
+    return validator.validate(data.get("attributes", {}), text_too_long="text to long")
 
 
 def check_attributes(attributes):
     # Apply name restrictions
-    name_requirements = re.compile("^[a-zA-z0-9]{1,32}$")
-    for key, value in attributes.items():
-        if not re.search(name_requirements, key):
-            return False, "regex validation error"
-    return True, ""
+    return ManifestValidator.check_names(attributes)
 
 
-def attach_attributes(manifest, attributes, file_node, _logger):
+async def attach_attributes(manifest, attributes, file_node, _logger):
     # no call for this function found
     post_data = {
         "manifest_id": manifest['id'],
@@ -244,8 +315,7 @@ def attach_attributes(manifest, attributes, file_node, _logger):
                 "value": value
             })
     file_id = file_node["id"]
-    with httpx.Client() as client:
-        response = client.put(ConfigClass.NEO4J_SERVICE_V1 + f"nodes/File/node/{file_id}", json=post_data)
+    response = await http_clients.neo4j.put(ConfigClass.NEO4J_SERVICE_V1 + f"nodes/File/node/{file_id}", json=post_data)
 
     if response.status_code != 200:
         _logger.error('Update Neo4j Node failed: {}'.format(response.text))
@@ -259,8 +329,7 @@ def attach_attributes(manifest, attributes, file_node, _logger):
             "time_lastmodified": time.time()
         }
     }
-    with httpx.Client() as client:
-        es_res = client.put(ConfigClass.PROVENANCE_SERVICE_V1 + 'entity/file', json=es_payload)
+    es_res = await http_clients.provenance.put(ConfigClass.PROVENANCE_SERVICE_V1 + 'entity/file', json=es_payload)
 
     if es_res.status_code != 200:
         _logger.error('Update Elastic Search Entity failed: {}'.format(es_res.text))
@@ -268,16 +337,537 @@ def attach_attributes(manifest, attributes, file_node, _logger):
 
     return True
 
-def get_container_id(query_params):
-    url = ConfigClass.NEO4J_SERVICE_V1 + f"nodes/Container/query"
-    payload = {
-        **query_params
-    }
-    with httpx.Client() as client:
-        result = client.post(url, json=payload)
-
-    if result.status_code != 200 or result.json() == []:
+async def get_container_id(query_params):
+    try:
+        return await containers.get_id(**query_params)
+    except httpx.HTTPError:
         return None
-    result = result.json()[0]
-    container_id = result["id"]
-    return container_id
+
+
+# exact counts every page, estimate may answer a cached count, false skips the count
+INCLUDE_TOTAL_MODES = ('exact', 'estimate', 'false')
+
+
+def listing_count_key(container_id, labels, query, partial):
+    return str(container_id), tuple(labels), json.dumps(query, sort_keys=True, default=str), partial
+
+
+async def count_relations(relation_payload):
+    response = await http_clients.neo4j.post(ConfigClass.NEO4J_SERVICE_V1 + 'relations/query/count',
+                                             json=relation_payload)
+    response.raise_for_status()
+    return response.json()['count']
+
+
+def listing_key(node, order_by):
+    return [node.get("list_priority"), node.get(order_by), node.get("id")]
+
+
+def _compare(a, b):
+    # neo4j sorts nulls after every other value in ascending order
+    if a == b:
+        return 0
+    if a is None:
+        return 1
+    if b is None:
+        return -1
+    try:
+        return -1 if a < b else 1
+    except TypeError:
+        return -1 if str(a) < str(b) else 1
+
+
+def is_after(key, anchor, order_type):
+    """Whether a row with this listing_key comes after the anchor key in the listing order."""
+    descending = (order_type or "asc").lower() == "desc"
+    order = _compare(key[0], anchor[0])
+    if order:
+        return order > 0
+    for a, b in zip(key[1:], anchor[1:]):
+        order = _compare(a, b)
+        if order:
+            return order < 0 if descending else order > 0
+    return False
+
+
+async def read_after(fetch, anchor, offset, page_size, order_by, order_type):
+    """Read the page_size rows that follow the anchor row, last seen at offset.
+
+    The read starts at the anchor itself, so when nothing changed ahead of it a page costs one row more than a plain
+    page. When rows were inserted or removed ahead, the anchor is looked for in a window widened forwards, or
+    backwards once rows sort after it from the start; a removed anchor is passed by comparing keys.
+    `fetch(skip, limit)` returns the relations/query rows. Returns the page and the offset of its first row.
+    """
+    anchor_key = listing_key(anchor, order_by)
+    behind = 0
+    ahead = page_size + 1
+    while True:
+        skip = max(offset - behind, 0)
+        limit = offset - skip + ahead
+        rows = await fetch(skip, limit)
+        start = next((index + 1 for index, row in enumerate(rows) if row.get("id") == anchor.get("id")), None)
+        if start is None:
+            start = next(
+                (index for index, row in enumerate(rows)
+                 if is_after(listing_key(row, order_by), anchor_key, order_type)),
+                len(rows)
+            )
+            if start == 0 and skip > 0:
+                # rows were removed ahead of the anchor, its place is further back
+                behind = max(behind * 2, page_size)
+                continue
+        if len(rows) == limit and len(rows) < start + page_size:
+            # rows were inserted ahead of the anchor
+            ahead *= 2
+            continue
+        return rows[start:start + page_size], skip + start
+
+
+async def iter_listing(relation_payload, order_by, order_type, page_size):
+    """Yield every node of a v2 relations/query listing one page at a time.
+
+    relations/query can only skip, so this is offset paging in the FileMeta order: each page still scans the rows
+    before it. Every page is read from the last row of the previous one through read_after, so rows added or
+    removed while the listing is read neither end it early nor drop or repeat the rows behind them.
+    Raises httpx.HTTPError when neo4j fails.
+    """
+    async def fetch(skip, limit):
+        payload = {
+            **relation_payload,
+            "order_by": "list_priority ASC,end_node." + order_by,
+            "order_type": order_type,
+            "skip": skip,
+            "limit": limit,
+        }
+        response = await http_clients.neo4j.post(ConfigClass.NEO4J_SERVICE_V2 + "relations/query", json=payload)
+        response.raise_for_status()
+        return response.json()["results"]
+
+    page = await fetch(0, page_size)
+    offset = 0
+    while True:
+        yield page
+        if len(page) < page_size:
+            return
+        offset += len(page) - 1
+        page, offset = await read_after(fetch, page[-1], offset, page_size, order_by, order_type)
+
+
+async def iter_nodes_by_geids(geids, chunk_size=None, concurrency=None):
+    """Yield the nodes of geids one chunk at a time, in input order, while up to concurrency chunks are in flight.
+
+    Raises httpx.HTTPError when neo4j fails; the chunks still in flight are cancelled.
+    """
+    chunk_size = chunk_size or ConfigClass.BULK_DETAIL_CHUNK_SIZE
+    concurrency = concurrency or ConfigClass.BULK_DETAIL_CONCURRENCY
+
+    async def fetch(chunk):
+        response = await http_clients.neo4j.post(ConfigClass.NEO4J_SERVICE_V1 + 'nodes/query/geids',
+                                                 json={'geids': chunk})
+        response.raise_for_status()
+        return response.json()['result']
+
+    pending = []
+    try:
+        for start in range(0, len(geids), chunk_size):
+            pending.append(asyncio.ensure_future(fetch(geids[start:start + chunk_size])))
+            if len(pending) >= concurrency:
+                yield await pending.pop(0)
+        while pending:
+            yield await pending.pop(0)
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def prefetch(batches):
+    """Wait for the first batch before a response is started, so that its failure still gets an error status.
+
+    Returns an iterator replaying that batch followed by the rest.
+    """
+    try:
+        first = await batches.__anext__()
+    except StopAsyncIteration:
+        first = []
+
+    async def replay():
+        yield first
+        async for batch in batches:
+            yield batch
+    return replay()
+
+
+async def encode_ndjson(batches, _logger):
+    """One JSON document per line; a failure midway ends the stream with an {"error_msg": ...} line."""
+    try:
+        async for batch in batches:
+            if batch:
+                yield ''.join(json.dumps(item) + '\n' for item in batch)
+    except Exception as e:
+        _logger.error(f'Stream failed: {e}')
+        yield json.dumps({'error_msg': f'Neo4j error: {e}'}) + '\n'
+
+
+class FileBatchEntry:
+    def __init__(self, index, data, node, es_payload):
+        self.index = index
+        self.data = data
+        self.node = node
+        self.es_payload = es_payload
+        self.error_msg = ''
+        self.node_created = False
+
+
+async def create_files_batch(files, _logger):
+    """Create many files with bulk upstream calls and return one {global_entity_id, status, node_created, error_msg}
+    per file.
+
+    Parent folders and containers are resolved once each before any node is written, nodes and own relations are
+    created in chunks of FILE_BATCH_SIZE, and the per-file pipeline relations and elastic search entities are sent
+    FILE_BATCH_CONCURRENCY at a time. A file that fails a step is reported and left out of the later steps;
+    node_created tells whether its File node was written before that step failed.
+    """
+    results = [
+        {'global_entity_id': data.global_entity_id, 'status': 'failed', 'node_created': False, 'error_msg': ''}
+        for data in files
+    ]
+    batch = []
+    seen = set()
+    for index, data in enumerate(files):
+        error_msg = check_input_file(data)
+        if not data.global_entity_id:
+            error_msg = 'Missing required field global_entity_id'
+        elif data.global_entity_id in seen:
+            error_msg = 'Duplicate global_entity_id'
+        if error_msg:
+            results[index]['error_msg'] = error_msg
+            continue
+        seen.add(data.global_entity_id)
+        neo4j_payload, es_payload = build_file_entity(data)
+        batch.append(FileBatchEntry(index, data, neo4j_payload, es_payload))
+
+    try:
+        for step in (resolve_file_parents, create_file_nodes, link_file_parents, link_input_files, index_files):
+            await step([entry for entry in batch if not entry.error_msg], _logger)
+    finally:
+        invalidate_file_meta(entry.data.project_code for entry in batch if entry.node_created)
+    for entry in batch:
+        results[entry.index]['node_created'] = entry.node_created
+        if entry.error_msg:
+            results[entry.index]['error_msg'] = entry.error_msg
+        else:
+            results[entry.index]['status'] = 'success'
+    return results
+
+
+async def resolve_file_parents(batch, _logger):
+    # each parent folder and each container is looked up once, before any node is written
+    parent_geids = list({entry.data.parent_folder_geid for entry in batch if entry.data.parent_folder_geid})
+    parents = {}
+    # a lookup that failed says nothing about whether the parent exists, so it is reported as its own error
+    lookup_errors = {}
+    for chunk in chunked(parent_geids, ConfigClass.FILE_BATCH_SIZE):
+        try:
+            response = await http_clients.neo4j.post(ConfigClass.NEO4J_SERVICE_V1 + 'nodes/query/geids',
+                                                     json={'geids': chunk})
+            response.raise_for_status()
+        except httpx.HTTPError as e:
+            _logger.error(f'Parent folder query failed: {e}')
+            lookup_errors.update({geid: f'Neo4j error: {e}' for geid in chunk})
+            continue
+        parents.update({node['global_entity_id']: node for node in response.json()['result']})
+
+    projects = {}
+    for project_code in {entry.data.project_code for entry in batch if not entry.data.parent_folder_geid}:
+        try:
+            projects[project_code] = await containers.get(code=project_code)
+        except httpx.HTTPError as e:
+            _logger.error(f'Container query failed for {project_code}: {e}')
+            lookup_errors[project_code] = f'Neo4j error: {e}'
+
+    for entry in batch:
+        if entry.data.parent_folder_geid:
+            if entry.data.parent_folder_geid in lookup_errors:
+                entry.error_msg = lookup_errors[entry.data.parent_folder_geid]
+            elif entry.data.parent_folder_geid not in parents:
+                entry.error_msg = f'Parent folder not found: {entry.data.parent_folder_geid}'
+        elif entry.data.project_code in lookup_errors:
+            entry.error_msg = lookup_errors[entry.data.project_code]
+        elif not projects.get(entry.data.project_code):
+            entry.error_msg = f'Project not found: {entry.data.project_code}'
+
+
+async def create_file_nodes(batch, _logger):
+    zones = {}
+    for entry in batch:
+        zones.setdefault(entry.node['extra_labels'][0], []).append(entry)
+    for zone, entries in zones.items():
+        for chunk in chunked(entries, ConfigClass.FILE_BATCH_SIZE):
+            payload = [{key: value for key, value in entry.node.items() if key != 'extra_labels'} for entry in chunk]
+            try:
+                response = await http_clients.neo4j.post(ConfigClass.NEO4J_SERVICE_V1 + 'nodes/File/batch',
+                                                         json={'payload': payload, 'extra_labels': [zone]})
+                response.raise_for_status()
+            except httpx.HTTPError as e:
+                for entry in chunk:
+                    entry.error_msg = f'Neo4j error: {e}'
+                continue
+            for entry in chunk:
+                entry.node_created = True
+
+
+async def link_file_parents(batch, _logger):
+    # files in folders hang off the folder, the others off the container
+    groups = {'Folder': [], 'Container': []}
+    for entry in batch:
+        if entry.data.parent_folder_geid:
+            groups['Folder'].append((entry, {'global_entity_id': entry.data.parent_folder_geid}))
+        else:
+            groups['Container'].append((entry, {'code': entry.data.project_code}))
+    for start_label, links in groups.items():
+        for chunk in chunked(links, ConfigClass.FILE_BATCH_SIZE):
+            data = {
+                'payload': [
+                    {'start_params': start_params, 'end_params': {'global_entity_id': entry.data.global_entity_id}}
+                    for entry, start_params in chunk
+                ],
+                'params_location': ['start', 'end'],
+                'start_label': start_label,
+                'end_label': 'File',
+            }
+            try:
+                response = await http_clients.neo4j.post(ConfigClass.NEO4J_SERVICE_V1 + 'relations/own/batch',
+                                                         json=data)
+                response.raise_for_status()
+            except httpx.HTTPError as e:
+                for entry, _ in chunk:
+                    entry.error_msg = f'Neo4j error: {e}'
+
+
+async def link_input_files(batch, _logger):
+    entries = [entry for entry in batch if entry.data.input_file_id]
+    if not entries:
+        return
+    # the pipeline relation is made by node id, so the new nodes are read back in bulk first
+    file_nodes = {}
+    for chunk in chunked(entries, ConfigClass.FILE_BATCH_SIZE):
+        try:
+            response = await http_clients.neo4j.post(ConfigClass.NEO4J_SERVICE_V1 + 'nodes/query/geids',
+                                                     json={'geids': [entry.data.global_entity_id for entry in chunk]})
+            response.raise_for_status()
+        except httpx.HTTPError as e:
+            for entry in chunk:
+                entry.error_msg = f'Neo4j error: {e}'
+            continue
+        file_nodes.update({node['global_entity_id']: node for node in response.json()['result']})
+    semaphore = asyncio.Semaphore(ConfigClass.FILE_BATCH_CONCURRENCY)
+
+    async def link(entry):
+        file_node = file_nodes.get(entry.data.global_entity_id)
+        if not file_node:
+            entry.error_msg = f'File not found: {entry.data.global_entity_id}'
+            return
+        relation_payload = {
+            'start_id': entry.data.input_file_id,
+            'end_id': file_node['id'],
+            'properties': {'operator': entry.data.operator},
+        }
+        try:
+            async with semaphore:
+                response = await http_clients.neo4j.post(
+                    ConfigClass.NEO4J_SERVICE_V1 + f'relations/{entry.data.process_pipeline}', json=relation_payload
+                )
+        except httpx.HTTPError as e:
+            entry.error_msg = f'Neo4j error: {e}'
+            return
+        if response.status_code != 200:
+            entry.error_msg = f'Neo4j error: {response.text}'
+
+    await asyncio.gather(*[link(entry) for entry in entries if not entry.error_msg])
+
+
+async def copy_greenroom_attributes(batch, _logger):
+    entries = [entry for entry in batch if entry.data.process_pipeline == 'data_transfer' and entry.data.original_geid]
+    if not entries:
+        return
+    try:
+        greenroom_nodes = {}
+        for chunk in chunked([entry.data.original_geid for entry in entries], ConfigClass.FILE_BATCH_SIZE):
+            response = await http_clients.neo4j.post(ConfigClass.NEO4J_SERVICE_V1 + 'nodes/query/geids',
+                                                     json={'geids': chunk})
+            response.raise_for_status()
+            greenroom_nodes.update({node['global_entity_id']: node for node in response.json()['result']})
+        manifests = {}
+        for manifest_id in {node['manifest_id'] for node in greenroom_nodes.values() if 'manifest_id' in node}:
+            response = await http_clients.neo4j.get(ConfigClass.NEO4J_SERVICE_V1 + f'manifest/{manifest_id}')
+            if response.status_code == 200:
+                manifests[manifest_id] = response.json()['result']
+    except Exception as e:
+        # like a single create, a file is indexed without attributes when they cannot be read
+        _logger.error(str(e))
+        return
+    for entry in entries:
+        gr_file_node = greenroom_nodes.get(entry.data.original_geid)
+        if gr_file_node and 'manifest_id' in gr_file_node:
+            manifest = manifests.get(gr_file_node['manifest_id'])
+            entry.es_payload['attributes'] = greenroom_attributes(gr_file_node, manifest) if manifest else []
+
+
+async def index_files(batch, _logger):
+    entries = [entry for entry in batch if entry.data.process_pipeline != 'data_delete']
+    await copy_greenroom_attributes(entries, _logger)
+    semaphore = asyncio.Semaphore(ConfigClass.FILE_BATCH_CONCURRENCY)
+
+    async def index(entry):
+        try:
+            async with semaphore:
+                response = await http_clients.provenance.post(ConfigClass.PROVENANCE_SERVICE_V1 + 'entity/file',
+                                                              json=entry.es_payload)
+        except httpx.HTTPError as e:
+            entry.error_msg = f'Elastic Search Error: {e}'
+            return
+        if response.status_code != 200:
+            entry.error_msg = f'Elastic Search Error: {response.text}'
+
+    await asyncio.gather(*[index(entry) for entry in entries])
+
+
+async def create_trash_batch(items, _logger):
+    """Move many files to the trash and return one {geid, trash_geid, status, node_created, error_msg} per item.
+
+    Files are read with one nodes/query/geids call per FILE_BATCH_SIZE chunk and their containers come from the
+    container registry. TrashFiles are created through nodes/TrashFile/batch, grouped by labels, and hung off their
+    container through relations/own/batch. The deleted relations and elastic search updates go per file,
+    FILE_BATCH_CONCURRENCY at a time. A file listed more than once is trashed for its first item only, and
+    node_created tells whether a TrashFile was written for an item that failed afterwards.
+    """
+    results = [
+        {'geid': item.geid, 'trash_geid': item.trash_geid, 'status': 'failed', 'node_created': False, 'error_msg': ''}
+        for item in items
+    ]
+    file_nodes = {}
+    lookup_errors = {}
+    for chunk in chunked(list({item.geid for item in items}), ConfigClass.FILE_BATCH_SIZE):
+        try:
+            response = await http_clients.neo4j.post(ConfigClass.NEO4J_SERVICE_V1 + 'nodes/query/geids',
+                                                     json={'geids': chunk})
+            response.raise_for_status()
+        except httpx.HTTPError as e:
+            _logger.error(f'File query failed: {e}')
+            lookup_errors.update({geid: f'Neo4j error: {e}' for geid in chunk})
+            continue
+        nodes = [node for node in response.json()['result'] if 'File' in node.get('labels', [])]
+        node_ids.remember(nodes)
+        file_nodes.update({node['global_entity_id']: node for node in nodes})
+
+    projects = {}
+    for project_code in {node.get('project_code') for node in file_nodes.values()}:
+        try:
+            projects[project_code] = await containers.get(code=project_code)
+        except httpx.HTTPError as e:
+            _logger.error(f'Container query failed for {project_code}: {e}')
+
+    batch = []
+    seen = set()
+    seen_files = set()
+    for index, item in enumerate(items):
+        file_node = file_nodes.get(item.geid)
+        if item.geid in seen_files:
+            results[index]['error_msg'] = 'Duplicate geid'
+        elif item.geid in lookup_errors:
+            results[index]['error_msg'] = lookup_errors[item.geid]
+        elif not file_node:
+            results[index]['error_msg'] = f'File not found: {item.geid}'
+        elif not projects.get(file_node.get('project_code')):
+            results[index]['error_msg'] = f'Project not found: {file_node.get("project_code")}'
+        elif not item.trash_geid or item.trash_geid in seen:
+            results[index]['error_msg'] = 'Missing or duplicate trash_geid'
+        else:
+            seen.add(item.trash_geid)
+            seen_files.add(item.geid)
+            batch.append((index, item, file_node, build_trash_file(file_node, item.trash_geid, item.trash_full_path)))
+
+    def fail(entries, error_msg):
+        for index, *_ in entries:
+            results[index]['error_msg'] = error_msg
+        failed = {index for index, *_ in entries}
+        return [entry for entry in batch if entry[0] not in failed]
+
+    # create TrashFiles, one bulk call per label set and chunk
+    groups = {}
+    for entry in batch:
+        groups.setdefault(tuple(entry[3]['extra_labels']), []).append(entry)
+    for labels, entries in groups.items():
+        for chunk in chunked(entries, ConfigClass.FILE_BATCH_SIZE):
+            payload = [{key: value for key, value in entry[3].items() if key != 'extra_labels'} for entry in chunk]
+            try:
+                response = await http_clients.neo4j.post(ConfigClass.NEO4J_SERVICE_V1 + 'nodes/TrashFile/batch',
+                                                         json={'payload': payload, 'extra_labels': list(labels)})
+                response.raise_for_status()
+            except httpx.HTTPError as e:
+                batch = fail(chunk, f'Neo4j error: {e}')
+                continue
+            for index, *_ in chunk:
+                results[index]['node_created'] = True
+
+    for chunk in chunked(batch, ConfigClass.FILE_BATCH_SIZE):
+        data = {
+            'payload': [
+                {
+                    'start_params': {'code': file_node['project_code']},
+                    'end_params': {'global_entity_id': item.trash_geid},
+                }
+                for _, item, file_node, _ in chunk
+            ],
+            'params_location': ['start', 'end'],
+            'start_label': 'Container',
+            'end_label': 'TrashFile',
+        }
+        try:
+            response = await http_clients.neo4j.post(ConfigClass.NEO4J_SERVICE_V1 + 'relations/own/batch', json=data)
+            response.raise_for_status()
+        except httpx.HTTPError as e:
+            # the TrashFiles exist but hang off nothing; node_created tells the caller which ones to clean up
+            _logger.error(f'TrashFiles left unlinked: {[item.trash_geid for _, item, _, _ in chunk]}')
+            batch = fail(chunk, f'TrashFile created but not linked to its project: Neo4j error: {e}')
+
+    try:
+        trash_ids = await node_ids.resolve([item.trash_geid for _, item, _, _ in batch])
+    except httpx.HTTPError as e:
+        batch = fail(batch, f'Neo4j error: {e}')
+        trash_ids = {}
+    semaphore = asyncio.Semaphore(ConfigClass.FILE_BATCH_CONCURRENCY)
+
+    async def finish(index, item, file_node):
+        if item.trash_geid not in trash_ids:
+            results[index]['error_msg'] = f'TrashFile not found: {item.trash_geid}'
+            return
+        relation_payload = {
+            'start_id': file_node['id'],
+            'end_id': trash_ids[item.trash_geid],
+            'properties': {'operator': file_node.get('operator')},
+        }
+        async with semaphore:
+            try:
+                response = await http_clients.neo4j.post(ConfigClass.NEO4J_SERVICE_V1 + 'relations/deleted',
+                                                         json=relation_payload)
+                response.raise_for_status()
+            except httpx.HTTPError as e:
+                results[index]['error_msg'] = f'Neo4j error: {e}'
+                return
+            try:
+                es_res = await http_clients.provenance.put(ConfigClass.PROVENANCE_SERVICE_V1 + 'entity/file',
+                                                           json=build_trash_es_update(item.geid, item.trash_full_path))
+            except httpx.HTTPError as e:
+                results[index]['error_msg'] = f'Elastic Search Error: {e}'
+                return
+        if es_res.status_code != 200:
+            results[index]['error_msg'] = f'Elastic Search Error: {es_res.text}'
+            return
+        results[index]['status'] = 'success'
+
+    try:
+        await asyncio.gather(*[finish(index, item, file_node) for index, item, file_node, _ in batch])
+    finally:
+        invalidate_file_meta(file_node.get('project_code') for _, _, file_node, _ in batch)
+    return results
@@ -18,12 +18,12 @@
 # permissions and limitations under the Licence.
 # 
 
+import asyncio
 import json
 import math
 import os
 import time
 
-import httpx
 from fastapi import APIRouter
 from fastapi_utils.cbv import cbv
 from logger import LoggerFactory
@@ -31,13 +31,45 @@ from logger import LoggerFactory
 from config import ConfigClass
 from models import folders as models
 from models.base_models import EAPIResponseCode
+from models.meta import cache_child_routing
 from models.meta import get_parent_connections
+from models.meta import invalidate_file_meta
+from models.meta import invalidate_routing
+from resources.http_clients import http_clients
+from resources.node_ids import node_ids
 from resources.error_handler import catch_internal
 
 router = APIRouter()
 _API_NAMESPACE = 'api_folder_nodes'
 
 
+async def index_folders(es_bodies, _logger):
+    """Create the elastic search documents of new folders, FOLDER_INDEX_CONCURRENCY at a time.
+
+    The provenance service indexes one document per call. Returns a {global_entity_id, error_msg} per failed folder.
+    """
+    semaphore = asyncio.Semaphore(ConfigClass.FOLDER_INDEX_CONCURRENCY)
+
+    async def index(es_body):
+        try:
+            async with semaphore:
+                es_res = await http_clients.provenance.post(ConfigClass.PROVENANCE_SERVICE_V1 + 'entity/file',
+                                                            json=es_body)
+        except Exception as e:
+            _logger.error('Error while call elastic search' + str(e))
+            return {'global_entity_id': es_body['global_entity_id'], 'error_msg': 'Error while call elastic search'}
+        if es_res.status_code != 200:
+            _logger.error(f'Error while creating folder node in elastic search : {es_res.text}')
+            return {
+                'global_entity_id': es_body['global_entity_id'],
+                'error_msg': 'Error while creating folder node in elastic search',
+            }
+        return None
+
+    outcomes = await asyncio.gather(*[index(es_body) for es_body in es_bodies])
+    return [outcome for outcome in outcomes if outcome]
+
+
 @cbv(router)
 class FolderNodes:
     def __init__(self):
@@ -45,7 +77,7 @@ class FolderNodes:
 
     @router.post('/folders/batch', response_model=models.FoldersPOSTResponse, summary='Batch Folder Nodes Restful')
     # @catch_internal(_API_NAMESPACE)
-    def batch_folder(self, request_payload: models.BatchFoldersPOST):
+    async def batch_folder(self, request_payload: models.BatchFoldersPOST):
         """Post function to btach create folder."""
         self._logger.info(f'folder payload: {request_payload.__dict__}')
         api_response = models.APIResponse()
@@ -56,6 +88,7 @@ class FolderNodes:
 
         nodes_data = []
         relations_data = []
+        es_bodies = []
 
         for item in payload:
             item = dict(item)
@@ -91,63 +124,58 @@ class FolderNodes:
                 )
 
             if not request_payload.link_container and len(new_node['folder_relative_path']):
-                self._logger.info('create folder in elastic search')
-                try:
-                    es_body = {
-                        'global_entity_id': new_node['global_entity_id'],
-                        'zone': namespace,
-                        'data_type': 'Folder',
-                        'operator': new_node['uploader'],
-                        'file_size': 0,
-                        'tags': new_node['tags'],
-                        'archived': False,
-                        'location': '',
-                        'time_lastmodified': time.time(),
-                        'process_pipeline': '',
-                        'uploader': new_node['uploader'],
-                        'file_name': new_node['name'],
-                        'time_created': time.time(),
-                        'atlas_guid': '',
-                        'display_path': new_node['display_path'],
-                        'dcm_id': None,
-                        'project_code': new_node['project_code'],
-                        'priority': 10,
-                    }
-                    with httpx.Client() as client:
-                        es_res = client.post(ConfigClass.PROVENANCE_SERVICE_V1 + 'entity/file', json=es_body)
-                    self._logger.info(es_body)
-                    self._logger.info(es_res.text)
-                    if es_res.status_code != 200:
-                        self._logger.error(f'Error while creating folder node in elastic search : {es_res.text}')
-                        api_response.code = EAPIResponseCode.internal_error
-                        api_response.result = 'Error while creating folder node in elastic search'
-                        return api_response.json_response()
-                except Exception as e:
-                    self._logger.error('Error while call elastic search' + str(e))
-                    api_response.code = EAPIResponseCode.internal_error
-                    api_response.result = 'Error while call elastic search' + str(e)
-                    return api_response.json_response()
-
-        result_create_node = models.http_bulk_post_node(nodes_data, extra_labels)
+                es_bodies.append({
+                    'global_entity_id': new_node['global_entity_id'],
+                    'zone': namespace,
+                    'data_type': 'Folder',
+                    'operator': new_node['uploader'],
+                    'file_size': 0,
+                    'tags': new_node['tags'],
+                    'archived': False,
+                    'location': '',
+                    'time_lastmodified': time.time(),
+                    'process_pipeline': '',
+                    'uploader': new_node['uploader'],
+                    'file_name': new_node['name'],
+                    'time_created': time.time(),
+                    'atlas_guid': '',
+                    'display_path': new_node['display_path'],
+                    'dcm_id': None,
+                    'project_code': new_node['project_code'],
+                    'priority': 10,
+                })
 
-        if result_create_node.status_code == 200:
+        async def create_nodes():
+            try:
+                result_create_node = await models.http_bulk_post_node(nodes_data, extra_labels)
+            except Exception as e:
+                self._logger.error(f'Error while creating folder nodes: {e}')
+                return EAPIResponseCode.internal_error, {'result': 'failed to create folders'}
+            if result_create_node.status_code != 200:
+                return EAPIResponseCode.internal_error, {'result': 'failed to create folders'}
+            invalidate_routing(node['global_entity_id'] for node in nodes_data)
+            invalidate_file_meta(node['project_code'] for node in nodes_data)
             if relations_data:
-                result_link_projects = models.bulk_link_project(['start', 'end'], 'Container', 'Folder', relations_data)
-                if result_link_projects.status_code == 200:
-                    api_response.code = EAPIResponseCode.success
-                    api_response.result = {'result': 'success'}
-                else:
-                    api_response.code = EAPIResponseCode.internal_error
-                    api_response.result = {'result': 'failed to link projects with folders'}
-        else:
-            api_response.code = EAPIResponseCode.internal_error
-            api_response.result = {'result': 'failed to create folders'}
+                result_link_projects = await models.bulk_link_project(['start', 'end'], 'Container', 'Folder', relations_data)
+                if result_link_projects.status_code != 200:
+                    return EAPIResponseCode.internal_error, {'result': 'failed to link projects with folders'}
+            return EAPIResponseCode.success, {'result': 'success'}
 
+        # the elastic search documents do not depend on the nodes, so both are written at once
+        self._logger.info(f'create {len(es_bodies)} folders in elastic search')
+        (api_response.code, api_response.result), es_failures = await asyncio.gather(
+            create_nodes(), index_folders(es_bodies, self._logger)
+        )
+        if es_failures:
+            # the nodes exist once created, so a retry of the whole batch would duplicate them; the caller
+            # gets success with the folders to re-index instead, and an error only when creation failed too
+            api_response.error_msg = 'Error while creating folder node in elastic search'
+            api_response.result = {**api_response.result, 'failed': es_failures}
         return api_response.json_response()
 
     @router.post('/folders', response_model=models.FoldersPOSTResponse, summary='Folder Nodes Restful')
     @catch_internal(_API_NAMESPACE)
-    def post(self, request_payload: models.FoldersPOST):
+    async def post(self, request_payload: models.FoldersPOST):
         """Post function to create entity."""
         self._logger.info(f'folder payload: {request_payload.__dict__}')
         api_response = models.APIResponse()
@@ -190,8 +218,7 @@ class FolderNodes:
                 'project_code': request_payload.project_code,
                 'priority': 10,
             }
-            with httpx.Client() as client:
-                es_res = client.post(ConfigClass.PROVENANCE_SERVICE_V1 + 'entity/file', json=es_body)
+            es_res = await http_clients.provenance.post(ConfigClass.PROVENANCE_SERVICE_V1 + 'entity/file', json=es_body)
             if es_res.status_code != 200:
                 self._logger.error(f'Error while creating folder node in elastic search : {es_res.text}')
                 api_response.code = EAPIResponseCode.internal_error
@@ -202,16 +229,22 @@ class FolderNodes:
         for k, v in request_payload.extra_attrs.items():
             new_node[k] = v
         self._logger.info(f' neo4j folder creation payload:  {new_node}')
-        result_create_node = models.http_post_node(new_node, request_payload.global_entity_id)
+        result_create_node = await models.http_post_node(new_node, request_payload.global_entity_id)
         if result_create_node.status_code == 200:
             node_created = result_create_node.json()[0]
+            # the new node carries its id, so linking it needs no lookup
+            node_ids.remember([node_created])
+            invalidate_routing([request_payload.global_entity_id])
             # if not root node folder
             if request_payload.folder_relative_path and request_payload.folder_parent_geid and not is_trashbin_root:
-                models.link_folder_parent(
+                await models.link_folder_parent(
                     namespace, request_payload.folder_parent_geid, node_created['global_entity_id']
                 )
+                # only a linked folder really sits under its parent; link_folder_parent raises otherwise
+                cache_child_routing(request_payload.folder_parent_geid, node_created)
             else:
-                models.link_project(namespace, request_payload.project_code, node_created['global_entity_id'])
+                await models.link_project(namespace, request_payload.project_code, node_created['global_entity_id'])
+            invalidate_file_meta([request_payload.project_code])
             api_response.code = EAPIResponseCode.success
             api_response.result = node_created
             return api_response.json_response()
@@ -220,7 +253,7 @@ class FolderNodes:
 
     @router.get('/folders', response_model=models.FoldersQueryResponse, summary='Folder Nodes Restful')
     @catch_internal(_API_NAMESPACE)
-    def query(self, zone, project_code, folder_relative_path=None, uploader=None):
+    async def query(self, zone, project_code, folder_relative_path=None, uploader=None):
         """Get function to query the entity by condition."""
         api_response = models.APIResponse()
         if not zone in ['core', 'greenroom']:
@@ -233,7 +266,7 @@ class FolderNodes:
             query_payload['folder_relative_path'] = folder_relative_path
         if uploader:
             query_payload['uploader'] = uploader
-        query_respon = models.http_query_node(namespace, query_payload)
+        query_respon = await models.http_query_node(namespace, query_payload)
         if query_respon.status_code == 200:
             api_response.code = EAPIResponseCode.success
             api_response.result = query_respon.json()
@@ -18,10 +18,8 @@
 # permissions and limitations under the Licence.
 # 
 
-import re
-
-import httpx
 from fastapi import APIRouter
+from fastapi.concurrency import run_in_threadpool
 from fastapi_sqlalchemy import db
 from fastapi_utils.cbv import cbv
 from logger import LoggerFactory
@@ -30,12 +28,19 @@ from config import ConfigClass
 from models import manifest
 from models.base_models import APIResponse
 from models.base_models import EAPIResponseCode
-from models.manifest_sql import DataAttributeModel
 from models.manifest_sql import DataManifestModel
+from resources.http_clients import http_clients
 from .service import Manifest
+from .validator import CHOICE_VALUE_PATTERN
+from .validator import TEXT_MAX_LENGTH
 from .utils import check_attributes
-from .utils import get_file_node_bygeid
-from .utils import get_trashfile_node_bygeid
+from .utils import check_new_manifest
+from .utils import create_attributes
+from .utils import create_manifest
+from .utils import delete_manifest
+from .utils import get_manifest_attributes
+from .utils import get_manifest_model
+from .utils import get_nodes_bygeids
 
 manifest_router = APIRouter()
 _logger = LoggerFactory('api_manifest').get_logger()
@@ -58,28 +63,12 @@ class RestfulManifests:
     def post(self, data: manifest.POSTManifestsRequest):
         api_response = APIResponse()
 
-        manifests = db.session.query(DataManifestModel).filter_by(project_code=data.project_code)
-        if manifests.count() > 9:
-            api_response.code = EAPIResponseCode.forbidden
-            api_response.result = "Manifest limit reached"
+        conflict = check_new_manifest(data.project_code, data.name)
+        if conflict:
+            api_response.code, api_response.result = conflict
             _logger.error(api_response.result)
             return api_response.json_response()
-
-        for item in manifests:
-            result = item.to_dict()
-            if data.name == result["name"]:
-                api_response.code = EAPIResponseCode.bad_request
-                api_response.result = "duplicate manifest name"
-                _logger.error(api_response.result)
-                return api_response.json_response()
-        model_data = {
-            "name": data.name,
-            "project_code": data.project_code,
-        }
-        manifest = DataManifestModel(**model_data)
-        db.session.add(manifest)
-        db.session.commit()
-        db.session.refresh(manifest)
+        manifest = create_manifest(data.project_code, data.name)
 
         api_response.result = manifest.to_dict()
         return api_response.json_response()
@@ -119,13 +108,14 @@ class RestfulManifest:
         db.session.add(manifest)
         db.session.commit()
         db.session.refresh(manifest)
+        Manifest.invalidate(manifest_id=manifest.id, project_code=manifest.project_code)
         my_res.result = manifest.to_dict()
         return my_res.json_response()
 
     @manifest_router.delete('/manifest/{manifest_id}', response_model=manifest.DELETEManifestResponse, summary="delete a single manifest")
-    def delete(self, manifest_id):
+    async def delete(self, manifest_id):
         my_res = APIResponse()
-        manifest = db.session.query(DataManifestModel).get(manifest_id)
+        manifest = await run_in_threadpool(get_manifest_model, manifest_id)
         if not manifest:
             my_res.code = EAPIResponseCode.not_found
             my_res.error_msg = 'Manifest not found'
@@ -133,22 +123,16 @@ class RestfulManifest:
             return my_res.json_response()
 
         # check if connect to any files
-        with httpx.Client() as client:
-            response = client.post(
-                ConfigClass.NEO4J_SERVICE_V1 + "nodes/File/query/count", json={"manifest_id": int(manifest_id)}
-            )
+        response = await http_clients.neo4j.post(
+            ConfigClass.NEO4J_SERVICE_V1 + "nodes/File/query/count", json={"manifest_id": int(manifest_id)}
+        )
         if response.json()["count"] > 0:
             my_res.code = EAPIResponseCode.forbidden
             my_res.result = "Can't delete manifest attached to files"
             _logger.error(my_res.result)
             return my_res.json_response()
 
-        attributes = db.session.query(DataAttributeModel).filter_by(manifest_id=manifest.id)
-        for atr in attributes:
-            db.session.delete(atr)
-        db.session.commit()
-        db.session.delete(manifest)
-        db.session.commit()
+        await run_in_threadpool(delete_manifest, manifest)
         my_res.result = "success"
         return my_res.json_response()
 
@@ -156,37 +140,20 @@ class RestfulManifest:
 @cbv(manifest_router)
 class ImportManifest:
     @manifest_router.post('/manifest/file/import', response_model=manifest.POSTImportResponse, summary="Import a data manifest")
-    def post(self, data: manifest.POSTImportRequest):
+    async def post(self, data: manifest.POSTImportRequest):
         api_response = APIResponse()
         # limit check
-        manifests = db.session.query(DataManifestModel).filter_by(project_code=data.project_code)
-        if manifests.count() > 9:
-            api_response.code = EAPIResponseCode.forbidden
-            api_response.result = "Manifest limit reached"
+        conflict = await run_in_threadpool(check_new_manifest, data.project_code, data.name)
+        if conflict:
+            api_response.code, api_response.result = conflict
             _logger.error(api_response.result)
             return api_response.json_response()
 
-        for manifest in manifests:
-            result = manifest.to_dict()
-            if data.name == result["name"]:
-                api_response.code = EAPIResponseCode.bad_request
-                api_response.result = "duplicate manifest name"
-                _logger.error(api_response.result)
-                return api_response.json_response()
-
-        manifest_data = {
-            "name": data.name,
-            "project_code": data.project_code
-        }
         # Create manifest in psql
-        manifest = DataManifestModel(**manifest_data)
-        db.session.add(manifest)
-        db.session.commit()
-        db.session.refresh(manifest)
+        manifest = await run_in_threadpool(create_manifest, data.project_code, data.name)
 
         attributes = data.attributes
         attr_data = {}
-        mutli_requirement = re.compile("^[a-zA-z0-9-_!%&/()=?*+#.;,]{1,32}$")
         for attr in attributes:
             if attr["name"] in attr_data:
                 api_response.code = EAPIResponseCode.bad_request
@@ -194,13 +161,13 @@ class ImportManifest:
                 _logger.error(api_response.result)
                 return api_response.json_response()
             if attr["type"] == "multiple_choice":
-                if not re.search(mutli_requirement, attr["value"]):
+                if not CHOICE_VALUE_PATTERN.search(attr["value"]):
                     api_response.code = EAPIResponseCode.bad_request
                     api_response.result = "regex value error"
                     _logger.error(api_response.result)
                     return api_response.json_response()
             else:
-                if attr["value"] and len(attr["value"]) > 100:
+                if attr["value"] and len(attr["value"]) > TEXT_MAX_LENGTH:
                     api_response.code = EAPIResponseCode.bad_request
                     api_response.result = "text to long"
                     _logger.error(api_response.result)
@@ -230,10 +197,9 @@ class ImportManifest:
                 attr_data[field] = attribute[field]
             # check if connect to any files
             if not attr_data["optional"]:
-                with httpx.Client() as client:
-                    response = client.post(
-                        ConfigClass.NEO4J_SERVICE_V1 + "nodes/File/query/count", json={"manifest_id": manifest.id}
-                    )
+                response = await http_clients.neo4j.post(
+                    ConfigClass.NEO4J_SERVICE_V1 + "nodes/File/query/count", json={"manifest_id": manifest.id}
+                )
                 if response.json()["count"] > 0:
                     api_response.code = EAPIResponseCode.forbidden
                     api_response.result = "Can't add required attributes to manifest attached to files"
@@ -242,11 +208,7 @@ class ImportManifest:
             attr_list.append(attr_data)
 
         # Create create attributes in psql
-        for attr in attr_list:
-            attribute = DataAttributeModel(**attr)
-            db.session.add(attribute)
-            db.session.commit()
-            db.session.refresh(attribute)
+        await run_in_threadpool(create_attributes, attr_list)
         api_response.result = "Success"
         return api_response.json_response()
 
@@ -259,52 +221,55 @@ class ExportManifest:
         response_data = {
             "attributes": []
         }
-        manifest = db.session.query(DataManifestModel).get(manifest_id)
-        attributes = db.session.query(DataAttributeModel).filter_by(manifest_id=manifest.id). \
-            order_by(DataAttributeModel.id.asc())
-        for attribute in attributes:
+        manifest = Manifest.get_by_id(manifest_id)
+        for attribute in manifest["attributes"]:
             response_data["attributes"].append({
-                "name": attribute.name,
-                "type": attribute.type.value,
-                "value": attribute.value,
-                "optional": attribute.optional,
+                "name": attribute["name"],
+                "type": attribute["type"],
+                "value": attribute["value"],
+                "optional": attribute["optional"],
             })
-        response_data["name"] = manifest.name
-        response_data["project_code"] = manifest.project_code
+        response_data["name"] = manifest["name"]
+        response_data["project_code"] = manifest["project_code"]
         return response_data
 
 
 @cbv(manifest_router)
 class FileManifestQuery:
     @manifest_router.post('/manifest/query', response_model=manifest.POSTQueryResponse, summary="Query file manifests")
-    def post(self, data: manifest.POSTQueryRequest):
+    async def post(self, data: manifest.POSTQueryRequest):
         api_response = APIResponse()
         geid_list = data.geid_list
         lineage_view = data.lineage_view
 
+        nodes = await get_nodes_bygeids(geid_list) if geid_list else {}
+        file_nodes = {}
+        for geid in geid_list:
+            node = nodes.get(geid)
+            if node and ("File" in node["labels"] or "TrashFile" in node["labels"]) and node.get("manifest_id"):
+                file_nodes[geid] = node
+        manifest_attributes = await run_in_threadpool(
+            get_manifest_attributes, {int(node["manifest_id"]) for node in file_nodes.values()}
+        )
+
         results = {}
         for geid in geid_list:
-            file_node = get_file_node_bygeid(geid)
+            file_node = file_nodes.get(geid)
             if not file_node:
-                file_node = get_trashfile_node_bygeid(geid)
-
-            if file_node and file_node.get("manifest_id"):
-                attributes = []
-                manifest_id = file_node["manifest_id"]
-                manifest = db.session.query(DataManifestModel).get(manifest_id)
-                sql_attributes = db.session.query(DataAttributeModel).filter_by(manifest_id=manifest_id)
-                for sql_attribute in sql_attributes:
-                    attributes.append({
-                        "id": sql_attribute.id,
-                        "name": sql_attribute.name,
-                        "manifest_name": manifest.name,
-                        "value": file_node.get("attr_" + sql_attribute.name, ""),
-                        "type": sql_attribute.type.value,
-                        "optional": sql_attribute.optional,
-                        "manifest_id": manifest_id,
-                    })
-                results[geid] = attributes
-            else:
                 results[geid] = {}
+                continue
+            manifest_id = file_node["manifest_id"]
+            attributes = []
+            for sql_attribute, manifest_name in manifest_attributes[int(manifest_id)]:
+                attributes.append({
+                    "id": sql_attribute.id,
+                    "name": sql_attribute.name,
+                    "manifest_name": manifest_name,
+                    "value": file_node.get("attr_" + sql_attribute.name, ""),
+                    "type": sql_attribute.type.value,
+                    "optional": sql_attribute.optional,
+                    "manifest_id": manifest_id,
+                })
+            results[geid] = attributes
         api_response.result = results
         return api_response.json_response()
@@ -18,36 +18,98 @@
 # permissions and limitations under the Licence.
 # 
 
+import copy
+import threading
+
 from fastapi_sqlalchemy import db
-from models.manifest_sql import DataManifestModel , DataAttributeModel
+from sqlalchemy.orm import selectinload
+
+from config import ConfigClass
+from models.manifest_sql import DataManifestModel
+from resources.cache import TTLCache
+
+from .validator import ManifestValidator
+
+# invalidate only reaches the worker process that made the write, so the TTL bounds how long the other workers
+# keep validating against a changed or deleted manifest
+manifest_cache = TTLCache('manifest', ConfigClass.MANIFEST_CACHE_SIZE, ConfigClass.MANIFEST_CACHE_TTL)
+validator_cache = TTLCache('manifest_validator', ConfigClass.MANIFEST_CACHE_SIZE, ConfigClass.MANIFEST_CACHE_TTL)
+
 
 class Manifest:
+    # bumped by every invalidate, so a value read before it is not stored after it
+    _generation = 0
+    _lock = threading.Lock()
+
+    @staticmethod
+    def to_dict(manifest):
+        result = manifest.to_dict()
+        result["attributes"] = [atr.to_dict() for atr in manifest.attributes]
+        return result
+
+    @classmethod
+    def _store(cls, cache, key, value, generation):
+        with cls._lock:
+            if generation == cls._generation:
+                cache.set(key, value)
 
     @classmethod
     def get_by_project_name(cls, project_code):
-        manifests = db.session.query(DataManifestModel).filter_by(project_code=project_code)
-        results = []
-        for manifest in manifests:
-            result = manifest.to_dict()
-            result["attributes"] = []
-            attributes = db.session.query(DataAttributeModel).filter_by(
-                manifest_id=manifest.id
-            ).order_by(DataAttributeModel.id.asc())
-            for atr in attributes:
-                result["attributes"].append(atr.to_dict())
-            results.append(result)
-        return results
+        cached = manifest_cache.get(('project_code', project_code))
+        if cached is not None:
+            return copy.deepcopy(cached)
+        generation = cls._generation
+        manifests = db.session.query(DataManifestModel).options(
+            selectinload(DataManifestModel.attributes)
+        ).filter_by(project_code=project_code)
+        results = [cls.to_dict(manifest) for manifest in manifests]
+        cls._store(manifest_cache, ('project_code', project_code), results, generation)
+        return copy.deepcopy(results)
 
     @classmethod
     def get_by_id(cls, id):
-        manifest = db.session.query(DataManifestModel).get(id)
+        cached = manifest_cache.get(('id', str(id)))
+        if cached is not None:
+            return copy.deepcopy(cached)
+        generation = cls._generation
+        manifest = db.session.query(DataManifestModel).options(
+            selectinload(DataManifestModel.attributes)
+        ).get(id)
         if manifest:
-            result = manifest.to_dict()
-            result["attributes"] = []
-            attributes = db.session.query(DataAttributeModel).filter_by(
-                manifest_id=id
-            ).order_by(DataAttributeModel.id.asc())
-            for atr in attributes:
-                result["attributes"].append(atr.to_dict())
-            return result
-        return None
\ No newline at end of file
+            result = cls.to_dict(manifest)
+            cls._store(manifest_cache, ('id', str(id)), result, generation)
+            return copy.deepcopy(result)
+        return None
+
+    @classmethod
+    def get_validator(cls, id):
+        validator = validator_cache.get(str(id))
+        if validator is not None:
+            return validator
+        generation = cls._generation
+        manifest = cls.get_by_id(id)
+        if not manifest:
+            return None
+        validator = ManifestValidator(manifest)
+        cls._store(validator_cache, str(id), validator, generation)
+        return validator
+
+    @classmethod
+    def invalidate(cls, manifest_id=None, project_code=None):
+        """Drop cached entries after a manifest or attribute write.
+
+        A manifest id drops the manifest and every cached project listing that contains it; a project_code drops
+        that project's listing, which covers manifests created in or moved to it.
+        """
+        with cls._lock:
+            cls._generation += 1
+        if manifest_id is not None:
+            manifest_cache.pop(('id', str(manifest_id)))
+            validator_cache.pop(str(manifest_id))
+            manifest_cache.pop_where(
+                lambda key, value: key[0] == 'project_code' and any(
+                    str(item["id"]) == str(manifest_id) for item in value
+                )
+            )
+        if project_code is not None:
+            manifest_cache.pop(('project_code', project_code))
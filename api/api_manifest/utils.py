@@ -18,45 +18,115 @@
 # permissions and limitations under the Licence.
 # 
 
-import httpx
 from config import ConfigClass
+from resources.http_clients import http_clients
+from resources.node_ids import node_ids
 from models.manifest_sql import DataManifestModel , DataAttributeModel, TypeEnum
 from fastapi_sqlalchemy import db
-import re
+from models.base_models import EAPIResponseCode
+from .service import Manifest
+from .validator import ManifestValidator
 
 
-def get_file_node_bygeid(geid):
+async def get_file_node_bygeid(geid):
     post_data = {"global_entity_id": geid}
-    with httpx.Client() as client:
-        response = client.post(ConfigClass.NEO4J_SERVICE_V1 + f"nodes/File/query", json=post_data)
+    response = await http_clients.neo4j.post(ConfigClass.NEO4J_SERVICE_V1 + f"nodes/File/query", json=post_data)
     if not response.json():
         return None
     return response.json()[0]
 
 
-def get_folder_node_bygeid(geid):
+async def get_folder_node_bygeid(geid):
     # imported but not used
     post_data = {"global_entity_id": geid}
-    with httpx.Client() as client:
-        response = client.post(ConfigClass.NEO4J_SERVICE_V1 + f"nodes/Folder/query", json=post_data)
+    response = await http_clients.neo4j.post(ConfigClass.NEO4J_SERVICE_V1 + f"nodes/Folder/query", json=post_data)
     if not response.json():
         return None
     return response.json()[0]
 
 
-def get_trashfile_node_bygeid(geid):
+async def get_nodes_bygeids(geids):
+    response = await http_clients.neo4j.post(ConfigClass.NEO4J_SERVICE_V1 + "nodes/query/geids", json={"geids": geids})
+    response.raise_for_status()
+    nodes = response.json()["result"]
+    node_ids.remember(nodes)
+    return {node["global_entity_id"]: node for node in nodes}
+
+
+def get_manifest_attributes(manifest_ids):
+    """Load the attributes of all given manifests with one joined query, keyed by manifest id."""
+    manifest_attributes = {manifest_id: [] for manifest_id in manifest_ids}
+    if not manifest_ids:
+        return manifest_attributes
+    rows = db.session.query(DataAttributeModel, DataManifestModel.name).join(
+        DataManifestModel, DataAttributeModel.manifest_id == DataManifestModel.id
+    ).filter(DataManifestModel.id.in_(manifest_ids)).order_by(DataAttributeModel.id.asc())
+    for sql_attribute, manifest_name in rows:
+        manifest_attributes[sql_attribute.manifest_id].append((sql_attribute, manifest_name))
+    return manifest_attributes
+
+
+# the helpers below only talk to Postgres through the blocking session; async handlers run them with
+# run_in_threadpool so they do not hold up the event loop
+
+
+def check_new_manifest(project_code, name):
+    """Return (code, message) when the project cannot take a manifest with this name, else None."""
+    manifests = db.session.query(DataManifestModel).filter_by(project_code=project_code)
+    if manifests.count() > 9:
+        return EAPIResponseCode.forbidden, "Manifest limit reached"
+    for item in manifests:
+        if name == item.to_dict()["name"]:
+            return EAPIResponseCode.bad_request, "duplicate manifest name"
+    return None
+
+
+def create_manifest(project_code, name):
+    manifest = DataManifestModel(name=name, project_code=project_code)
+    db.session.add(manifest)
+    db.session.commit()
+    db.session.refresh(manifest)
+    Manifest.invalidate(project_code=manifest.project_code)
+    return manifest
+
+
+def create_attributes(attr_list):
+    attributes = []
+    for attr in attr_list:
+        attribute = DataAttributeModel(**attr)
+        db.session.add(attribute)
+        db.session.commit()
+        db.session.refresh(attribute)
+        Manifest.invalidate(manifest_id=attribute.manifest_id)
+        attributes.append(attribute)
+    return attributes
+
+
+def get_manifest_model(manifest_id):
+    return db.session.query(DataManifestModel).get(manifest_id)
+
+
+def delete_manifest(manifest):
+    attributes = db.session.query(DataAttributeModel).filter_by(manifest_id=manifest.id)
+    for atr in attributes:
+        db.session.delete(atr)
+    db.session.commit()
+    db.session.delete(manifest)
+    db.session.commit()
+    Manifest.invalidate(manifest_id=manifest.id)
+
+
+async def get_trashfile_node_bygeid(geid):
     post_data = {"global_entity_id": geid}
-    with httpx.Client() as client:
-        response = client.post(ConfigClass.NEO4J_SERVICE_V1 + f"nodes/TrashFile/query", json=post_data)
+    response = await http_clients.neo4j.post(ConfigClass.NEO4J_SERVICE_V1 + f"nodes/TrashFile/query", json=post_data)
     if not response.json():
         return None
     return response.json()[0]
 
 
-def get_file_node(full_path):
+async def get_file_node(full_path):
     post_data = {"full_path": full_path}
-    with httpx.Client() as client:
-        response = client.post(ConfigClass.NEO4J_SERVICE_V1 + f"nodes/File/query", json=post_data)
+    response = await http_clients.neo4j.post(ConfigClass.NEO4J_SERVICE_V1 + f"nodes/File/query", json=post_data)
     if not response.json():
         return None
     return response.json()[0]
@@ -68,32 +138,12 @@ def is_greenroom(file_node):
         return True
 
 def has_valid_attributes(manifest_id, data):
-    attributes = db.session.query(DataAttributeModel).filter_by(manifest_id=manifest_id).order_by(DataAttributeModel.id.asc())
-    for attr in attributes:
-        if not attr.optional and not attr.name in data.get("attributes", {}):
-            return False, "Missing required attribute"
-        if attr.type.value == "multiple_choice":
-            value = data.get("attributes", {}).get(attr.name)
-            if value:
-                if not value in attr.value.split(","):
-                    return False, "Invalid choice field"
-            else:
-                if not attr.optional:
-                    return False, "Field required"
-        if attr.type.value == "text":
-            value = data.get("attributes", {}).get(attr.name)
-            if value:
-                if len(value) > 100:
-                    return False, "text to long"
-            else:
-                if not attr.optional:
-                    return False, "Field required"
-    return True, ""
+    validator = Manifest.get_validator(manifest_id)
+    if not validator:
+        return True, ""
+    return validator.validate(data.get("attributes", {}), text_too_long="text to long")
+
 
 def check_attributes(attributes):
     # Apply name restrictions
-    name_requirements = re.compile("^[a-zA-z0-9]{1,32}$")
-    for key, value in attributes.items():
-        if not re.search(name_requirements, key):
-            return False, "regex validation error"
-    return True, ""
+    return ManifestValidator.check_names(attributes)
@@ -0,0 +1,74 @@
+# Copyright 2022 Indoc Research
+# 
+# Licensed under the EUPL, Version 1.2 or – as soon they
+# will be approved by the European Commission - subsequent
+# versions of the EUPL (the "Licence");
+# You may not use this work except in compliance with the
+# Licence.
+# You may obtain a copy of the Licence at:
+# 
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-eupl-12
+# 
+# Unless required by applicable law or agreed to in
+# writing, software distributed under the Licence is
+# distributed on an "AS IS" basis,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied.
+# See the Licence for the specific language governing
+# permissions and limitations under the Licence.
+# 
+
+
+import re
+
+ATTRIBUTE_NAME_PATTERN = re.compile("^[a-zA-z0-9]{1,32}$")
+CHOICE_VALUE_PATTERN = re.compile("^[a-zA-z0-9-_!%&/()=?*+#.;,]{1,32}$")
+TEXT_MAX_LENGTH = 100
+
+
+class ManifestValidator:
+    """Attribute checks for one manifest, prepared once so that validating a payload is pure in-memory work."""
+
+    def __init__(self, manifest):
+        self.manifest_id = manifest["id"]
+        self.manifest_name = manifest["name"]
+        self.names = frozenset(attr["name"] for attr in manifest["attributes"])
+        self.required = frozenset(attr["name"] for attr in manifest["attributes"] if not attr["optional"])
+        self.choices = {
+            attr["name"]: frozenset(attr["value"].split(","))
+            for attr in manifest["attributes"] if attr["type"] == "multiple_choice"
+        }
+        self.text_names = frozenset(attr["name"] for attr in manifest["attributes"] if attr["type"] == "text")
+        # checks run in attribute id order so the first error reported matches the manifest definition
+        self.ordered = tuple(
+            (attr["name"], attr["type"], not attr["optional"]) for attr in manifest["attributes"]
+        )
+
+    @staticmethod
+    def check_names(attributes):
+        for key in attributes:
+            if not ATTRIBUTE_NAME_PATTERN.search(key):
+                return False, "regex validation error"
+        return True, ""
+
+    def unknown_names(self, attributes):
+        return [key for key in attributes if key not in self.names]
+
+    def validate(self, attributes, text_too_long="text too long"):
+        for name, attr_type, required in self.ordered:
+            if required and name not in attributes:
+                return False, "Missing required attribute"
+            value = attributes.get(name)
+            if attr_type == "multiple_choice":
+                if value:
+                    if value not in self.choices[name]:
+                        return False, "Invalid choice field"
+                elif required:
+                    return False, "Field required"
+            if attr_type == "text":
+                if value:
+                    if len(value) > TEXT_MAX_LENGTH:
+                        return False, text_too_long
+                elif required:
+                    return False, "Field required"
+        return True, ""
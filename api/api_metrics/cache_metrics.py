@@ -0,0 +1,43 @@
+# Copyright 2022 Indoc Research
+# 
+# Licensed under the EUPL, Version 1.2 or – as soon they
+# will be approved by the European Commission - subsequent
+# versions of the EUPL (the "Licence");
+# You may not use this work except in compliance with the
+# Licence.
+# You may obtain a copy of the Licence at:
+# 
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-eupl-12
+# 
+# Unless required by applicable law or agreed to in
+# writing, software distributed under the Licence is
+# distributed on an "AS IS" basis,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied.
+# See the Licence for the specific language governing
+# permissions and limitations under the Licence.
+# 
+
+
+from fastapi import APIRouter
+from fastapi_utils.cbv import cbv
+
+from models.base_models import EAPIResponseCode
+from models.metrics import CacheStatsResponse
+from resources.cache import caches
+
+router = APIRouter()
+
+
+@cbv(router)
+class CacheStats:
+
+    @router.get("/stats/cache",
+                response_model=CacheStatsResponse,
+                summary="Retrieve hit/miss counters of the in-process caches")
+    async def get(self):
+        api_response = CacheStatsResponse()
+        api_response.result = {name: cache.stats() for name, cache in caches.items()}
+        api_response.total = len(caches)
+        api_response.code = EAPIResponseCode.success
+        return api_response.json_response()
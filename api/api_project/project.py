@@ -18,7 +18,6 @@
 # permissions and limitations under the Licence.
 # 
 
-import httpx
 from fastapi import APIRouter
 from fastapi_utils.cbv import cbv
 from logger import LoggerFactory
@@ -26,6 +25,7 @@ from logger import LoggerFactory
 from config import ConfigClass
 from models import project as models
 from models.base_models import EAPIResponseCode
+from resources.http_clients import http_clients
 
 router = APIRouter()
 _API_NAMESPACE = "api_project"
@@ -41,7 +41,7 @@ class FileCheck:
                 response_model=models.CheckFileResponse,
                 tags=["File Check"],
                 summary="Check file exists")
-    def get(self, project_code, zone, file_relative_path):
+    async def get(self, project_code, zone, file_relative_path):
         """
         Check if file exists in given project/folder
         """
@@ -65,8 +65,7 @@ class FileCheck:
         self._logger.info(f"POST payload: {data}")
         self._logger.info(f"POST url: {url}")
         try:
-            with httpx.Client() as client:
-                res = client.post(url=url, json=data)
+            res = await http_clients.neo4j.post(url=url, json=data)
             self._logger.info(f"POST response: {res.text}")
             res = res.json().get('result')
             self._logger.info(f"POST result: {res}")
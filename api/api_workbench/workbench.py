@@ -18,20 +18,31 @@
 # permissions and limitations under the Licence.
 # 
 
+import httpx
 from fastapi import APIRouter
+from fastapi.concurrency import run_in_threadpool
 from fastapi_utils.cbv import cbv
 from fastapi_sqlalchemy import db
 from models import workbench
 from models.workbench_sql import WorkbenchModel
 from models.base_models import APIResponse, EAPIResponseCode
 from datetime import datetime
-import httpx
-from config import ConfigClass
+from resources.container_registry import containers
 from sqlalchemy.orm.exc import NoResultFound
 
 router = APIRouter()
 
 
+# the psql session blocks, so the async handlers run these on the threadpool
+def count_workbench_entries(query):
+    return db.session.query(WorkbenchModel).filter_by(**query).count()
+
+
+def save_workbench_entry(sql_params):
+    db.session.add(WorkbenchModel(**sql_params))
+    db.session.commit()
+
+
 @cbv(router)
 class Workbench:
     @router.get('/{project_geid}/workbench', response_model=workbench.GETWorkbenchResponse, summary="Get workbench entry")
@@ -60,7 +71,7 @@ class Workbench:
         return api_response.json_response()
 
     @router.post('/{project_geid}/workbench', response_model=workbench.POSTWorkbenchResponse, summary="Create a workbench entry")
-    def post(self, project_geid, data: workbench.POSTWorkbenchRequest):
+    async def post(self, project_geid, data: workbench.POSTWorkbenchRequest):
         api_response = APIResponse()
         if not data.workbench_resource in ["guacamole", "superset", "jupyterhub"]:
             api_response.error_msg = "Invalid workbench resource"
@@ -73,20 +84,22 @@ class Workbench:
                 "workbench_resource": data.workbench_resource,
                 "geid": project_geid,
             }
-            workbench_objects = db.session.query(WorkbenchModel).filter_by(**query)
-            if workbench_objects.count() > 0:
+            if await run_in_threadpool(count_workbench_entries, query) > 0:
                 raise Exception("Record already exists for this project and resource")
         except Exception as e:
             api_response.error_msg = "Error querying psql: " + str(e)
             api_response.code = EAPIResponseCode.internal_error
             return api_response.json_response()
-        with httpx.Client() as client:
-            response = client.post(ConfigClass.NEO4J_SERVICE_V1 + f"nodes/Container/query", json={"global_entity_id": project_geid})
-        if response.status_code != 200:
-            api_response.error_msg = response.json()
-            api_response.code = EAPIResponseCode(response.status_code)
+        try:
+            dataset_node = await containers.get(global_entity_id=project_geid)
+        except httpx.HTTPStatusError as e:
+            api_response.error_msg = e.response.json()
+            api_response.code = EAPIResponseCode(e.response.status_code)
+            return api_response.json_response()
+        if not dataset_node:
+            api_response.error_msg = "Project not found"
+            api_response.code = EAPIResponseCode.not_found
             return api_response.json_response()
-        dataset_node = response.json()[0]
 
         deployed_date = None
         if data.deployed:
@@ -104,9 +117,7 @@ class Workbench:
             "deployed_by": data.deployed_by,
         }
         try:
-            workbench_object = WorkbenchModel(**sql_params)
-            db.session.add(workbench_object)
-            db.session.commit()
+            await run_in_threadpool(save_workbench_entry, sql_params)
         except Exception as e:
             api_response.error_msg = "Error creating entry in psql: " + str(e)
             api_response.code = EAPIResponseCode.internal_error
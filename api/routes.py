@@ -26,7 +26,7 @@ from api.api_folders import folders
 from api.api_workbench import workbench
 from api.api_manifest import manifest_router
 from api.api_attributes import file_attributes
-from api.api_metrics import system_metrics
+from api.api_metrics import system_metrics, cache_metrics
 
 api_router = APIRouter()
 api_router.include_router(files.router, prefix="/files", tags=["files"])
@@ -39,6 +39,7 @@ api_router.include_router(workbench.router, tags=["workbench"])
 api_router.include_router(manifest_router, tags=["manifest"])
 api_router.include_router(file_attributes.router)
 api_router.include_router(system_metrics.router, tags=["System-Metrics"])
+api_router.include_router(cache_metrics.router, tags=["System-Metrics"])
 
 
 api_router_v2 = APIRouter()
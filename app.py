@@ -18,6 +18,8 @@
 # permissions and limitations under the Licence.
 # 
 
+import asyncio
+
 import uvicorn
 from fastapi import APIRouter
 from fastapi import FastAPI
@@ -36,6 +38,10 @@ from opentelemetry.sdk.trace.export import BatchSpanProcessor
 from api.routes import api_router
 from api.routes import api_router_v2
 from config import ConfigClass
+from resources.cache import shutdown_caches
+from resources.container_registry import containers
+from resources.http_clients import http_clients
+from resources.job_manager import attach_jobs
 
 app = FastAPI(
     title="EntityInfo Service",
@@ -73,6 +79,34 @@ def instrument_app(app) -> None:
 if ConfigClass.OPEN_TELEMETRY_ENABLED:
     instrument_app(app)
 
+
+@app.on_event('startup')
+def startup_http_clients():
+    http_clients.startup()
+
+
+@app.on_event('startup')
+async def warm_up_containers():
+    # in the background, a slow neo4j must not hold back the start
+    asyncio.ensure_future(containers.warm_up())
+
+
+@app.on_event('shutdown')
+async def shutdown_attach_jobs():
+    # stop the workers before the pools they write through are closed
+    await attach_jobs.shutdown()
+
+
+@app.on_event('shutdown')
+async def shutdown_cache_refreshers():
+    await shutdown_caches()
+
+
+@app.on_event('shutdown')
+async def shutdown_http_clients():
+    await http_clients.shutdown()
+
+
 router = APIRouter()
 
 app.include_router(api_router, prefix="/v1")
@@ -59,6 +59,56 @@ class Settings(BaseSettings):
     RDS_DB_URI: str
     RDS_SCHEMA_DEFAULT: str
 
+    HTTP_POOL_MAX_CONNECTIONS: int = 100
+    HTTP_POOL_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    HTTP_POOL_KEEPALIVE_EXPIRY: float = 30.0
+    HTTP_TIMEOUT: float = 5.0
+    HTTP_CONNECT_TIMEOUT: float = 5.0
+
+    FOLDER_TRAVERSAL_CONCURRENCY: int = 10
+    ATTRIBUTE_ATTACH_BATCH_SIZE: int = 500
+    ATTRIBUTE_ATTACH_CONCURRENCY: int = 20
+    ATTRIBUTE_ATTACH_JOB_WORKERS: int = 2
+    ATTRIBUTE_ATTACH_JOB_QUEUE_SIZE: int = 50
+    ATTRIBUTE_ATTACH_JOB_HISTORY_SIZE: int = 500
+
+    MANIFEST_CACHE_SIZE: int = 1000
+    # also how long other workers may serve a manifest after it is changed or deleted
+    MANIFEST_CACHE_TTL: float = 5.0
+
+    FILE_STATS_CALL_TIMEOUT: float = 10.0
+    FILE_STATS_CACHE_SIZE: int = 2000
+    FILE_STATS_CACHE_TTL: float = 60.0
+    FILE_STATS_CACHE_STALE_TTL: float = 300.0
+    FILE_STATS_REFRESH_INTERVAL: float = 10.0
+    FILE_STATS_BUCKET_SECONDS: int = 60
+    FILE_STATS_BATCH_CONCURRENCY: int = 10
+
+    LISTING_COUNT_CACHE_SIZE: int = 5000
+    LISTING_COUNT_CACHE_TTL: float = 60.0
+    LISTING_COUNT_CACHE_STALE_TTL: float = 600.0
+    LISTING_COUNT_REFRESH_INTERVAL: float = 10.0
+
+    ROUTING_CACHE_SIZE: int = 5000
+    ROUTING_CACHE_TTL: float = 3600.0
+    FILE_META_CACHE_SIZE: int = 2000
+    FILE_META_CACHE_TTL: float = 30.0
+    FILE_META_CACHE_MAX_ENTRY_BYTES: int = 256 * 1024
+
+    CONTAINER_CACHE_SIZE: int = 10000
+    CONTAINER_CACHE_TTL: float = 86400.0
+    NODE_ID_CACHE_SIZE: int = 100000
+    NODE_ID_CACHE_TTL: float = 3600.0
+    NODE_LOADER_WINDOW: float = 0.005
+    NODE_LOADER_MAX_BATCH: int = 500
+
+    FILE_BATCH_SIZE: int = 500
+    FILE_BATCH_CONCURRENCY: int = 20
+    FOLDER_INDEX_CONCURRENCY: int = 20
+    BULK_DETAIL_CHUNK_SIZE: int = 1000
+    BULK_DETAIL_CONCURRENCY: int = 4
+    EXPORT_PAGE_SIZE: int = 1000
+
     OPEN_TELEMETRY_ENABLED: bool = False
     OPEN_TELEMETRY_HOST: str = '127.0.0.1'
     OPEN_TELEMETRY_PORT: int = 6831
@@ -18,6 +18,7 @@
 # permissions and limitations under the Licence.
 # 
 
+# asynchronous attribute attach jobs live in the worker that accepted them, see README.md
 workers = 4
 threads = 2
 bind = '0.0.0.0:5066'
@@ -43,3 +43,28 @@ class AttachPOSTResponse(APIResponse):
             'total': 67
         }
     )
+
+
+class AttachJobGETResponse(APIResponse):
+    result: dict = Field({}, example={
+           'code': 200,
+           'error_msg': '',
+           'num_of_pages': 1,
+           'page': 0,
+           'result': {
+                "job_id": "0d5e4c1c-3a53-4b7a-9d3f-1d1f0c4a8b6e",
+                "status": "RUNNING",
+                "error_msg": "",
+                "progress": {"processed": 120, "succeeded": 118, "terminated": 2},
+                "result": [{
+                    "name": "neo4j entity name",
+                    "geid": "0f49696b-5fcf-480b-bfd4-543858e4d3e7-1620666366",
+                    "operation_status": "SUCCEED"
+                }],
+                "created_at": 1620666366.12,
+                "started_at": 1620666366.15,
+                "finished_at": None
+            },
+            'total': 120
+        }
+    )
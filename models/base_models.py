@@ -31,6 +31,7 @@ class EAPIResponseCode(Enum):
     forbidden = 403
     unauthorized = 401
     conflict = 409
+    too_many_requests = 429
 
 
 class APIResponse(BaseModel):
@@ -18,6 +18,8 @@
 # permissions and limitations under the Licence.
 # 
 
+from typing import List
+
 from pydantic import BaseModel
 from pydantic import Field
 
@@ -34,6 +36,26 @@ class CreateTrashPOST(BaseModel):
     geid: str = ''
 
 
+class CreateTrashBatchItem(BaseModel):
+    geid: str
+    trash_geid: str
+    trash_full_path: str
+
+
+class CreateTrashBatchPOST(BaseModel):
+    payload: List[CreateTrashBatchItem]
+
+
+class CreateTrashBatchPOSTResponse(APIResponse):
+    result: list = Field(
+        [],
+        example=[
+            {'geid': '5321880a-1a41-4bc8-a5d5-9767323205792', 'trash_geid': '9fc4353b-c4d3-4d29-aa11-d04688f4abc7',
+             'status': 'success', 'node_created': True, 'error_msg': ''},
+        ],
+    )
+
+
 class CreateTrashPOSTResponse(APIResponse):
     result: dict = Field(
         {},
@@ -81,6 +103,22 @@ class CreateFilePOST(BaseModel):
     version_id: str = ''
 
 
+class CreateFilesBatchPOST(BaseModel):
+    payload: List[CreateFilePOST]
+
+
+class CreateFilesBatchPOSTResponse(APIResponse):
+    result: list = Field(
+        [],
+        example=[
+            {'global_entity_id': '5321880a-1a41-4bc8-a5d5-9767323205792', 'status': 'success', 'node_created': True,
+             'error_msg': ''},
+            {'global_entity_id': '9fc4353b-c4d3-4d29-aa11-d04688f4abc7', 'status': 'failed', 'node_created': False,
+             'error_msg': 'Parent folder not found: c1c3766f-36bd-42db-8ca5-9040726cbc03'},
+        ],
+    )
+
+
 class CreateFilePOSTResponse(APIResponse):
     result: dict = Field(
         {},
@@ -111,6 +149,7 @@ class CreateFilePOSTResponse(APIResponse):
 
 class DatasetFileQueryPOST(PaginationRequest):
     partial: bool = False
+    include_total: str = 'exact'
     query: dict = Field(
         {},
         example={
@@ -181,5 +220,33 @@ class FilesStatsGETResponse(APIResponse):
             # get from neo4j(archived: False), all files in greenroom
             'greenroom': 0,
             'core': 0,  # get from neo4j(archived: False), all files in core
+            # counts that failed or timed out are null and listed here
+            'errors': {},
+        },
+    )
+
+
+class FilesStatsBatchPOST(BaseModel):
+    project_geids: list
+    start_date: str
+    end_date: str
+    operator: str = None
+
+
+class FilesStatsBatchPOSTResponse(APIResponse):
+    result: dict = Field(
+        {},
+        example={
+            # one entry per requested geid, null when the project does not exist
+            'b38c26d0-1d51-44f1-9ab6-3175bd41ccc9-1620668865': {
+                'uploaded': 0,
+                'downloaded': 0,
+                'approved': 0,
+                'greenroom': 0,
+                'core': 0,
+                'project_info': {},
+                'errors': {},
+            },
+            'unknown-project-geid': None,
         },
     )
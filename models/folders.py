@@ -29,6 +29,9 @@ from pydantic import Field
 from config import ConfigClass
 from models.base_models import APIResponse
 from resources import helpers
+from resources.container_registry import containers
+from resources.http_clients import http_clients
+from resources.node_ids import node_ids
 
 _logger = LoggerFactory('folder_model').get_logger()
 
@@ -224,7 +227,7 @@ class FoldersQueryResponse(APIResponse):
     ])
 
 
-def http_bulk_post_node(payload: list, extra_labels: list):
+async def http_bulk_post_node(payload: list, extra_labels: list):
     '''
     bulk create nodes in neo4j
     '''
@@ -233,62 +236,44 @@ def http_bulk_post_node(payload: list, extra_labels: list):
         "payload": payload,
         "extra_labels": extra_labels
     }
-    with httpx.Client() as client:
-        response = client.post(node_creation_url, json=data)
+    response = await http_clients.neo4j.post(node_creation_url, json=data)
     return response
 
 
-def http_post_node(node_dict: dict, geid=None):
+async def http_post_node(node_dict: dict, geid=None):
     '''
     will assign the geid automaticly
     '''
     if not geid:
-        node_dict["global_entity_id"] = helpers.get_geid()
+        node_dict["global_entity_id"] = await helpers.get_geid()
     node_creation_url = ConfigClass.NEO4J_SERVICE_V1 + "nodes/Folder"
-    with httpx.Client() as client:
-        response = client.post(node_creation_url, json=node_dict)
+    response = await http_clients.neo4j.post(node_creation_url, json=node_dict)
     return response
 
 
-def http_query_node(namespace, query_params={}):
+async def http_query_node(namespace, query_params={}):
     payload = {
         **query_params
     }
     node_query_url = ConfigClass.NEO4J_SERVICE_V1 + "nodes/Folder/query"
-    with httpx.Client() as client:
-        response = client.post(node_query_url, json=payload)
+    response = await http_clients.neo4j.post(node_query_url, json=payload)
+    if response.status_code == 200:
+        node_ids.remember(response.json())
     return response
 
 
-def link_folder_parent(namespace, parent_folder_geid, child_folder_geid):
+async def link_folder_parent(namespace, parent_folder_geid, child_folder_geid):
     '''
     link folder parent
     '''
-    respon_parent_folder_query = http_query_node(
-        namespace, {"global_entity_id": parent_folder_geid})
-    if not respon_parent_folder_query.status_code == 200:
-        raise (Exception("[respon_parent_folder_query Error] {} {}".format(
-            respon_parent_folder_query.status_code, respon_parent_folder_query.text)))
-    parent_folder_node = respon_parent_folder_query.json()
-    if not parent_folder_node:
-        raise (Exception("[respon_parent_folder_query Error] Not found {} {}".format(
-            respon_parent_folder_query.status_code, parent_folder_geid)))
-    parent_folder_node = parent_folder_node[0]
-    respon_child_folder_query = http_query_node(
-        namespace, {"global_entity_id": child_folder_geid})
-    if not respon_child_folder_query.status_code == 200:
-        raise (Exception("[respon_child_folder_query Error] {} {}".format(
-            respon_child_folder_query.status_code, respon_child_folder_query.text)))
-    child_folder_node = respon_child_folder_query.json()
-    if not child_folder_node:
-        raise (Exception("[respon_child_folder_query Error] Not found {} {}".format(
-            respon_child_folder_query.status_code, child_folder_geid)))
-    child_folder_node = child_folder_node[0]
+    ids = await node_ids.resolve([parent_folder_geid, child_folder_geid])
+    if parent_folder_geid not in ids:
+        raise (Exception("[respon_parent_folder_query Error] Not found {}".format(parent_folder_geid)))
+    if child_folder_geid not in ids:
+        raise (Exception("[respon_child_folder_query Error] Not found {}".format(child_folder_geid)))
     relation_payload = {
-        "start_id": parent_folder_node["id"], "end_id": child_folder_node["id"]}
-    with httpx.Client() as client:
-        response = client.post(ConfigClass.NEO4J_SERVICE_V1 +
-                               "relations/own", json=relation_payload)
+        "start_id": ids[parent_folder_geid], "end_id": ids[child_folder_geid]}
+    response = await http_clients.neo4j.post(ConfigClass.NEO4J_SERVICE_V1 + "relations/own", json=relation_payload)
     if response.status_code // 100 == 2:
         return response
     else:
@@ -296,39 +281,21 @@ def link_folder_parent(namespace, parent_folder_geid, child_folder_geid):
             response.status_code, response.text)))
 
 
-def link_project(namespace, project_code, child_folder_geid):
-    payload = {
-        "code": project_code
-    }
-    project_node_query_url = ConfigClass.NEO4J_SERVICE_V1 + "nodes/Container/query"
-    with httpx.Client() as client:
-        response_query_project = client.post(
-            project_node_query_url, json=payload)
-    _logger.info("request url: {}".format(project_node_query_url))
-    _logger.info("request payload: {}".format(payload))
-    if not response_query_project.status_code == 200:
+async def link_project(namespace, project_code, child_folder_geid):
+    try:
+        project = await containers.get(code=project_code)
+    except httpx.HTTPStatusError as e:
         raise (
-            Exception('[link_project] Invalid project code: {} {}'.format(project_code, response_query_project.status_code)))
-    project = response_query_project.json()
+            Exception('[link_project] Invalid project code: {} {}'.format(project_code, e.response.status_code)))
     if not project:
         raise (
             Exception('[link_project] Not found project: {}'.format(project_code)))
-    project = project[0]
-    respon_child_folder_query = http_query_node(
-        namespace, {"global_entity_id": child_folder_geid})
-    if not respon_child_folder_query.status_code == 200:
-        raise (Exception("[respon_child_folder_query Error] {} {}".format(
-            respon_child_folder_query.status_code, respon_child_folder_query.text)))
-    child_folder_node = respon_child_folder_query.json()
-    if not child_folder_node:
-        raise (Exception("[respon_child_folder_query Error] Not found {} {}".format(
-            respon_child_folder_query.status_code, child_folder_geid)))
-    child_folder_node = child_folder_node[0]
+    ids = await node_ids.resolve([child_folder_geid])
+    if child_folder_geid not in ids:
+        raise (Exception("[respon_child_folder_query Error] Not found {}".format(child_folder_geid)))
     relation_payload = {
-        "start_id": project["id"], "end_id": child_folder_node["id"]}
-    with httpx.Client() as client:
-        response = client.post(ConfigClass.NEO4J_SERVICE_V1 +
-                               "relations/own", json=relation_payload)
+        "start_id": project["id"], "end_id": ids[child_folder_geid]}
+    response = await http_clients.neo4j.post(ConfigClass.NEO4J_SERVICE_V1 + "relations/own", json=relation_payload)
     if response.status_code // 100 == 2:
         return response
     else:
@@ -336,7 +303,7 @@ def link_project(namespace, project_code, child_folder_geid):
             response.status_code, response.text)))
 
 
-def bulk_link_project(params_location, start_label, end_label, payload):
+async def bulk_link_project(params_location, start_label, end_label, payload):
     # bulk create relations
     data = {
         "payload": payload,
@@ -344,9 +311,7 @@ def bulk_link_project(params_location, start_label, end_label, payload):
         "start_label": start_label,
         "end_label": end_label
     }
-    with httpx.Client() as client:
-        response = client.post(ConfigClass.NEO4J_SERVICE_V1 +
-                               "relations/own/batch", json=data)
+    response = await http_clients.neo4j.post(ConfigClass.NEO4J_SERVICE_V1 + "relations/own/batch", json=data)
 
     if response.status_code // 100 == 2:
         return response
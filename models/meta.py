@@ -18,7 +18,8 @@
 # permissions and limitations under the Licence.
 # 
 
-import httpx
+import json
+
 from pydantic import BaseModel
 from pydantic import Field
 
@@ -26,6 +27,26 @@ from config import ConfigClass
 from models.base_models import APIResponse
 from models.base_models import PaginationRequest
 from models.folders import http_query_node
+from resources.cache import TTLCache
+from resources.http_clients import http_clients
+
+# breadcrumb routing by geid, the same folder is usually paged through many times in a row and the ancestry of a
+# folder does not change once it is created
+routing_cache = TTLCache(
+    'routing',
+    ConfigClass.ROUTING_CACHE_SIZE,
+    ConfigClass.ROUTING_CACHE_TTL,
+    sizeof=lambda routing: len(json.dumps(routing, default=str)),
+)
+
+# whole FileMeta listing responses as (project_code, json body), dropped by the project on every write this service
+# makes to its files and folders
+file_meta_cache = TTLCache(
+    'file_meta',
+    ConfigClass.FILE_META_CACHE_SIZE,
+    ConfigClass.FILE_META_CACHE_TTL,
+    sizeof=lambda entry: len(entry[1]),
+)
 
 
 ### DatasetFileQueryPOSTResponse
@@ -36,6 +57,15 @@ class MetaGET(PaginationRequest):
     query: str = ''
 
 
+class MetaExportGET(BaseModel):
+    source_type: str
+    zone: str
+    partial: str = ''
+    query: str = ''
+    order_by: str = 'time_created'
+    order_type: str = 'asc'
+
+
 class MetaGETResponse(APIResponse):
     result: dict = Field(
         {},
@@ -131,12 +161,11 @@ class GETFileDetail(APIResponse):
     )
 
 
-def get_parent_connections(entity_geid):
+async def get_parent_connections(entity_geid):
     """get parent connections from neo4j service."""
     routing = []
     # get routing
-    with httpx.Client() as client:
-        response_routing = client.get(ConfigClass.NEO4J_SERVICE_V1 + 'relations/connected/{}'.format(entity_geid))
+    response_routing = await http_clients.neo4j.get(ConfigClass.NEO4J_SERVICE_V1 + 'relations/connected/{}'.format(entity_geid))
     routing = []
     if response_routing.status_code == 200:
         routing = response_routing.json()['result']
@@ -146,10 +175,54 @@ def get_parent_connections(entity_geid):
     # add self node, if not returned by neo4j
     if len([route for route in routing if route['global_entity_id'] == entity_geid]) == 0:
         self_query_payload = {'global_entity_id': entity_geid}
-        self_query_respon = http_query_node('doesnotmatterforgeidquery', self_query_payload)
+        self_query_respon = await http_query_node('doesnotmatterforgeidquery', self_query_payload)
         if self_query_respon.status_code == 200:
             routing = routing + self_query_respon.json()
         else:
             raise (Exception('[v2 routing query] {}, {}'.format(self_query_respon.status_code, self_query_respon.text)))
 
     return routing
+
+
+def invalidate_routing(geids):
+    """Drop every cached routing that passes through one of the folders, after they are created or moved."""
+    geids = set(geids)
+    routing_cache.pop_where(
+        lambda key, routing: key in geids or any(route.get('global_entity_id') in geids for route in routing)
+    )
+
+
+def cache_child_routing(parent_geid, node):
+    """Fill the routing of a new folder from the cached routing of its parent; on a miss the first listing loads it."""
+    if not node.get('global_entity_id'):
+        return False
+    parent_routing = routing_cache.get(parent_geid) if parent_geid else None
+    if parent_routing is None:
+        return False
+    routing_cache.set(node['global_entity_id'], parent_routing + [node])
+    return True
+
+
+def file_meta_cache_key(geid, params):
+    """Key a FileMeta listing by everything that shapes its response, with query and partial normalized."""
+    query = json.dumps(json.loads(params.query), sort_keys=True) if params.query else ''
+    partial = tuple(sorted(json.loads(params.partial))) if params.partial else ()
+    return (
+        geid, params.source_type, params.zone, query, partial, params.order_by, (params.order_type or '').lower(),
+        params.page, params.page_size,
+    )
+
+
+def listing_project_code(results, routing):
+    """The project a listing belongs to, from its files or else its folder routing; None when neither tells."""
+    for node in list(results) + list(routing):
+        if isinstance(node, dict) and node.get('project_code'):
+            return node['project_code']
+    return None
+
+
+def invalidate_file_meta(project_codes):
+    """Drop every cached FileMeta listing of the projects, after their files or folders are written."""
+    project_codes = {project_code for project_code in project_codes if project_code}
+    if project_codes:
+        file_meta_cache.pop_where(lambda key, entry: entry[0] in project_codes)
@@ -40,3 +40,26 @@ class StatsResponse(APIResponse):
             }
     }
                          )
+
+
+class CacheStatsResponse(APIResponse):
+    """
+    In-process Cache Stats Response Class
+    """
+    result: dict = Field({}, example={
+        "code": 200,
+        "error_msg": "",
+        "result":
+            {
+                "manifest": {
+                    "name": "manifest",
+                    "size": 12,
+                    "maxsize": 1000,
+                    "ttl": 300.0,
+                    "hits": 940,
+                    "misses": 60,
+                    "evictions": 0,
+                    "hit_ratio": 0.94
+                }
+            }
+    })
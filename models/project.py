@@ -18,13 +18,13 @@
 # permissions and limitations under the Licence.
 # 
 
-import httpx
 from pydantic import BaseModel
 from pydantic import Field
 
 from config import ConfigClass
 from models.base_models import APIResponse
 from models.base_models import PaginationRequest
+from resources.http_clients import http_clients
 
 
 class CheckFileResponse(APIResponse):
@@ -63,9 +63,9 @@ class CheckFileResponse(APIResponse):
     )
 
 
-def http_query_node(query_params={}):
+async def http_query_node(query_params={}):
     payload = {**query_params}
     node_query_url = ConfigClass.NEO4J_SERVICE_V1 + 'nodes/Container/query'
-    with httpx.Client() as client:
-        response = client.post(node_query_url, json=payload)
+    response = await http_clients.neo4j.post(node_query_url, json=payload)
     return response
+
@@ -0,0 +1,230 @@
+# Copyright 2022 Indoc Research
+# 
+# Licensed under the EUPL, Version 1.2 or – as soon they
+# will be approved by the European Commission - subsequent
+# versions of the EUPL (the "Licence");
+# You may not use this work except in compliance with the
+# Licence.
+# You may obtain a copy of the Licence at:
+# 
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-eupl-12
+# 
+# Unless required by applicable law or agreed to in
+# writing, software distributed under the Licence is
+# distributed on an "AS IS" basis,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied.
+# See the Licence for the specific language governing
+# permissions and limitations under the Licence.
+# 
+
+
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+
+from logger import LoggerFactory
+
+logger = LoggerFactory(__name__).get_logger()
+
+caches = {}
+
+
+class TTLCache:
+    """Least-recently-used cache whose entries also expire `ttl` seconds after they were stored.
+
+    Sync routes run on the threadpool, so every operation holds a lock. Each cache registers itself by name so
+    the metrics endpoint can report its counters, and the approximate memory held when a `sizeof(value)` is given.
+    """
+
+    def __init__(self, name, maxsize, ttl, sizeof=None):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.sizeof = sizeof
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        caches[name] = self
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key):
+        with self._lock:
+            entry = self._data.pop(key, None)
+        return entry[1] if entry else None
+
+    def pop_where(self, predicate):
+        """Drop every entry for which predicate(key, value) is true."""
+        with self._lock:
+            keys = [key for key, (_, value) in self._data.items() if predicate(key, value)]
+            for key in keys:
+                del self._data[key]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        stats = {
+            'name': self.name,
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'ttl': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+        if self.sizeof:
+            with self._lock:
+                stats['memory_bytes'] = sum(self.sizeof(value) for _, value in self._data.values())
+        return stats
+
+
+class RefreshingCache:
+    """Async stale-while-revalidate cache for values that are expensive to compute and change slowly.
+
+    An entry is fresh for `ttl` seconds. For the following `stale_ttl` seconds it is still served, while a single
+    background reload replaces it. A refresher task also reloads entries that were read within the last `ttl`
+    seconds shortly before they go stale, so hot keys are normally answered from memory. Values for which
+    `should_cache(value)` is false are returned but not stored.
+    """
+
+    def __init__(self, name, maxsize, ttl, stale_ttl, refresh_interval, should_cache=None):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.refresh_interval = refresh_interval
+        self.should_cache = should_cache or (lambda value: True)
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.evictions = 0
+        # key -> [stored_at, last_access, value, loader]
+        self._data = OrderedDict()
+        self._loading = {}
+        self._refresher = None
+        caches[name] = self
+
+    async def get_or_load(self, key, loader):
+        self._start_refresher()
+        now = time.monotonic()
+        entry = self._data.get(key)
+        if entry is not None:
+            age = now - entry[0]
+            if age < self.ttl + self.stale_ttl:
+                entry[1] = now
+                entry[3] = loader
+                self._data.move_to_end(key)
+                if age < self.ttl:
+                    self.hits += 1
+                else:
+                    self.stale_hits += 1
+                    self._reload_in_background(key, loader)
+                return entry[2]
+            del self._data[key]
+        self.misses += 1
+        return await self._load(key, loader)
+
+    def _load(self, key, loader):
+        # concurrent misses on one key share a single upstream load
+        future = self._loading.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._store(key, loader))
+            self._loading[key] = future
+            future.add_done_callback(lambda _: self._loading.pop(key, None))
+        return asyncio.shield(future)
+
+    async def _store(self, key, loader):
+        value = await loader()
+        if self.should_cache(value):
+            now = time.monotonic()
+            last_access = self._data[key][1] if key in self._data else now
+            self._data[key] = [now, last_access, value, loader]
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+        return value
+
+    def _reload_in_background(self, key, loader):
+        if key in self._loading:
+            return
+        self.refreshes += 1
+        future = self._load(key, loader)
+        future.add_done_callback(self._log_reload_failure)
+
+    def _log_reload_failure(self, future):
+        if not future.cancelled() and future.exception():
+            logger.error(f'{self.name} cache reload failed: {future.exception()}')
+
+    def _start_refresher(self):
+        if self._refresher is None or self._refresher.done():
+            self._refresher = asyncio.ensure_future(self._refresh_hot_keys())
+
+    async def _refresh_hot_keys(self):
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            now = time.monotonic()
+            for key, (stored_at, last_access, _, loader) in list(self._data.items()):
+                about_to_go_stale = now - stored_at >= self.ttl - 2 * self.refresh_interval
+                if about_to_go_stale and now - last_access < self.ttl:
+                    self._reload_in_background(key, loader)
+
+    async def shutdown(self):
+        refresher, self._refresher = self._refresher, None
+        pending = [refresher] if refresher else []
+        pending.extend(self._loading.values())
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+    def clear(self):
+        self._data.clear()
+
+    def stats(self):
+        lookups = self.hits + self.stale_hits + self.misses
+        return {
+            'name': self.name,
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'ttl': self.ttl,
+            'stale_ttl': self.stale_ttl,
+            'hits': self.hits,
+            'stale_hits': self.stale_hits,
+            'misses': self.misses,
+            'refreshes': self.refreshes,
+            'evictions': self.evictions,
+            'hit_ratio': round((self.hits + self.stale_hits) / lookups, 4) if lookups else 0.0,
+        }
+
+
+async def shutdown_caches():
+    for cache in caches.values():
+        if isinstance(cache, RefreshingCache):
+            await cache.shutdown()
@@ -0,0 +1,118 @@
+# Copyright 2022 Indoc Research
+# 
+# Licensed under the EUPL, Version 1.2 or – as soon they
+# will be approved by the European Commission - subsequent
+# versions of the EUPL (the "Licence");
+# You may not use this work except in compliance with the
+# Licence.
+# You may obtain a copy of the Licence at:
+# 
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-eupl-12
+# 
+# Unless required by applicable law or agreed to in
+# writing, software distributed under the Licence is
+# distributed on an "AS IS" basis,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied.
+# See the Licence for the specific language governing
+# permissions and limitations under the Licence.
+# 
+
+from logger import LoggerFactory
+
+from config import ConfigClass
+from resources.cache import TTLCache
+from resources.http_clients import http_clients
+from resources.node_ids import node_ids
+
+logger = LoggerFactory(__name__).get_logger()
+
+GEID = 'global_entity_id'
+ID = 'id'
+CODE = 'code'
+
+
+class ContainerRegistry:
+    """Resolve Container nodes by geid, id or code, remembering the identity of every node under all three keys.
+
+    The identity of a project never changes, so only id, code and global_entity_id are kept, for a long TTL, and a
+    lookup by any key warms the other two. The rest of a node can be edited at any time and is read from neo4j by
+    load and load_many. Containers that do not exist are not cached, so a project created later is found on the
+    next call.
+    """
+
+    fields = (GEID, ID, CODE)
+
+    def __init__(self, maxsize, ttl):
+        self._nodes = TTLCache('container', maxsize, ttl)
+
+    def _remember(self, node):
+        node_ids.remember([node])
+        identity = {field: node[field] for field in self.fields if node.get(field) is not None}
+        for field, value in identity.items():
+            self._nodes.set((field, str(value)), identity)
+
+    async def _query(self, field, value):
+        if field == ID:
+            response = await http_clients.neo4j.get(ConfigClass.NEO4J_SERVICE_V1 + f'nodes/Container/node/{value}')
+        else:
+            response = await http_clients.neo4j.post(ConfigClass.NEO4J_SERVICE_V1 + 'nodes/Container/query',
+                                                     json={field: value})
+        response.raise_for_status()
+        nodes = response.json()
+        return nodes[0] if nodes else None
+
+    async def get(self, **params):
+        """Return the id, code and global_entity_id of the Container matching one of them, or None.
+
+        Raises httpx.HTTPError when neo4j fails.
+        """
+        if len(params) != 1 or next(iter(params)) not in self.fields:
+            raise ValueError(f'Lookup by exactly one of {", ".join(self.fields)}')
+        field, value = next(iter(params.items()))
+        node = self._nodes.get((field, str(value)))
+        if node is None:
+            node = await self._query(field, value)
+            if node is None:
+                return None
+            self._remember(node)
+        return dict(node)
+
+    async def get_id(self, **params):
+        node = await self.get(**params)
+        return node[ID] if node else None
+
+    async def load(self, global_entity_id):
+        """Return the whole Container node as neo4j has it now, or None.
+
+        Raises httpx.HTTPError when neo4j fails.
+        """
+        node = await self._query(GEID, global_entity_id)
+        if node is not None:
+            self._remember(node)
+        return node
+
+    async def load_many(self, geids):
+        """Return {geid: node} with the whole nodes of the geids that are Containers, read in one bulk query."""
+        response = await http_clients.neo4j.post(ConfigClass.NEO4J_SERVICE_V1 + 'nodes/query/geids',
+                                                 json={'geids': geids})
+        response.raise_for_status()
+        found = {}
+        for node in response.json()['result']:
+            if 'Container' in node.get('labels', []):
+                self._remember(node)
+                found[node[GEID]] = node
+        return found
+
+    async def warm_up(self):
+        """Load every Container in one query, so the first lookups after a start do not go to neo4j."""
+        try:
+            response = await http_clients.neo4j.post(ConfigClass.NEO4J_SERVICE_V1 + 'nodes/Container/query', json={})
+            response.raise_for_status()
+            for node in response.json():
+                self._remember(node)
+        except Exception as e:
+            logger.error(f'Container warm-up failed: {e}')
+
+
+containers = ContainerRegistry(ConfigClass.CONTAINER_CACHE_SIZE, ConfigClass.CONTAINER_CACHE_TTL)
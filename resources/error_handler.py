@@ -18,6 +18,7 @@
 # permissions and limitations under the Licence.
 # 
 
+import asyncio
 import enum
 from functools import wraps
 
@@ -35,21 +36,34 @@ def catch_internal(api_namespace):
     decorator to catch internal server error.
     '''
 
+    def internal_error_response(exce):
+        respon = APIResponse()
+        respon.code = EAPIResponseCode.internal_error
+        respon.result = None
+        err = api_namespace + " " + str(exce)
+        err_msg = customized_error_template(
+            ECustomizedError.INTERNAL) % err
+        _logger.error(err_msg)
+        respon.error_msg = err_msg
+        return respon.json_response()
+
     def decorator(func):
+        if asyncio.iscoroutinefunction(func):
+            @wraps(func)
+            async def async_inner(*args, **kwargs):
+                try:
+                    return await func(*args, **kwargs)
+                except Exception as exce:
+                    return internal_error_response(exce)
+
+            return async_inner
+
         @wraps(func)
         def inner(*args, **kwargs):
             try:
                 return func(*args, **kwargs)
             except Exception as exce:
-                respon = APIResponse()
-                respon.code = EAPIResponseCode.internal_error
-                respon.result = None
-                err = api_namespace + " " + str(exce)
-                err_msg = customized_error_template(
-                    ECustomizedError.INTERNAL) % err
-                _logger.error(err_msg)
-                respon.error_msg = err_msg
-                return respon.json_response()
+                return internal_error_response(exce)
 
         return inner
 
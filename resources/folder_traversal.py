@@ -0,0 +1,84 @@
+# Copyright 2022 Indoc Research
+# 
+# Licensed under the EUPL, Version 1.2 or – as soon they
+# will be approved by the European Commission - subsequent
+# versions of the EUPL (the "Licence");
+# You may not use this work except in compliance with the
+# Licence.
+# You may obtain a copy of the Licence at:
+# 
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-eupl-12
+# 
+# Unless required by applicable law or agreed to in
+# writing, software distributed under the Licence is
+# distributed on an "AS IS" basis,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied.
+# See the Licence for the specific language governing
+# permissions and limitations under the Licence.
+# 
+
+
+import asyncio
+
+import httpx
+from logger import LoggerFactory
+
+from config import ConfigClass
+from resources.http_clients import http_clients
+
+logger = LoggerFactory(__name__).get_logger()
+
+DEFAULT_END_PARAMS = {
+    'Folder': {'archived': False},
+    'File': {'archived': False},
+}
+
+
+async def query_folder_children(folder_geid, end_params, semaphore):
+    payload = {
+        'start_label': 'Folder',
+        'end_labels': ['File', 'Folder'],
+        'query': {
+            'start_params': {
+                'global_entity_id': folder_geid,
+            },
+            'end_params': end_params,
+        },
+    }
+    async with semaphore:
+        response = await http_clients.neo4j.post(ConfigClass.NEO4J_SERVICE_V2 + 'relations/query', json=payload)
+    try:
+        response.raise_for_status()
+    except httpx.HTTPError as exc:
+        logger.error('HTTP Exception', exc_info=True)
+        raise exc
+    return response.json()['results']
+
+
+async def walk_folder_files(folder_geid, end_params=None, concurrency=None):
+    """Yield every File node below the folder, walking the tree breadth-first.
+
+    All folders of one level are queried concurrently, at most `concurrency` at a time, and files are yielded as soon
+    as their parent folder answers, so callers can start working before the walk finishes.
+    """
+    if end_params is None:
+        end_params = DEFAULT_END_PARAMS
+    semaphore = asyncio.Semaphore(concurrency or ConfigClass.FOLDER_TRAVERSAL_CONCURRENCY)
+
+    level = [folder_geid]
+    while level:
+        next_level = []
+        tasks = [asyncio.ensure_future(query_folder_children(geid, end_params, semaphore)) for geid in level]
+        try:
+            for finished in asyncio.as_completed(tasks):
+                for node in await finished:
+                    if 'File' in node['labels']:
+                        yield node
+                    else:
+                        next_level.append(node['global_entity_id'])
+        finally:
+            # the caller may stop iterating early, or one query may fail; drop the rest of the level
+            for task in tasks:
+                task.cancel()
+        level = next_level
@@ -18,26 +18,27 @@
 # permissions and limitations under the Licence.
 # 
 
+import asyncio
+
 from config import ConfigClass
-import httpx
+from resources.http_clients import http_clients
 
 
-def get_geid():
+async def get_geid():
     '''
     get geid
     http://10.3.7.222:5062/v1/utility/id?entity_type=data_upload
     '''
     url = ConfigClass.UTILITY_SERVICE_V1 + \
         "utility/id"
-    with httpx.Client() as client:
-        response = client.get(url)
+    response = await http_clients.utility.get(url)
     if response.status_code == 200:
         return response.json()['result']
     else:
         raise Exception('get_geid {}: {}'.format(response.status_code, url))
 
 
-def get_operation_auditlogs(project_code, action,
+async def get_operation_auditlogs(project_code, action,
                             start_date, end_date, resource, operator=None, ):
     '''
     get operation auditlogs from service_provenance
@@ -54,15 +55,14 @@ def get_operation_auditlogs(project_code, action,
         params['resource'] = resource
     if operator:
         params['operator'] = operator
-    with httpx.Client() as client:
-        response = client.get(url, params=params)
+    response = await http_clients.provenance.get(url, params=params)
     if response.status_code == 200:
         return response.json()['result']
     else:
         raise Exception('get_operation_auditlogs {}: {}'.format(
             response.status_code, url))
 
-def get_operation_logs_total(project_code, action,
+async def get_operation_logs_total(project_code, action,
                             start_date, end_date, resource, operator=None, ):
     '''
     get operation auditlogs total from service_provenance
@@ -79,15 +79,14 @@ def get_operation_logs_total(project_code, action,
         params['resource'] = resource
     if operator:
         params['operator'] = operator
-    with httpx.Client() as client:
-        response = client.get(url, params=params)
+    response = await http_clients.provenance.get(url, params=params)
     if response.status_code == 200:
         return response.json()['total']
     else:
         raise Exception('get_operation_auditlogs {}: {}'.format(
             response.status_code, url))
 
-def get_file_count_neo4j(project_code, zone, archived=False, uploader=None):
+async def get_file_count_neo4j(project_code, zone, archived=False, uploader=None):
     url = ConfigClass.NEO4J_SERVICE_V1 + "file/quick/count"
     labels = {
         "Greenroom": "Greenroom:File",
@@ -101,10 +100,41 @@ def get_file_count_neo4j(project_code, zone, archived=False, uploader=None):
     if uploader:
         params["display_path"] = uploader
         params["startwith"] = ["display_path"]
-    with httpx.Client() as client:
-        response = client.get(url, params=params)
+    response = await http_clients.neo4j.get(url, params=params)
     if response.status_code == 200:
         return response.json()['result']
     else:
         raise Exception('get_file_count_neo4j {}: {}'.format(
             response.status_code, url))
+
+
+async def gather_with_timeouts(calls, timeout):
+    '''
+    run named coroutines concurrently, each bounded by timeout seconds;
+    returns (results, errors) where a failed or timed out call is None
+    in results and carries its error message in errors
+    '''
+    names = list(calls)
+    outcomes = await asyncio.gather(
+        *[asyncio.wait_for(call, timeout) for call in calls.values()],
+        return_exceptions=True
+    )
+    results = {}
+    errors = {}
+    for name, outcome in zip(names, outcomes):
+        if isinstance(outcome, asyncio.TimeoutError):
+            results[name] = None
+            errors[name] = 'timed out after {}s'.format(timeout)
+        elif isinstance(outcome, Exception):
+            results[name] = None
+            errors[name] = str(outcome)
+        else:
+            results[name] = outcome
+    return results, errors
+
+
+def chunked(items, size):
+    '''
+    split a list into consecutive lists of at most size items
+    '''
+    return [items[start:start + size] for start in range(0, len(items), size)]
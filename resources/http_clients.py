@@ -0,0 +1,82 @@
+# Copyright 2022 Indoc Research
+# 
+# Licensed under the EUPL, Version 1.2 or – as soon they
+# will be approved by the European Commission - subsequent
+# versions of the EUPL (the "Licence");
+# You may not use this work except in compliance with the
+# Licence.
+# You may obtain a copy of the Licence at:
+# 
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-eupl-12
+# 
+# Unless required by applicable law or agreed to in
+# writing, software distributed under the Licence is
+# distributed on an "AS IS" basis,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied.
+# See the Licence for the specific language governing
+# permissions and limitations under the Licence.
+# 
+
+
+import httpx
+
+from config import ConfigClass
+
+NEO4J = 'neo4j'
+PROVENANCE = 'provenance'
+UTILITY = 'utility'
+
+
+class HTTPClients:
+    """Keep one keep-alive connection pool per upstream service for the lifetime of the app.
+
+    Neo4j v1 and v2 endpoints live on the same host, so they share the neo4j pool.
+    """
+
+    upstreams = (NEO4J, PROVENANCE, UTILITY)
+
+    def __init__(self):
+        self._clients = {}
+
+    def _create_client(self) -> httpx.AsyncClient:
+        limits = httpx.Limits(
+            max_connections=ConfigClass.HTTP_POOL_MAX_CONNECTIONS,
+            max_keepalive_connections=ConfigClass.HTTP_POOL_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=ConfigClass.HTTP_POOL_KEEPALIVE_EXPIRY,
+        )
+        timeout = httpx.Timeout(ConfigClass.HTTP_TIMEOUT, connect=ConfigClass.HTTP_CONNECT_TIMEOUT)
+        return httpx.AsyncClient(limits=limits, timeout=timeout)
+
+    def get(self, upstream: str) -> httpx.AsyncClient:
+        """Return the pooled client of the upstream, creating it on first use."""
+
+        client = self._clients.get(upstream)
+        if client is None or client.is_closed:
+            client = self._create_client()
+            self._clients[upstream] = client
+        return client
+
+    @property
+    def neo4j(self) -> httpx.AsyncClient:
+        return self.get(NEO4J)
+
+    @property
+    def provenance(self) -> httpx.AsyncClient:
+        return self.get(PROVENANCE)
+
+    @property
+    def utility(self) -> httpx.AsyncClient:
+        return self.get(UTILITY)
+
+    def startup(self) -> None:
+        for upstream in self.upstreams:
+            self.get(upstream)
+
+    async def shutdown(self) -> None:
+        clients, self._clients = self._clients, {}
+        for client in clients.values():
+            await client.aclose()
+
+
+http_clients = HTTPClients()
@@ -0,0 +1,163 @@
+# Copyright 2022 Indoc Research
+# 
+# Licensed under the EUPL, Version 1.2 or – as soon they
+# will be approved by the European Commission - subsequent
+# versions of the EUPL (the "Licence");
+# You may not use this work except in compliance with the
+# Licence.
+# You may obtain a copy of the Licence at:
+# 
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-eupl-12
+# 
+# Unless required by applicable law or agreed to in
+# writing, software distributed under the Licence is
+# distributed on an "AS IS" basis,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied.
+# See the Licence for the specific language governing
+# permissions and limitations under the Licence.
+# 
+
+
+import asyncio
+import time
+import uuid
+from collections import OrderedDict
+
+from logger import LoggerFactory
+
+from config import ConfigClass
+
+logger = LoggerFactory(__name__).get_logger()
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+class Job:
+    def __init__(self, job_id, func, args):
+        self.job_id = job_id
+        self.func = func
+        self.args = args
+        self.status = 'QUEUED'
+        self.error_msg = ''
+        self.processed = 0
+        self.succeeded = 0
+        self.terminated = 0
+        self.results = []
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    def add_result(self, result):
+        self.results.append(result)
+        self.processed += 1
+        if result.get('operation_status') == 'TERMINATED':
+            self.terminated += 1
+        else:
+            self.succeeded += 1
+
+    def to_dict(self):
+        return {
+            'job_id': self.job_id,
+            'status': self.status,
+            'error_msg': self.error_msg,
+            'progress': {
+                'processed': self.processed,
+                'succeeded': self.succeeded,
+                'terminated': self.terminated,
+            },
+            'result': self.results,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+        }
+
+
+class JobManager:
+    """Run jobs on a fixed number of in-process workers fed by a bounded queue.
+
+    Jobs beyond queue_size are rejected instead of buffered, and only the last history_size jobs are kept for
+    status lookups. Jobs live in the memory of the server process that accepted them: with several gunicorn
+    workers a status poll only finds the job when it reaches that same process, and a restart drops every job.
+    Job ids start with the id of the accepting process so that a miss can say which of the two happened.
+    """
+
+    def __init__(self, name, workers, queue_size, history_size):
+        self.name = name
+        self.process_id = uuid.uuid4().hex[:8]
+        self.workers = workers
+        self.queue_size = queue_size
+        self.history_size = history_size
+        self._queue = None
+        self._tasks = []
+        self._jobs = OrderedDict()
+
+    def start(self):
+        # the queue binds to the running loop, so workers start on first use
+        if self._queue is not None:
+            return
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._tasks = [asyncio.ensure_future(self._worker()) for _ in range(self.workers)]
+
+    async def shutdown(self):
+        unfinished = [job.job_id for job in self._jobs.values() if job.status in ('QUEUED', 'RUNNING')]
+        if unfinished:
+            logger.warning(f'{self.name} jobs dropped on shutdown: {", ".join(unfinished)}')
+        tasks, self._tasks = self._tasks, []
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._queue = None
+
+    def submit(self, func, *args):
+        """Queue `await func(job, *args)` and return the job; raise JobQueueFull if the queue is at capacity."""
+        self.start()
+        job = Job(f'{self.process_id}-{uuid.uuid4()}', func, args)
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise JobQueueFull(f'{self.name} job queue is full')
+        self._jobs[job.job_id] = job
+        while len(self._jobs) > self.history_size:
+            self._jobs.popitem(last=False)
+        return job
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def describe_missing(self, job_id):
+        if job_id.startswith(self.process_id + '-'):
+            return f'Job {job_id} not found, it is no longer kept in the job history'
+        return (f'Job {job_id} is unknown to this server process, it was accepted by another worker or before a '
+                f'restart; asynchronous jobs can only be polled reliably when the service runs a single worker')
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            job.status = 'RUNNING'
+            job.started_at = time.time()
+            try:
+                await job.func(job, *job.args)
+                job.status = 'SUCCEED'
+            except asyncio.CancelledError:
+                job.status = 'CANCELLED'
+                raise
+            except Exception as e:
+                logger.error(f'{self.name} job {job.job_id} failed', exc_info=True)
+                job.status = 'FAILED'
+                job.error_msg = str(e)
+            finally:
+                job.finished_at = time.time()
+                # drop the payload so finished jobs only hold their results
+                job.args = ()
+                self._queue.task_done()
+
+
+attach_jobs = JobManager(
+    'attach_attributes',
+    ConfigClass.ATTRIBUTE_ATTACH_JOB_WORKERS,
+    ConfigClass.ATTRIBUTE_ATTACH_JOB_QUEUE_SIZE,
+    ConfigClass.ATTRIBUTE_ATTACH_JOB_HISTORY_SIZE,
+)
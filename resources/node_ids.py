@@ -0,0 +1,61 @@
+# Copyright 2022 Indoc Research
+# 
+# Licensed under the EUPL, Version 1.2 or – as soon they
+# will be approved by the European Commission - subsequent
+# versions of the EUPL (the "Licence");
+# You may not use this work except in compliance with the
+# Licence.
+# You may obtain a copy of the Licence at:
+# 
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-eupl-12
+# 
+# Unless required by applicable law or agreed to in
+# writing, software distributed under the Licence is
+# distributed on an "AS IS" basis,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied.
+# See the Licence for the specific language governing
+# permissions and limitations under the Licence.
+# 
+
+from config import ConfigClass
+from resources.cache import TTLCache
+from resources.http_clients import http_clients
+
+
+class NodeIdResolver:
+    """Map global entity ids to neo4j internal ids, which relation endpoints take.
+
+    Create and query responses already carry both, so they are remembered as they pass by and linking nodes that
+    were just created or read needs no lookup. Misses are resolved together in one nodes/query/geids call.
+    """
+
+    def __init__(self, maxsize, ttl):
+        self._ids = TTLCache('node_id', maxsize, ttl)
+
+    def remember(self, nodes):
+        for node in nodes:
+            if isinstance(node, dict) and node.get('global_entity_id') and node.get('id') is not None:
+                self._ids.set(node['global_entity_id'], node['id'])
+
+    async def resolve(self, geids):
+        """Return {geid: id} for the geids that exist. Raises httpx.HTTPError when neo4j fails."""
+        ids = {}
+        missing = []
+        for geid in geids:
+            node_id = self._ids.get(geid)
+            if node_id is None:
+                missing.append(geid)
+            else:
+                ids[geid] = node_id
+        if missing:
+            response = await http_clients.neo4j.post(ConfigClass.NEO4J_SERVICE_V1 + 'nodes/query/geids',
+                                                     json={'geids': missing})
+            response.raise_for_status()
+            nodes = response.json()['result']
+            self.remember(nodes)
+            ids.update({node['global_entity_id']: node['id'] for node in nodes})
+        return ids
+
+
+node_ids = NodeIdResolver(ConfigClass.NODE_ID_CACHE_SIZE, ConfigClass.NODE_ID_CACHE_TTL)
@@ -0,0 +1,99 @@
+# Copyright 2022 Indoc Research
+# 
+# Licensed under the EUPL, Version 1.2 or – as soon they
+# will be approved by the European Commission - subsequent
+# versions of the EUPL (the "Licence");
+# You may not use this work except in compliance with the
+# Licence.
+# You may obtain a copy of the Licence at:
+# 
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-eupl-12
+# 
+# Unless required by applicable law or agreed to in
+# writing, software distributed under the Licence is
+# distributed on an "AS IS" basis,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied.
+# See the Licence for the specific language governing
+# permissions and limitations under the Licence.
+# 
+
+import asyncio
+
+from config import ConfigClass
+from resources.http_clients import http_clients
+from resources.node_ids import node_ids
+
+
+class NodeLoader:
+    """Coalesce single node lookups by geid into batched nodes/query/geids calls.
+
+    Lookups arriving within `window` seconds of the first queued one are sent together, and a geid that is already
+    queued or being fetched shares that future instead of being asked for again. A batch is sent early once it
+    reaches `max_batch` geids.
+    """
+
+    def __init__(self, window, max_batch):
+        self._window = window
+        self._max_batch = max_batch
+        self._loop = None
+        self._futures = {}
+        self._queue = []
+        self._timer = None
+
+    def _bind(self, loop):
+        # futures belong to one event loop, anything left over from another loop is of no use
+        if self._loop is not loop:
+            self._loop = loop
+            self._futures = {}
+            self._queue = []
+            self._timer = None
+
+    async def load(self, geid):
+        """Return the node with this geid, or None. Raises httpx.HTTPError when neo4j fails."""
+        loop = asyncio.get_event_loop()
+        self._bind(loop)
+        future = self._futures.get(geid)
+        if future is None:
+            future = loop.create_future()
+            self._futures[geid] = future
+            self._queue.append(geid)
+            if len(self._queue) >= self._max_batch:
+                self._dispatch()
+            elif self._timer is None:
+                self._timer = loop.call_later(self._window, self._dispatch)
+        # one caller giving up must not cancel the lookup for everyone else waiting on it
+        return await asyncio.shield(future)
+
+    def _dispatch(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._queue = self._queue, []
+        if batch:
+            self._loop.create_task(self._fetch(batch))
+
+    async def _fetch(self, batch):
+        futures = {geid: self._futures[geid] for geid in batch}
+        try:
+            response = await http_clients.neo4j.post(ConfigClass.NEO4J_SERVICE_V1 + 'nodes/query/geids',
+                                                     json={'geids': batch})
+            response.raise_for_status()
+            nodes = response.json()['result']
+        except Exception as e:
+            for future in futures.values():
+                if not future.done():
+                    future.set_exception(e)
+            return
+        finally:
+            for geid, future in futures.items():
+                if self._futures.get(geid) is future:
+                    del self._futures[geid]
+        node_ids.remember(nodes)
+        found = {node['global_entity_id']: node for node in nodes}
+        for geid, future in futures.items():
+            if not future.done():
+                future.set_result(found.get(geid))
+
+
+node_loader = NodeLoader(ConfigClass.NODE_LOADER_WINDOW, ConfigClass.NODE_LOADER_MAX_BATCH)
@@ -18,3 +18,22 @@
 # permissions and limitations under the Licence.
 # 
 
+
+
+def async_return(value):
+    """Build a coroutine function returning value, used to patch async helpers."""
+
+    async def _return(*args, **kwargs):
+        return value
+
+    return _return
+
+
+def async_iter(values):
+    """Build an async generator function yielding values, used to patch async generators."""
+
+    async def _iter(*args, **kwargs):
+        for value in values:
+            yield value
+
+    return _iter
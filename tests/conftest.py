@@ -36,6 +36,7 @@ import os
 from testcontainers.postgres import PostgresContainer
 from config import ConfigClass
 from fastapi_sqlalchemy import DBSessionMiddleware
+from resources.cache import caches
 
 RDS_DB_URI = os.environ['RDS_DB_URI']
 RDS_SCHEMA_DEFAULT = os.environ['RDS_SCHEMA_DEFAULT']
@@ -48,6 +49,14 @@ def db():
         yield postgres
 
 
+@pytest.fixture(autouse=True)
+def clear_caches():
+    # fixtures rebuild the database for every test, behind the back of the in-process caches
+    for cache in caches.values():
+        cache.clear()
+    yield
+
+
 @pytest.fixture
 def test_client(db):
     ConfigClass.RDS_DB_URI = db.get_connection_url()
@@ -18,6 +18,11 @@
 # permissions and limitations under the Licence.
 # 
 
+from models.meta import file_meta_cache
+from resources.job_manager import JobQueueFull
+from tests import async_iter
+from tests import async_return
+
 project_geid = "b38c26d0-1d51-44f1-9ab6-3175bd41ccc9-111111"
 
 
@@ -27,15 +32,14 @@ def test_v1_attach_attribute_to_file_return_200(request, test_client, httpx_mock
     # get file node from neo4j based on geid:
     httpx_mock.add_response(
         method='POST',
-        url="http://neo4j_service/v1/neo4j/nodes/File/query",
+        url="http://neo4j_service/v1/neo4j/nodes/query/geids",
         status_code=200,
-        json=[{
+        json={"result": [{
             "global_entity_id": project_geid,
+            "labels": ["Greenroom", "File"],
             "manifest_id": 1,
             "name": "test123"
-
-        }],
-
+        }]},
     )
 
     payload = {
@@ -80,14 +84,41 @@ def test_v1_attach_attribute_to_file_node_does_not_exist_return_200(request, tes
     project_code = request.getfixturevalue('create_db_manifest')
 
     # get file node from neo4j based on geid:
-    mocker.patch('api.api_attributes.file_attributes.get_file_node_bygeid',
-                 return_value=None)
+    mocker.patch('api.api_attributes.utils.get_nodes_bygeids',
+                 side_effect=async_return({project_geid: {"global_entity_id": project_geid,
+                                                          "labels": ["Greenroom", "Folder"]}}))
 
-    mocker.patch('api.api_attributes.file_attributes.get_folder_node_bygeid',
-                 return_value=None)
+    mocker.patch('api.api_attributes.utils.walk_folder_files',
+                 side_effect=async_iter([{"id": 5, "manifest_id": "1", "name": "test123", "global_entity_id": "jasd7qhvc"}]))
 
-    mocker.patch('api.api_attributes.file_attributes.get_files_recursive',
-                 return_value=[{"id": 5, "manifest_id": "1", "name": "test123", "global_entity_id": "jasd7qhvc"}])
+    payload = {
+        "project_role": "admin",
+        "username": "admin",
+        "project_code": project_code,
+        "manifest_id": 1,
+        "global_entity_id": [project_geid],
+        "attributes": {"test1": "2"},
+        "inherit": True
+    }
+
+    result = test_client.post(f"/v1/files/attributes/attach", json=payload)
+    assert result.status_code == 200
+
+
+def test_v1_attach_attribute_below_folder_invalidates_listings_of_updated_files_return_200(request, test_client,
+                                                                                            create_db_manifest, mocker):
+    project_code = request.getfixturevalue('create_db_manifest')
+    file_meta_cache.set(("project-listing",), ("testproject", b"{}"))
+    file_meta_cache.set(("other-listing",), ("otherproject", b"{}"))
+
+    # the folder node carries no project_code, only the files found below it do
+    mocker.patch('api.api_attributes.utils.get_nodes_bygeids',
+                 side_effect=async_return({project_geid: {"global_entity_id": project_geid,
+                                                          "labels": ["Greenroom", "Folder"]}}))
+    mocker.patch('api.api_attributes.utils.walk_folder_files',
+                 side_effect=async_iter([{"id": 5, "name": "test123", "global_entity_id": "jasd7qhvc",
+                                          "project_code": "testproject"}]))
+    mocker.patch('api.api_attributes.utils.attach_attributes', side_effect=async_return(True))
 
     payload = {
         "project_role": "admin",
@@ -101,6 +132,8 @@ def test_v1_attach_attribute_to_file_node_does_not_exist_return_200(request, tes
 
     result = test_client.post(f"/v1/files/attributes/attach", json=payload)
     assert result.status_code == 200
+    assert file_meta_cache.get(("project-listing",)) is None
+    assert file_meta_cache.get(("other-listing",)) is not None
 
 
 def test_v1_attach_attribute_to_file_node_does_not_exist_file_search_empty_return_200(request, test_client, httpx_mock,
@@ -108,14 +141,57 @@ def test_v1_attach_attribute_to_file_node_does_not_exist_file_search_empty_retur
     project_code = request.getfixturevalue('create_db_manifest')
 
     # get file node from neo4j based on geid:
-    mocker.patch('api.api_attributes.file_attributes.get_file_node_bygeid',
-                 return_value=None)
+    mocker.patch('api.api_attributes.utils.get_nodes_bygeids',
+                 side_effect=async_return({project_geid: {"global_entity_id": project_geid,
+                                                          "labels": ["Greenroom", "Folder"]}}))
 
-    mocker.patch('api.api_attributes.file_attributes.get_folder_node_bygeid',
-                 return_value=None)
+    mocker.patch('api.api_attributes.utils.walk_folder_files',
+                 side_effect=async_iter([]))
 
-    mocker.patch('api.api_attributes.file_attributes.get_files_recursive',
-                 return_value=[])
+    payload = {
+        "project_role": "admin",
+        "username": "admin",
+        "project_code": project_code,
+        "manifest_id": 1,
+        "global_entity_id": [project_geid],
+        "attributes": {"test1": "2"},
+        "inherit": True
+    }
+
+    result = test_client.post(f"/v1/files/attributes/attach", json=payload)
+    assert result.status_code == 200
+
+
+def test_v1_attach_attribute_to_folder_walks_nested_folders_return_200(request, test_client, httpx_mock,
+                                                                       create_db_manifest):
+    project_code = request.getfixturevalue('create_db_manifest')
+
+    # geid is not a file but a folder
+    httpx_mock.add_response(
+        method='POST',
+        url="http://neo4j_service/v1/neo4j/nodes/query/geids",
+        status_code=200,
+        json={"result": [{"global_entity_id": project_geid, "labels": ["Greenroom", "Folder"], "name": "folder"}]}
+    )
+
+    # first level holds a file and a subfolder, second level holds a file
+    httpx_mock.add_response(
+        method='POST',
+        url="http://neo4j_service/v2/neo4j/relations/query",
+        status_code=200,
+        json={"results": [
+            {"labels": ["Greenroom", "File"], "global_entity_id": "file-1", "name": "file1", "manifest_id": 1},
+            {"labels": ["Greenroom", "Folder"], "global_entity_id": "folder-1", "name": "folder1"},
+        ]}
+    )
+    httpx_mock.add_response(
+        method='POST',
+        url="http://neo4j_service/v2/neo4j/relations/query",
+        status_code=200,
+        json={"results": [
+            {"labels": ["Greenroom", "File"], "global_entity_id": "file-2", "name": "file2", "manifest_id": 1},
+        ]}
+    )
 
     payload = {
         "project_role": "admin",
@@ -128,7 +204,10 @@ def test_v1_attach_attribute_to_file_node_does_not_exist_file_search_empty_retur
     }
 
     result = test_client.post(f"/v1/files/attributes/attach", json=payload)
+    res = result.json()
     assert result.status_code == 200
+    assert [item["geid"] for item in res["result"]] == ["file-1", "file-2"]
+    assert all(item["error_type"] == "attributes_duplicate" for item in res["result"])
 
 
 def test_v1_attach_attribute_to_file_without_manifest_id_in_file_node_return_200(request, test_client, httpx_mock,
@@ -136,11 +215,12 @@ def test_v1_attach_attribute_to_file_without_manifest_id_in_file_node_return_200
     project_code = request.getfixturevalue('create_db_manifest')
 
     # get file node from neo4j based on geid:
-    mocker.patch('api.api_attributes.file_attributes.get_file_node_bygeid',
-                 return_value={"name": "test123", "global_entity_id": "abc1123def"})
+    mocker.patch('api.api_attributes.utils.get_nodes_bygeids',
+                 side_effect=async_return({project_geid: {"id": 5, "name": "test123", "global_entity_id": "abc1123def",
+                                                          "labels": ["Greenroom", "File"]}}))
 
-    mocker.patch('api.api_attributes.file_attributes.attach_attributes',
-                 return_value=True)
+    mocker.patch('api.api_attributes.utils.attach_attributes',
+                 side_effect=async_return(True))
 
     payload = {
         "project_role": "admin",
@@ -156,21 +236,130 @@ def test_v1_attach_attribute_to_file_without_manifest_id_in_file_node_return_200
     assert result.status_code == 200
 
 
+def test_v1_attach_attribute_to_files_failed_update_only_terminates_that_file(request, test_client, httpx_mock,
+                                                                             create_db_manifest):
+    project_code = request.getfixturevalue('create_db_manifest')
+
+    httpx_mock.add_response(
+        method='POST',
+        url="http://neo4j_service/v1/neo4j/nodes/query/geids",
+        status_code=200,
+        json={"result": [
+            {"id": 1, "global_entity_id": "file-1", "labels": ["Greenroom", "File"], "name": "file1"},
+            {"id": 2, "global_entity_id": "file-2", "labels": ["Greenroom", "File"], "name": "file2"},
+        ]},
+    )
+    httpx_mock.add_response(
+        method='PUT',
+        url="http://neo4j_service/v1/neo4j/nodes/File/node/1",
+        status_code=200,
+        json={}
+    )
+    httpx_mock.add_response(
+        method='PUT',
+        url="http://neo4j_service/v1/neo4j/nodes/File/node/2",
+        status_code=500,
+        json={}
+    )
+    httpx_mock.add_response(
+        method='PUT',
+        url="http://audit_trail_service/v1/entity/file",
+        status_code=200,
+        json={}
+    )
+
+    payload = {
+        "project_role": "admin",
+        "username": "admin",
+        "project_code": project_code,
+        "manifest_id": 1,
+        "global_entity_id": ["file-1", "file-2"],
+        "attributes": {"test1": "2"},
+        "inherit": True
+    }
+
+    result = test_client.post(f"/v1/files/attributes/attach", json=payload)
+    res = result.json()
+    assert result.status_code == 200
+    assert res["result"] == [
+        {"name": "file1", "geid": "file-1", "operation_status": "SUCCEED"},
+        {"name": "file2", "geid": "file-2", "operation_status": "TERMINATED", "error_type": "internal_error"},
+    ]
+
+
+def test_v1_attach_attribute_async_returns_job_and_reports_progress(request, test_client, create_db_manifest, mocker):
+    project_code = request.getfixturevalue('create_db_manifest')
+
+    mocker.patch('api.api_attributes.utils.get_nodes_bygeids',
+                 side_effect=async_return({project_geid: {"global_entity_id": project_geid,
+                                                          "labels": ["Greenroom", "Folder"]}}))
+    mocker.patch('api.api_attributes.utils.walk_folder_files',
+                 side_effect=async_iter([{"id": 5, "manifest_id": "1", "name": "test123", "global_entity_id": "jasd7qhvc"}]))
+
+    payload = {
+        "project_role": "admin",
+        "username": "admin",
+        "project_code": project_code,
+        "manifest_id": 1,
+        "global_entity_id": [project_geid],
+        "attributes": {"test1": "2"},
+        "inherit": True
+    }
+
+    result = test_client.post(f"/v1/files/attributes/attach?async=true", json=payload)
+    assert result.status_code == 200
+    job_id = result.json()["result"]["job_id"]
+
+    # the worker runs on the app loop, which only turns while a request is served
+    for _ in range(10):
+        job = test_client.get(f"/v1/files/attributes/attach/jobs/{job_id}").json()["result"]
+        if job["status"] == "SUCCEED":
+            break
+    assert job["status"] == "SUCCEED"
+    assert job["progress"] == {"processed": 1, "succeeded": 0, "terminated": 1}
+    assert job["result"][0]["error_type"] == "attributes_duplicate"
+
+
+def test_v1_attach_attribute_async_queue_full_return_429(request, test_client, create_db_manifest, mocker):
+    project_code = request.getfixturevalue('create_db_manifest')
+
+    mocker.patch('api.api_attributes.file_attributes.attach_jobs.submit',
+                 side_effect=JobQueueFull("attach_attributes job queue is full"))
+
+    payload = {
+        "project_role": "admin",
+        "username": "admin",
+        "project_code": project_code,
+        "manifest_id": 1,
+        "global_entity_id": [project_geid],
+        "attributes": {"test1": "2"},
+        "inherit": True
+    }
+
+    result = test_client.post(f"/v1/files/attributes/attach?async=true", json=payload)
+    assert result.status_code == 429
+
+
+def test_v1_get_attach_job_not_found_return_404(test_client):
+    result = test_client.get(f"/v1/files/attributes/attach/jobs/unknown-job")
+    assert result.status_code == 404
+    assert "unknown to this server process" in result.json()["error_msg"]
+
+
 def test_v1_attach_duplicate_attributes_return_terminated(request, test_client, httpx_mock, create_db_manifest):
     project_code = request.getfixturevalue('create_db_manifest')
 
     # get file node from neo4j based on geid:
     httpx_mock.add_response(
         method='POST',
-        url="http://neo4j_service/v1/neo4j/nodes/File/query",
+        url="http://neo4j_service/v1/neo4j/nodes/query/geids",
         status_code=200,
-        json=[{
+        json={"result": [{
             "global_entity_id": project_geid,
+            "labels": ["Greenroom", "File"],
             "manifest_id": 2,
             "name": "test1234"
-
-        }],
-
+        }]},
     )
 
     payload = {
@@ -222,7 +411,7 @@ def test_v1_attach_attribute_to_file_node_not_found_return_None(request, test_cl
     # get file node from neo4j based on geid:
     httpx_mock.add_response(
         method='POST',
-        url="http://neo4j_service/v1/neo4j/nodes/File/query",
+        url="http://neo4j_service/v1/neo4j/nodes/query/geids",
         json=None,
 
     )
@@ -18,6 +18,17 @@
 # permissions and limitations under the Licence.
 # 
 
+import asyncio
+import json
+
+from pytest_httpx import to_response
+
+from config import ConfigClass
+from models.meta import invalidate_file_meta
+from models.meta import invalidate_routing
+from resources.node_loader import node_loader
+from tests import async_return
+
 project_code = "unittest_entity_info_files_meta"
 geid = "b38c26d0-1d51-44f1-9ab6-3175bd41ccc9-111111"
 
@@ -34,7 +45,7 @@ def test_v1_get_file_metadata_by_geid_return_200(test_client, httpx_mock, mocker
 
     )
 
-    mocker.patch("api.api_files.meta.get_parent_connections", return_value={})
+    mocker.patch("api.api_files.meta.get_parent_connections", side_effect=async_return({}))
 
     payload = {
         'page': 0,
@@ -55,6 +66,39 @@ def test_v1_get_file_metadata_by_geid_return_200(test_client, httpx_mock, mocker
     assert file["name"] == "entityinfo_unittest_folder"
 
 
+def test_v1_get_file_metadata_by_geid_served_from_cache_until_project_is_written(test_client, httpx_mock, mocker):
+    mocker.patch("api.api_files.meta.convert_query", return_value={})
+    for name in ["file_before", "file_after"]:
+        httpx_mock.add_response(
+            method='POST',
+            url="http://neo4j_service/v2/neo4j/relations/query",
+            status_code=200,
+            json={"total": 1, "results": [{"name": name, "project_code": project_code}]}
+        )
+    mocker.patch("api.api_files.meta.get_parent_connections", side_effect=async_return([]))
+    before = test_client.get("/v1/stats/cache").json()["result"]["file_meta"]
+
+    # the same listing with query keys in another order is the same cache entry
+    for query in ['{"archived": false, "name": "file"}', '{"name": "file", "archived": false}']:
+        params = {'query': query, 'source_type': 'Project', 'zone': 'Greenroom'}
+        result = test_client.get(f"/v1/files/meta/{geid}", params=params)
+        assert result.json()["result"]["data"][0]["name"] == "file_before"
+    assert len(httpx_mock.get_requests()) == 1
+
+    invalidate_file_meta(["another_project"])
+    result = test_client.get(f"/v1/files/meta/{geid}", params=params)
+    assert result.json()["result"]["data"][0]["name"] == "file_before"
+
+    invalidate_file_meta([project_code])
+    result = test_client.get(f"/v1/files/meta/{geid}", params=params)
+    assert result.json()["result"]["data"][0]["name"] == "file_after"
+
+    stats = test_client.get("/v1/stats/cache").json()["result"]["file_meta"]
+    assert (stats["hits"] - before["hits"], stats["misses"] - before["misses"]) == (2, 2)
+    assert 0 < stats["hit_ratio"] <= 1
+    assert stats["memory_bytes"] > 0
+
+
 def test_v1_get_file_metadata_by_geid_neo4j_error_return_500(test_client, httpx_mock, mocker):
     mocker.patch("api.api_files.meta.convert_query", return_value={})
 
@@ -93,7 +137,7 @@ def test_v1_get_files_pagination_return_200(test_client, httpx_mock, mocker):
 
     )
 
-    mocker.patch("api.api_files.meta.get_parent_connections", return_value={})
+    mocker.patch("api.api_files.meta.get_parent_connections", side_effect=async_return({}))
 
     data = {
         'page': 1,
@@ -127,7 +171,7 @@ def test_v1_get_single_file_from_query_return_200(test_client, httpx_mock, mocke
 
     )
 
-    mocker.patch("api.api_files.meta.get_parent_connections", return_value={})
+    mocker.patch("api.api_files.meta.get_parent_connections", side_effect=async_return({}))
 
     data = {
         'page': 0,
@@ -150,6 +194,53 @@ def test_v1_get_single_file_from_query_return_200(test_client, httpx_mock, mocke
     assert file["name"] == "entityinfo_unittest"
 
 
+def listing_node(index):
+    return {"id": index, "list_priority": 20, "name": f"file_{index:02d}", "project_code": project_code}
+
+
+def mock_listing(httpx_mock, rows, before_window=None):
+    """Answer relations/query windows from rows the way neo4j would, so tests can change rows between pages."""
+    def respond(request, *args, **kwargs):
+        body = json.loads(request.read())
+        if before_window:
+            before_window()
+        results = rows[body["skip"]:body["skip"] + body["limit"]]
+        return to_response(json={"total": len(rows), "results": results})
+
+    httpx_mock.add_callback(respond, method='POST', url="http://neo4j_service/v2/neo4j/relations/query")
+
+
+def test_v1_get_files_routing_cached_until_folder_created_return_200(test_client, httpx_mock, mocker):
+    mocker.patch("api.api_files.meta.convert_query", return_value={})
+    routing = [{"global_entity_id": geid, "name": "entityinfo_unittest_folder"}]
+    connections = mocker.patch("api.api_files.meta.get_parent_connections", side_effect=async_return(routing))
+
+    for _ in range(3):
+        httpx_mock.add_response(
+            method='POST',
+            url="http://neo4j_service/v2/neo4j/relations/query",
+            status_code=200,
+            json={"total": 60, "results": []}
+        )
+
+    payload = {
+        'page_size': 25,
+        'order_by': 'name',
+        'source_type': 'Folder',
+        'zone': 'Greenroom',
+    }
+    for page in [0, 1]:
+        result = test_client.get(f"/v1/files/meta/{geid}", params={**payload, 'page': page})
+        assert result.status_code == 200
+        assert result.json()["result"]["routing"] == routing
+    assert connections.call_count == 1
+
+    invalidate_routing([geid])
+    result = test_client.get(f"/v1/files/meta/{geid}", params={**payload, 'page': 2})
+    assert result.status_code == 200
+    assert connections.call_count == 2
+
+
 def test_v1_get_files_with_invalid_order_type_return_400(test_client):
     data = {
         'page': 0,
@@ -193,7 +284,7 @@ def test_v1_get_folder_files_in_all_zones_return_200(test_client, httpx_mock, mo
 
     )
 
-    mocker.patch("api.api_files.meta.get_parent_connections", return_value={})
+    mocker.patch("api.api_files.meta.get_parent_connections", side_effect=async_return({}))
 
     data = {
         'page': 0,
@@ -307,7 +398,7 @@ def test_v1_get_folder_files_with_partial_parameter_return_200(test_client, http
 
     )
 
-    mocker.patch("api.api_files.meta.get_parent_connections", return_value={})
+    mocker.patch("api.api_files.meta.get_parent_connections", side_effect=async_return({}))
 
     data = {
         'page': 0,
@@ -340,7 +431,7 @@ def test_v1_get_folder_files_in_trash_return_200(test_client, httpx_mock, mocker
 
     )
 
-    mocker.patch("api.api_files.meta.get_parent_connections", return_value={})
+    mocker.patch("api.api_files.meta.get_parent_connections", side_effect=async_return({}))
 
     data = {
         'page': 0,
@@ -365,13 +456,58 @@ def test_v1_get_bulk_files_metadata_detail_return_200(test_client, httpx_mock):
         method='POST',
         url="http://neo4j_service/v1/neo4j/nodes/query/geids",
         status_code=200,
-        json={}
+        json={"result": [{"global_entity_id": "abc123"}]}
 
     )
 
     data = {"geids": ["abc123"]}
     result = test_client.post(f"/v1/files/bulk/detail", json=data)
     assert result.status_code == 200
+    assert result.json() == {"result": [{"global_entity_id": "abc123"}], "code": 200, "error_msg": ""}
+
+
+def test_v1_get_bulk_files_metadata_detail_streams_ndjson_in_chunks(test_client, httpx_mock, mocker):
+    mocker.patch.object(ConfigClass, "BULK_DETAIL_CHUNK_SIZE", 2)
+    for nodes in [[{"global_entity_id": "geid-1"}, {"global_entity_id": "geid-2"}], [{"global_entity_id": "geid-3"}]]:
+        httpx_mock.add_response(
+            method='POST',
+            url="http://neo4j_service/v1/neo4j/nodes/query/geids",
+            status_code=200,
+            json={"result": nodes}
+        )
+
+    data = {"geids": ["geid-1", "geid-2", "geid-3"]}
+    result = test_client.post(f"/v1/files/bulk/detail", json=data, headers={"Accept": "application/x-ndjson"})
+    assert result.status_code == 200
+    assert result.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in result.text.splitlines()]
+    assert [line["global_entity_id"] for line in lines] == ["geid-1", "geid-2", "geid-3"]
+    assert [json.loads(request.read())["geids"] for request in httpx_mock.get_requests()] == \
+        [["geid-1", "geid-2"], ["geid-3"]]
+
+
+def test_v1_get_bulk_files_metadata_detail_failure_midway_return_500(test_client, httpx_mock, mocker):
+    mocker.patch.object(ConfigClass, "BULK_DETAIL_CHUNK_SIZE", 1)
+    mocker.patch.object(ConfigClass, "BULK_DETAIL_CONCURRENCY", 1)
+    httpx_mock.add_response(
+        method='POST',
+        url="http://neo4j_service/v1/neo4j/nodes/query/geids",
+        status_code=200,
+        json={"result": [{"global_entity_id": "geid-1"}]}
+    )
+    httpx_mock.add_response(
+        method='POST',
+        url="http://neo4j_service/v1/neo4j/nodes/query/geids",
+        status_code=500,
+        json={}
+    )
+
+    data = {"geids": ["geid-1", "geid-2"]}
+    result = test_client.post(f"/v1/files/bulk/detail", json=data)
+    res = result.json()
+    # without NDJSON the body is only sent once every chunk is read, so a partial list is never answered as 200
+    assert result.status_code == 500
+    assert "Neo4j error" in res["error_msg"]
 
 
 def test_v1_get_bulk_files_metadata_detail_neo4j_error_return_500(test_client, httpx_mock):
@@ -401,23 +537,40 @@ def test_v1_get_bulk_files_metadata_detail_with_missing_geid_return_400(test_cli
 def test_v1_get_detail_of_single_file_by_geid_return_200(test_client, httpx_mock):
     file_geid = geid
     httpx_mock.add_response(
-        method='GET',
-        url=f"http://neo4j_service/v1/neo4j/nodes/geid/{file_geid}",
+        method='POST',
+        url="http://neo4j_service/v1/neo4j/nodes/query/geids",
         status_code=200,
-        json=[{"file1": "text"}]
+        json={"result": [{"global_entity_id": file_geid, "file1": "text"}]}
 
     )
     result = test_client.get(f"v1/files/detail/{file_geid}")
     assert result.status_code == 200
+    assert result.json()["result"]["file1"] == "text"
+
+
+def test_v1_concurrent_file_detail_lookups_share_one_neo4j_call(httpx_mock):
+    httpx_mock.add_response(
+        method='POST',
+        url="http://neo4j_service/v1/neo4j/nodes/query/geids",
+        status_code=200,
+        json={"result": [{"global_entity_id": "geid-1", "id": 1}, {"global_entity_id": "geid-2", "id": 2}]}
+    )
+
+    lookups = [node_loader.load(file_geid) for file_geid in ["geid-1", "geid-2", "geid-1", "geid-3"]]
+    nodes = asyncio.get_event_loop().run_until_complete(asyncio.gather(*lookups))
+    assert [node["id"] if node else None for node in nodes] == [1, 2, 1, None]
+    requests = httpx_mock.get_requests()
+    assert len(requests) == 1
+    assert json.loads(requests[0].read())["geids"] == ["geid-1", "geid-2", "geid-3"]
 
 
 def test_v1_get_detail_of_single_file_by_geid_file_neo4j_error_return_500(test_client, httpx_mock):
     file_geid = geid
     httpx_mock.add_response(
-        method='GET',
-        url=f"http://neo4j_service/v1/neo4j/nodes/geid/{file_geid}",
-        status_code=404,
-        json=""
+        method='POST',
+        url="http://neo4j_service/v1/neo4j/nodes/query/geids",
+        status_code=500,
+        json={}
 
     )
     result = test_client.get(f"v1/files/detail/{file_geid}")
@@ -429,13 +582,81 @@ def test_v1_get_detail_of_single_file_by_geid_file_neo4j_error_return_500(test_c
 def test_v1_get_detail_of_single_file_by_geid_file_not_found_return_404(test_client, httpx_mock):
     file_geid = geid
     httpx_mock.add_response(
-        method='GET',
-        url=f"http://neo4j_service/v1/neo4j/nodes/geid/{file_geid}",
+        method='POST',
+        url="http://neo4j_service/v1/neo4j/nodes/query/geids",
         status_code=200,
-        json=False
+        json={"result": []}
 
     )
     result = test_client.get(f"v1/files/detail/{file_geid}")
     res = result.json()
     assert result.status_code == 404
     assert res["error_msg"] == "File not found"
+
+
+def test_v1_export_file_metadata_streams_every_page_as_ndjson(test_client, httpx_mock, mocker):
+    mocker.patch("api.api_files.meta.convert_query", return_value={})
+    mocker.patch.object(ConfigClass, "EXPORT_PAGE_SIZE", 2)
+    nodes = [{"id": i, "list_priority": 20, "time_created": f"2021-0{i}", "name": f"file{i}"} for i in range(1, 4)]
+    for results in [nodes[:2], nodes[1:]]:
+        httpx_mock.add_response(
+            method='POST',
+            url="http://neo4j_service/v2/neo4j/relations/query",
+            status_code=200,
+            json={"total": 3, "results": results}
+        )
+
+    result = test_client.get(f"/v1/files/meta/{geid}/export?source_type=Folder&zone=Greenroom")
+    assert result.status_code == 200
+    assert result.headers["content-type"].startswith("application/x-ndjson")
+    assert [json.loads(line)["name"] for line in result.text.splitlines()] == ["file1", "file2", "file3"]
+    pages = [json.loads(request.read()) for request in httpx_mock.get_requests()]
+    # each page after the first starts at the last row of the one before
+    assert [(page["skip"], page["limit"]) for page in pages] == [(0, 2), (1, 3)]
+    assert pages[0]["order_by"] == "list_priority ASC,end_node.time_created"
+    assert pages[0]["query"]["start_params"] == {"global_entity_id": geid}
+
+
+def test_v1_export_file_metadata_is_complete_when_rows_change_midway(test_client, httpx_mock, mocker):
+    mocker.patch("api.api_files.meta.convert_query", return_value={})
+    mocker.patch.object(ConfigClass, "EXPORT_PAGE_SIZE", 2)
+    rows = [listing_node(i) for i in range(1, 8)]
+    windows = []
+
+    def change_rows():
+        windows.append(None)
+        if len(windows) == 2:
+            # after the first page, files are uploaded ahead of the export and an exported one is deleted
+            del rows[0]
+            rows[0:0] = [listing_node(0)] * 5
+
+    mock_listing(httpx_mock, rows, before_window=change_rows)
+
+    result = test_client.get(f"/v1/files/meta/{geid}/export?source_type=Folder&zone=Greenroom&order_by=name")
+    assert result.status_code == 200
+    assert [json.loads(line)["id"] for line in result.text.splitlines()] == list(range(1, 8))
+
+
+def test_v1_export_file_metadata_is_complete_when_the_last_exported_row_is_deleted(test_client, httpx_mock, mocker):
+    mocker.patch("api.api_files.meta.convert_query", return_value={})
+    mocker.patch.object(ConfigClass, "EXPORT_PAGE_SIZE", 2)
+    rows = [listing_node(i) for i in range(1, 11)]
+    windows = []
+
+    def change_rows():
+        windows.append(None)
+        if len(windows) == 3:
+            # the rows exported so far are gone, including the one the next page starts from
+            del rows[0:4]
+
+    mock_listing(httpx_mock, rows, before_window=change_rows)
+
+    result = test_client.get(f"/v1/files/meta/{geid}/export?source_type=Folder&zone=Greenroom&order_by=name")
+    assert result.status_code == 200
+    assert [json.loads(line)["id"] for line in result.text.splitlines()] == list(range(1, 11))
+
+
+def test_v1_export_file_metadata_with_invalid_zone_return_400(test_client):
+    result = test_client.get(f"/v1/files/meta/{geid}/export?source_type=Folder&zone=Nowhere")
+    assert result.status_code == 400
+    assert result.json()["error_msg"] == "Invalid zone"
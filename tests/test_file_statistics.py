@@ -18,6 +18,12 @@
 # permissions and limitations under the Licence.
 # 
 
+import asyncio
+
+from config import ConfigClass
+from tests import async_return
+
+
 def test_v1_get_file_daily_statistics_return_200(test_client, httpx_mock, mocker):
     project_geid = "abc123"
     # query node
@@ -28,9 +34,123 @@ def test_v1_get_file_daily_statistics_return_200(test_client, httpx_mock, mocker
         json=[{"code":200}]
     )
 
-    mocker.patch('api.api_files.files_stats.get_operation_logs_total', return_value=[1, 2, 3, 4])
-    mocker.patch('api.api_files.files_stats.get_file_count_neo4j', return_value=[1, 2, 3])
+    mocker.patch('api.api_files.files_stats.get_operation_logs_total', side_effect=async_return([1, 2, 3, 4]))
+    mocker.patch('api.api_files.files_stats.get_file_count_neo4j', side_effect=async_return([1, 2, 3]))
+
+    response = test_client.get(
+        f"/v1/project/{project_geid}/files/statistics?project_code=0401&start_date=1618200000&end_date=1618286399")
+    assert response.status_code == 200
+
+
+def test_v1_get_file_daily_statistics_reports_partial_failure_return_200(test_client, httpx_mock, mocker):
+    project_geid = "abc123"
+    # query node
+    httpx_mock.add_response(
+        method='POST',
+        url="http://neo4j_service/v1/neo4j/nodes/Container/query",
+        status_code=200,
+        json=[{"code": "0401"}]
+    )
+
+    async def failed_count(*args, **kwargs):
+        raise Exception('get_file_count_neo4j 500: http://neo4j_service/v1/neo4j/file/quick/count')
+
+    mocker.patch('api.api_files.files_stats.get_operation_logs_total', side_effect=async_return(3))
+    mocker.patch('api.api_files.files_stats.get_file_count_neo4j', side_effect=failed_count)
 
     response = test_client.get(
         f"/v1/project/{project_geid}/files/statistics?project_code=0401&start_date=1618200000&end_date=1618286399")
     assert response.status_code == 200
+    res = response.json()["result"]
+    assert res["uploaded"] == 3
+    assert res["greenroom"] is None
+    assert res["core"] is None
+    assert set(res["errors"]) == {"greenroom", "core"}
+
+
+def test_v1_get_file_daily_statistics_served_from_cache_within_bucket(test_client, httpx_mock, mocker):
+    project_geid = "abc123"
+    # query node
+    httpx_mock.add_response(
+        method='POST',
+        url="http://neo4j_service/v1/neo4j/nodes/Container/query",
+        status_code=200,
+        json=[{"code": "0401"}]
+    )
+
+    logs_total = mocker.patch('api.api_files.files_stats.get_operation_logs_total', side_effect=async_return(3))
+    mocker.patch('api.api_files.files_stats.get_file_count_neo4j', side_effect=async_return(5))
+
+    # both end dates fall into the same minute bucket
+    for end_date in [1618286340, 1618286399]:
+        response = test_client.get(
+            f"/v1/project/{project_geid}/files/statistics?start_date=1618200000&end_date={end_date}")
+        assert response.status_code == 200
+        assert response.json()["result"]["core"] == 5
+    assert logs_total.call_count == 3
+
+
+def test_v1_get_file_daily_statistics_reads_project_info_fresh_return_200(test_client, httpx_mock, mocker):
+    project_geid = "abc123"
+    for name in ["before", "after"]:
+        httpx_mock.add_response(
+            method='POST',
+            url="http://neo4j_service/v1/neo4j/nodes/Container/query",
+            status_code=200,
+            json=[{"id": 1, "global_entity_id": project_geid, "code": "0401", "name": name}]
+        )
+
+    mocker.patch('api.api_files.files_stats.get_operation_logs_total', side_effect=async_return(3))
+    mocker.patch('api.api_files.files_stats.get_file_count_neo4j', side_effect=async_return(5))
+
+    # a project edited between two windows shows its new properties, while its identity stays cached
+    names = []
+    for end_date in [1618286399, 1618372799]:
+        response = test_client.get(
+            f"/v1/project/{project_geid}/files/statistics?start_date=1618200000&end_date={end_date}")
+        assert response.status_code == 200
+        names.append(response.json()["result"]["project_info"]["name"])
+    assert names == ["before", "after"]
+
+
+def test_v1_get_file_daily_statistics_project_lookup_timed_out_return_500(test_client, mocker):
+    async def slow_lookup(project_geid):
+        await asyncio.sleep(1)
+
+    mocker.patch.object(ConfigClass, 'FILE_STATS_CALL_TIMEOUT', 0.01)
+    mocker.patch('api.api_files.files_stats.containers.load', side_effect=slow_lookup)
+    logs_total = mocker.patch('api.api_files.files_stats.get_operation_logs_total', side_effect=async_return(3))
+
+    response = test_client.get(f"/v1/project/abc123/files/statistics?start_date=1618200000&end_date=1618286399")
+    assert response.status_code == 500
+    assert "project lookup timed out" in response.json()["error_msg"]
+    assert logs_total.call_count == 0
+
+
+def test_v1_get_file_statistics_for_many_projects_return_200(test_client, httpx_mock, mocker):
+    # all projects are resolved in one bulk query
+    httpx_mock.add_response(
+        method='POST',
+        url="http://neo4j_service/v1/neo4j/nodes/query/geids",
+        status_code=200,
+        json={"result": [
+            {"global_entity_id": "project-1", "labels": ["Container"], "code": "project1"},
+            {"global_entity_id": "project-2", "labels": ["Container"], "code": "project2"},
+        ]}
+    )
+
+    mocker.patch('api.api_files.files_stats.get_operation_logs_total', side_effect=async_return(3))
+    file_count = mocker.patch('api.api_files.files_stats.get_file_count_neo4j', side_effect=async_return(5))
+
+    payload = {
+        "project_geids": ["project-1", "project-2", "project-3"],
+        "start_date": "1618200000",
+        "end_date": "1618286399"
+    }
+    response = test_client.post(f"/v1/projects/files/statistics", json=payload)
+    assert response.status_code == 200
+    res = response.json()["result"]
+    assert res["project-1"]["greenroom"] == 5
+    assert res["project-2"]["project_info"]["code"] == "project2"
+    assert res["project-3"] is None
+    assert sorted(call[0][0] for call in file_count.call_args_list) == ["project1", "project1", "project2", "project2"]
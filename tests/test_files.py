@@ -18,6 +18,14 @@
 # permissions and limitations under the Licence.
 # 
 
+import json
+
+import httpx
+from pytest_httpx import to_response
+
+from models.meta import file_meta_cache
+from tests import async_return
+
 project_geid = "abc123"
 
 
@@ -324,7 +332,7 @@ def test_v1_create_file_with_missing_parent_folder_geid_return_200(test_client,
         json=[{"id": 100}]
     )
 
-    mocker.patch("api.api_files.files.get_container_id", return_value=10)
+    mocker.patch("api.api_files.files.get_container_id", side_effect=async_return(10))
 
     httpx_mock.add_response(
         method='POST',
@@ -371,7 +379,7 @@ def test_v1_create_file_with_missing_parent_folder_geid_failed_neo4j_relation_qu
         json=[{"id": 100}]
     )
 
-    mocker.patch("api.api_files.files.get_container_id", return_value=10)
+    mocker.patch("api.api_files.files.get_container_id", side_effect=async_return(10))
 
     httpx_mock.add_response(
         method='POST',
@@ -591,8 +599,188 @@ def test_v1_create_file_where_process_pipeline_is_data_transfer_return_return_20
     assert response.status_code == 200
 
 
+def test_v1_create_files_in_batch_return_200(test_client, httpx_mock):
+    # parent folders resolved once for the whole batch
+    httpx_mock.add_response(
+        method='POST',
+        url="http://neo4j_service/v1/neo4j/nodes/query/geids",
+        status_code=200,
+        json={"result": [{"id": 7, "global_entity_id": "folder-geid", "labels": ["Greenroom", "Folder"]}]}
+    )
+    httpx_mock.add_response(
+        method='POST',
+        url="http://neo4j_service/v1/neo4j/nodes/Container/query",
+        status_code=200,
+        json=[{"id": 1, "global_entity_id": project_geid, "code": "testproject"}]
+    )
+    httpx_mock.add_response(
+        method='POST',
+        url="http://neo4j_service/v1/neo4j/nodes/File/batch",
+        status_code=200,
+        json={}
+    )
+    # one bulk link for the folder files, one for the container files
+    for _ in range(2):
+        httpx_mock.add_response(
+            method='POST',
+            url="http://neo4j_service/v1/neo4j/relations/own/batch",
+            status_code=200,
+            json={}
+        )
+    for _ in range(2):
+        httpx_mock.add_response(
+            method='POST',
+            url="http://audit_trail_service/v1/entity/file",
+            status_code=200,
+            json={}
+        )
+
+    def file(geid, parent_folder_geid=None):
+        return {
+            "global_entity_id": geid,
+            "file_size": 1024,
+            "full_path": f"/data/storage/testproject/raw/{geid}.txt",
+            "dcm_id": "",
+            "guid": "5321880a-1a41-4bc8-a5d5-976732320579",
+            "namespace": "greenroom",
+            "uploader": "admin",
+            "project_code": "testproject",
+            "parent_folder_geid": parent_folder_geid,
+        }
+
+    payload = {"payload": [file("file-1", "folder-geid"), file("file-2"), file("file-3", "missing-folder")]}
+    response = test_client.post("/v1/files/batch", json=payload)
+    assert response.status_code == 200
+    res = response.json()
+    assert [item["status"] for item in res["result"]] == ["success", "success", "failed"]
+    assert res["result"][2]["error_msg"] == "Parent folder not found: missing-folder"
+    assert [item["node_created"] for item in res["result"]] == [True, True, False]
+    assert res["total"] == 2
+
+    nodes = json.loads(httpx_mock.get_requests(url="http://neo4j_service/v1/neo4j/nodes/File/batch")[0].read())
+    assert [node["global_entity_id"] for node in nodes["payload"]] == ["file-1", "file-2"]
+    assert nodes["extra_labels"] == ["Greenroom"]
+
+
+def test_v1_create_files_in_batch_reports_upstream_errors_per_file_return_200(test_client, httpx_mock):
+    # a failed parent lookup is not a missing parent
+    httpx_mock.add_response(
+        method='POST',
+        url="http://neo4j_service/v1/neo4j/nodes/query/geids",
+        status_code=503,
+        json={}
+    )
+    httpx_mock.add_response(
+        method='POST',
+        url="http://neo4j_service/v1/neo4j/nodes/Container/query",
+        status_code=200,
+        json=[{"id": 2, "global_entity_id": "batch-project-geid", "code": "batchproject"}]
+    )
+    httpx_mock.add_response(
+        method='POST',
+        url="http://neo4j_service/v1/neo4j/nodes/File/batch",
+        status_code=200,
+        json={}
+    )
+    # the node exists once the link fails
+    httpx_mock.add_response(
+        method='POST',
+        url="http://neo4j_service/v1/neo4j/relations/own/batch",
+        status_code=500,
+        json={}
+    )
+
+    def file(geid, parent_folder_geid=None):
+        return {
+            "global_entity_id": geid,
+            "file_size": 1024,
+            "full_path": f"/data/storage/batchproject/raw/{geid}.txt",
+            "dcm_id": "",
+            "guid": "5321880a-1a41-4bc8-a5d5-976732320579",
+            "namespace": "greenroom",
+            "uploader": "admin",
+            "project_code": "batchproject",
+            "parent_folder_geid": parent_folder_geid,
+        }
+
+    payload = {"payload": [file("file-1", "folder-geid"), file("file-2")]}
+    response = test_client.post("/v1/files/batch", json=payload)
+    assert response.status_code == 200
+    res = response.json()
+    assert [item["status"] for item in res["result"]] == ["failed", "failed"]
+    assert res["result"][0]["error_msg"].startswith("Neo4j error")
+    assert res["result"][0]["node_created"] is False
+    assert res["result"][1]["error_msg"].startswith("Neo4j error")
+    assert res["result"][1]["node_created"] is True
+    assert res["total"] == 0
+
+
+def test_v1_create_files_in_batch_reports_transport_errors_after_creation_return_200(test_client, httpx_mock):
+    httpx_mock.add_response(
+        method='POST',
+        url="http://neo4j_service/v1/neo4j/nodes/Container/query",
+        status_code=200,
+        json=[{"id": 3, "global_entity_id": "batch-project-geid", "code": "batchproject"}]
+    )
+    httpx_mock.add_response(
+        method='POST',
+        url="http://neo4j_service/v1/neo4j/nodes/File/batch",
+        status_code=200,
+        json={}
+    )
+    httpx_mock.add_response(
+        method='POST',
+        url="http://neo4j_service/v1/neo4j/relations/own/batch",
+        status_code=200,
+        json={}
+    )
+    # the created nodes cannot be read back for the pipeline relation
+    httpx_mock.add_response(
+        method='POST',
+        url="http://neo4j_service/v1/neo4j/nodes/query/geids",
+        status_code=500,
+        json={}
+    )
+
+    def timeout(request, *args, **kwargs):
+        raise httpx.ReadTimeout("timed out", request=request)
+
+    httpx_mock.add_callback(timeout, method='POST', url="http://audit_trail_service/v1/entity/file")
+
+    def file(geid, **extra):
+        return {
+            "global_entity_id": geid,
+            "file_size": 1024,
+            "full_path": f"/data/storage/batchproject/raw/{geid}.txt",
+            "dcm_id": "",
+            "guid": "5321880a-1a41-4bc8-a5d5-976732320579",
+            "namespace": "greenroom",
+            "uploader": "admin",
+            "project_code": "batchproject",
+            **extra,
+        }
+
+    payload = {"payload": [
+        file("file-1", input_file_id=5, process_pipeline="data_copy", operator="admin"),
+        file("file-2"),
+    ]}
+    response = test_client.post("/v1/files/batch", json=payload)
+    assert response.status_code == 200
+    res = response.json()["result"]
+    assert [item["node_created"] for item in res] == [True, True]
+    assert [item["status"] for item in res] == ["failed", "failed"]
+    assert res[0]["error_msg"].startswith("Neo4j error")
+    assert res[1]["error_msg"] == "Elastic Search Error: timed out"
+
+
+def test_v1_create_files_in_batch_with_empty_payload_return_400(test_client):
+    response = test_client.post("/v1/files/batch", json={"payload": []})
+    assert response.status_code == 400
+    assert response.json()["error_msg"] == "payload is required"
+
+
 def test_v1_query_file_by_container_project_geid_return_return_200(test_client, httpx_mock, mocker):
-    mocker.patch("api.api_files.files.get_container_id", return_value=10)
+    mocker.patch("api.api_files.files.get_container_id", side_effect=async_return(10))
 
     httpx_mock.add_response(
         method='POST',
@@ -636,6 +824,88 @@ def test_v1_query_file_by_container_project_geid_return_return_200(test_client,
     assert response.status_code == 200
 
 
+def test_v1_query_file_by_container_project_geid_with_estimated_total_return_200(test_client, httpx_mock, mocker):
+    mocker.patch("api.api_files.files.get_container_id", side_effect=async_return(10))
+
+    for _ in range(2):
+        httpx_mock.add_response(
+            method='POST',
+            url="http://neo4j_service/v1/neo4j/relations/query",
+            status_code=200,
+            json=[{"end_node": 1}]
+        )
+
+    # the count is loaded once and shared by every page of the listing
+    httpx_mock.add_response(
+        method='POST',
+        url="http://neo4j_service/v1/neo4j/relations/query/count",
+        status_code=200,
+        json={"count": 30}
+    )
+
+    for page in [0, 1]:
+        payload = {
+            "page": page,
+            "page_size": 25,
+            "include_total": "estimate",
+            "query": {"labels": ["File"], "File": {"name": "test"}}
+        }
+        response = test_client.post(f"/v1/files/{project_geid}/query", json=payload)
+        assert response.status_code == 200
+        res = response.json()
+        assert res["total"] == 30
+        assert res["num_of_pages"] == 2
+
+
+def test_v1_query_file_by_container_project_geid_without_total_return_200(test_client, httpx_mock, mocker):
+    mocker.patch("api.api_files.files.get_container_id", side_effect=async_return(10))
+
+    httpx_mock.add_response(
+        method='POST',
+        url="http://neo4j_service/v1/neo4j/relations/query",
+        status_code=200,
+        json=[{"end_node": 1}]
+    )
+
+    payload = {
+        "include_total": "false",
+        "query": {"labels": ["File"]}
+    }
+    response = test_client.post(f"/v1/files/{project_geid}/query", json=payload)
+    assert response.status_code == 200
+    res = response.json()
+    assert res["result"] == [1]
+    assert res["total"] is None
+    assert res["num_of_pages"] is None
+
+
+def test_v2_query_file_by_container_project_geid_resolves_container_once_return_200(test_client, httpx_mock):
+    # the container is resolved once and remembered by geid, id and code
+    httpx_mock.add_response(
+        method='POST',
+        url="http://neo4j_service/v1/neo4j/nodes/Container/query",
+        status_code=200,
+        json=[{"id": 10, "global_entity_id": project_geid, "code": "testproject"}]
+    )
+
+    for _ in range(2):
+        httpx_mock.add_response(
+            method='POST',
+            url="http://neo4j_service/v2/neo4j/relations/query",
+            status_code=200,
+            json={"total": 1, "results": [{"name": "test"}]}
+        )
+
+    payload = {"query": {"labels": ["File"]}}
+    for _ in range(2):
+        response = test_client.post(f"/v2/files/{project_geid}/query", json=payload)
+        assert response.status_code == 200
+        assert response.json()["result"] == [{"name": "test"}]
+
+    relation_query = json.loads(httpx_mock.get_requests()[-1].read())
+    assert relation_query["query"]["start_params"] == {"code": "testproject"}
+
+
 def test_v1_query_file_by_container_project_geid_with_invalid_order_type_return_return_400(test_client):
     payload = {
         "page": 0,
@@ -697,6 +967,9 @@ def test_v1_query_file_by_container_project_geid_with_missing_attributes_return_
 
 
 def test_v1_create_trash_file_return_200(test_client, httpx_mock):
+    # listings of the project are stale once the file is trashed, other projects keep theirs
+    file_meta_cache.set(("project-listing",), ("testproject", b"{}"))
+    file_meta_cache.set(("other-listing",), ("otherproject", b"{}"))
     # query node
     httpx_mock.add_response(
         method='POST',
@@ -707,6 +980,7 @@ def test_v1_create_trash_file_return_200(test_client, httpx_mock):
             "File"
         ], "description": "test", "file_size": 500, "guid": "abc123", "manifest_id": "1",
             "dcm_id": "123", "uploader": "admin", "tags": "tag1", "id": 456, "global_entity_id": "bc45af32",
+            "project_code": "testproject",
             "attr_1": "testvalue"}]
     )
 
@@ -717,22 +991,13 @@ def test_v1_create_trash_file_return_200(test_client, httpx_mock):
         json=[{"id": 1010, "global_entity_id": "bc45af32"}]
     )
 
-    global_entity_id = "bc45af32"
+    # the container is looked up by the project code of the file
     httpx_mock.add_response(
-        method='GET',
-        url=f"http://neo4j_service/v1/neo4j/relations/connected/{global_entity_id}",
+        method='POST',
+        url="http://neo4j_service/v1/neo4j/nodes/Container/query",
         status_code=200,
-        json={
-            "result": [
-                {
-                    "id": 4637,
-                    "labels": [
-                        "Greenroom",
-                        "Container",
-                        "Folder"
-                    ],
-                    "global_entity_id": "ebba4426-8b3a-11eb-8a88-eaff9e667817-1616437074",
-                }]}
+        json=[{"id": 4637, "labels": ["Container"], "code": "testproject",
+               "global_entity_id": "ebba4426-8b3a-11eb-8a88-eaff9e667817-1616437074"}]
     )
 
     httpx_mock.add_response(
@@ -764,6 +1029,175 @@ def test_v1_create_trash_file_return_200(test_client, httpx_mock):
     }
     response = test_client.post(f"/v1/files/trash", json=payload)
     assert response.status_code == 200
+    assert file_meta_cache.get(("project-listing",)) is None
+    assert file_meta_cache.get(("other-listing",)) is not None
+
+
+def test_v1_create_trash_files_in_batch_return_200(test_client, httpx_mock):
+    # the files, then the created TrashFiles, are each read in one bulk query
+    httpx_mock.add_response(
+        method='POST',
+        url="http://neo4j_service/v1/neo4j/nodes/query/geids",
+        status_code=200,
+        json={"result": [{"id": 456, "labels": ["Core", "File"], "global_entity_id": "file-1",
+                          "project_code": "testproject", "operator": "admin", "attr_1": "testvalue"}]}
+    )
+    httpx_mock.add_response(
+        method='POST',
+        url="http://neo4j_service/v1/neo4j/nodes/query/geids",
+        status_code=200,
+        json={"result": [{"id": 1010, "labels": ["Core", "TrashFile"], "global_entity_id": "trash-1"}]}
+    )
+    httpx_mock.add_response(
+        method='POST',
+        url="http://neo4j_service/v1/neo4j/nodes/Container/query",
+        status_code=200,
+        json=[{"id": 1, "global_entity_id": project_geid, "code": "testproject"}]
+    )
+    httpx_mock.add_response(
+        method='POST',
+        url="http://neo4j_service/v1/neo4j/nodes/TrashFile/batch",
+        status_code=200,
+        json={}
+    )
+    httpx_mock.add_response(
+        method='POST',
+        url="http://neo4j_service/v1/neo4j/relations/own/batch",
+        status_code=200,
+        json={}
+    )
+    httpx_mock.add_response(
+        method='POST',
+        url="http://neo4j_service/v1/neo4j/relations/deleted",
+        status_code=200,
+        json={}
+    )
+    httpx_mock.add_response(
+        method='PUT',
+        url="http://audit_trail_service/v1/entity/file",
+        status_code=200,
+        json={}
+    )
+
+    payload = {"payload": [
+        {"geid": "file-1", "trash_geid": "trash-1", "trash_full_path": "/trash/file-1.txt"},
+        {"geid": "file-2", "trash_geid": "trash-2", "trash_full_path": "/trash/file-2.txt"},
+    ]}
+    response = test_client.post(f"/v1/files/trash/batch", json=payload)
+    assert response.status_code == 200
+    res = response.json()
+    assert [item["status"] for item in res["result"]] == ["success", "failed"]
+    assert res["result"][1]["error_msg"] == "File not found: file-2"
+
+    trash_files = httpx_mock.get_requests(url="http://neo4j_service/v1/neo4j/nodes/TrashFile/batch")[0]
+    trash_files = json.loads(trash_files.read())
+    assert trash_files["extra_labels"] == ["Core"]
+    assert trash_files["payload"][0]["attr_1"] == "testvalue"
+    deleted = json.loads(httpx_mock.get_requests(url="http://neo4j_service/v1/neo4j/relations/deleted")[0].read())
+    assert (deleted["start_id"], deleted["end_id"]) == (456, 1010)
+
+
+def test_v1_create_trash_files_in_batch_reports_duplicates_and_unlinked_trash_files_return_200(test_client,
+                                                                                                 httpx_mock):
+    httpx_mock.add_response(
+        method='POST',
+        url="http://neo4j_service/v1/neo4j/nodes/query/geids",
+        status_code=200,
+        json={"result": [{"id": 456, "labels": ["Core", "File"], "global_entity_id": "file-1",
+                          "project_code": "testproject", "operator": "admin"}]}
+    )
+    httpx_mock.add_response(
+        method='POST',
+        url="http://neo4j_service/v1/neo4j/nodes/Container/query",
+        status_code=200,
+        json=[{"id": 1, "global_entity_id": project_geid, "code": "testproject"}]
+    )
+    httpx_mock.add_response(
+        method='POST',
+        url="http://neo4j_service/v1/neo4j/nodes/TrashFile/batch",
+        status_code=200,
+        json={}
+    )
+    httpx_mock.add_response(
+        method='POST',
+        url="http://neo4j_service/v1/neo4j/relations/own/batch",
+        status_code=500,
+        json={}
+    )
+
+    payload = {"payload": [
+        {"geid": "file-1", "trash_geid": "trash-1", "trash_full_path": "/trash/file-1.txt"},
+        {"geid": "file-1", "trash_geid": "trash-2", "trash_full_path": "/trash/file-1.txt"},
+    ]}
+    response = test_client.post(f"/v1/files/trash/batch", json=payload)
+    assert response.status_code == 200
+    res = response.json()["result"]
+    assert res[0]["node_created"] is True
+    assert res[0]["error_msg"].startswith("TrashFile created but not linked to its project")
+    assert (res[1]["node_created"], res[1]["error_msg"]) == (False, "Duplicate geid")
+
+    trash_files = httpx_mock.get_requests(url="http://neo4j_service/v1/neo4j/nodes/TrashFile/batch")[0]
+    assert [node["global_entity_id"] for node in json.loads(trash_files.read())["payload"]] == ["trash-1"]
+
+
+def test_v1_create_trash_files_in_batch_reports_failed_deleted_relations_return_200(test_client, httpx_mock):
+    file_meta_cache.set(("project-listing",), ("testproject", b"{}"))
+    httpx_mock.add_response(
+        method='POST',
+        url="http://neo4j_service/v1/neo4j/nodes/query/geids",
+        status_code=200,
+        json={"result": [
+            {"id": 456, "labels": ["Core", "File"], "global_entity_id": "file-1", "project_code": "testproject"},
+            {"id": 457, "labels": ["Core", "File"], "global_entity_id": "file-2", "project_code": "testproject"},
+        ]}
+    )
+    httpx_mock.add_response(
+        method='POST',
+        url="http://neo4j_service/v1/neo4j/nodes/query/geids",
+        status_code=200,
+        json={"result": [
+            {"id": 1010, "labels": ["Core", "TrashFile"], "global_entity_id": "trash-1"},
+            {"id": 1011, "labels": ["Core", "TrashFile"], "global_entity_id": "trash-2"},
+        ]}
+    )
+    httpx_mock.add_response(
+        method='POST',
+        url="http://neo4j_service/v1/neo4j/nodes/Container/query",
+        status_code=200,
+        json=[{"id": 1, "global_entity_id": project_geid, "code": "testproject"}]
+    )
+    httpx_mock.add_response(
+        method='POST',
+        url="http://neo4j_service/v1/neo4j/nodes/TrashFile/batch",
+        status_code=200,
+        json={}
+    )
+    httpx_mock.add_response(
+        method='POST',
+        url="http://neo4j_service/v1/neo4j/relations/own/batch",
+        status_code=200,
+        json={}
+    )
+
+    # the File -> TrashFile relation is refused for one file and times out for the other
+    def deleted(request, *args, **kwargs):
+        if json.loads(request.read())["start_id"] == 457:
+            raise httpx.ReadTimeout("timed out", request=request)
+        return to_response(status_code=500, json={})
+
+    httpx_mock.add_callback(deleted, method='POST', url="http://neo4j_service/v1/neo4j/relations/deleted")
+
+    payload = {"payload": [
+        {"geid": "file-1", "trash_geid": "trash-1", "trash_full_path": "/trash/file-1.txt"},
+        {"geid": "file-2", "trash_geid": "trash-2", "trash_full_path": "/trash/file-2.txt"},
+    ]}
+    response = test_client.post(f"/v1/files/trash/batch", json=payload)
+    assert response.status_code == 200
+    res = response.json()["result"]
+    assert [item["status"] for item in res] == ["failed", "failed"]
+    assert [item["node_created"] for item in res] == [True, True]
+    assert all(item["error_msg"].startswith("Neo4j error") for item in res)
+    assert file_meta_cache.get(("project-listing",)) is None
 
 
 def test_v1_create_trash_file_by_full_path_return_200(test_client, httpx_mock):
@@ -777,6 +1211,7 @@ def test_v1_create_trash_file_by_full_path_return_200(test_client, httpx_mock):
             "File"
         ], "description": "test", "file_size": 500, "guid": "abc123", "manifest_id": "1",
             "dcm_id": "123", "uploader": "admin", "tags": "tag1", "id": 456, "global_entity_id": "bc45af32",
+            "project_code": "testproject",
             "attr_1": "testvalue"}]
     )
 
@@ -787,22 +1222,13 @@ def test_v1_create_trash_file_by_full_path_return_200(test_client, httpx_mock):
         json=[{"id": 1010, "global_entity_id": "bc45af32"}]
     )
 
-    global_entity_id = "bc45af32"
+    # the container is looked up by the project code of the file
     httpx_mock.add_response(
-        method='GET',
-        url=f"http://neo4j_service/v1/neo4j/relations/connected/{global_entity_id}",
+        method='POST',
+        url="http://neo4j_service/v1/neo4j/nodes/Container/query",
         status_code=200,
-        json={
-            "result": [
-                {
-                    "id": 4637,
-                    "labels": [
-                        "Greenroom",
-                        "Container",
-                        "Folder"
-                    ],
-                    "global_entity_id": "ebba4426-8b3a-11eb-8a88-eaff9e667817-1616437074",
-                }]}
+        json=[{"id": 4637, "labels": ["Container"], "code": "testproject",
+               "global_entity_id": "ebba4426-8b3a-11eb-8a88-eaff9e667817-1616437074"}]
     )
 
     httpx_mock.add_response(
@@ -835,6 +1261,31 @@ def test_v1_create_trash_file_by_full_path_return_200(test_client, httpx_mock):
     assert response.status_code == 200
 
 
+def test_v1_create_trash_file_with_unknown_project_return_404(test_client, httpx_mock):
+    httpx_mock.add_response(
+        method='POST',
+        url="http://neo4j_service/v1/neo4j/nodes/File/query",
+        status_code=200,
+        json=[{"labels": ["Core", "File"], "id": 456, "global_entity_id": "bc45af32", "project_code": "unknown"}]
+    )
+    httpx_mock.add_response(
+        method='POST',
+        url="http://neo4j_service/v1/neo4j/nodes/Container/query",
+        status_code=200,
+        json=[]
+    )
+
+    payload = {
+        "full_path": "/path/",
+        "trash_full_path": "/trash/path",
+        "trash_geid": "abc123",
+        "geid": "bc45af32"
+    }
+    response = test_client.post(f"/v1/files/trash", json=payload)
+    assert response.status_code == 404
+    assert response.json()["error_msg"] == "Project not found: unknown"
+
+
 def test_v1_create_trash_file_elastic_search_error_return_500(test_client, httpx_mock):
     # query node
     httpx_mock.add_response(
@@ -845,7 +1296,8 @@ def test_v1_create_trash_file_elastic_search_error_return_500(test_client, httpx
             "Core",
             "File"
         ], "description": "test", "file_size": 500, "guid": "abc123", "manifest_id": "1",
-            "dcm_id": "123", "uploader": "admin", "tags": "tag1", "id": 456, "global_entity_id": "bc45af32"}]
+            "dcm_id": "123", "uploader": "admin", "tags": "tag1", "id": 456, "global_entity_id": "bc45af32",
+            "project_code": "testproject"}]
     )
 
     httpx_mock.add_response(
@@ -855,22 +1307,13 @@ def test_v1_create_trash_file_elastic_search_error_return_500(test_client, httpx
         json=[{"id": 1010, "global_entity_id": "bc45af32"}]
     )
 
-    global_entity_id = "bc45af32"
+    # the container is looked up by the project code of the file
     httpx_mock.add_response(
-        method='GET',
-        url=f"http://neo4j_service/v1/neo4j/relations/connected/{global_entity_id}",
+        method='POST',
+        url="http://neo4j_service/v1/neo4j/nodes/Container/query",
         status_code=200,
-        json={
-            "result": [
-                {
-                    "id": 4637,
-                    "labels": [
-                        "Greenroom",
-                        "Container",
-                        "Folder"
-                    ],
-                    "global_entity_id": "ebba4426-8b3a-11eb-8a88-eaff9e667817-1616437074",
-                }]}
+        json=[{"id": 4637, "labels": ["Container"], "code": "testproject",
+               "global_entity_id": "ebba4426-8b3a-11eb-8a88-eaff9e667817-1616437074"}]
     )
 
     httpx_mock.add_response(
@@ -907,8 +1350,8 @@ def test_v1_create_trash_file_elastic_search_error_return_500(test_client, httpx
 
 
 def test_v1_edit_attached_manifest_by_file_geid_return_200(test_client, httpx_mock, create_db_manifest, mocker):
-    mocker.patch("api.api_files.files.get_file_node_bygeid", return_value={"manifest_id": 1, "id": 1,
-                                                                           "global_entity_id": "j6127asb12"})
+    mocker.patch("api.api_files.files.get_file_node_bygeid", side_effect=async_return({"manifest_id": 1, "id": 1,
+                                                                                       "global_entity_id": "j6127asb12"}))
 
     httpx_mock.add_response(
         method='PUT',
@@ -933,8 +1376,8 @@ def test_v1_edit_attached_manifest_by_file_geid_return_200(test_client, httpx_mo
 
 def test_v1_edit_attached_manifest_by_file_geid_elastic_search_fails_return_500(test_client, httpx_mock,
                                                                                 create_db_manifest, mocker):
-    mocker.patch("api.api_files.files.get_file_node_bygeid", return_value={"manifest_id": 1, "id": 1,
-                                                                           "global_entity_id": "j6127asb12"})
+    mocker.patch("api.api_files.files.get_file_node_bygeid", side_effect=async_return({"manifest_id": 1, "id": 1,
+                                                                                       "global_entity_id": "j6127asb12"}))
 
     httpx_mock.add_response(
         method='PUT',
@@ -959,8 +1402,8 @@ def test_v1_edit_attached_manifest_by_file_geid_elastic_search_fails_return_500(
 
 
 def test_v1_edit_attached_manifest_invalid_attribute_return_400(test_client, mocker, create_db_manifest, httpx_mock):
-    mocker.patch("api.api_files.files.get_file_node_bygeid", return_value={"manifest_id": 3, "id": 1,
-                                                                           "global_entity_id": "j6127asb12"})
+    mocker.patch("api.api_files.files.get_file_node_bygeid", side_effect=async_return({"manifest_id": 3, "id": 1,
+                                                                                       "global_entity_id": "j6127asb12"}))
 
     file_geid = "abc123"
     payload = {"test123": "test"}
@@ -972,8 +1415,8 @@ def test_v1_edit_attached_manifest_invalid_attribute_return_400(test_client, moc
 
 def test_v1_edit_attached_manifest_attribute_length_too_long_return_400(test_client, mocker, create_db_manifest,
                                                                         httpx_mock):
-    mocker.patch("api.api_files.files.get_file_node_bygeid", return_value={"manifest_id": 1, "id": 1,
-                                                                           "global_entity_id": "j6127asb12"})
+    mocker.patch("api.api_files.files.get_file_node_bygeid", side_effect=async_return({"manifest_id": 1, "id": 1,
+                                                                                       "global_entity_id": "j6127asb12"}))
 
     file_geid = "abc123"
     payload = {"test123": "test" * 120}
@@ -994,6 +1437,24 @@ def test_v1_validate_input_to_attach_to_file_manifest_return_200(test_client, ht
     assert response.status_code == 200
 
 
+def test_v1_validate_input_uses_updated_attribute_after_edit_return_400(test_client, create_db_manifest):
+    payload = {
+        "manifest_name": "test123",
+        "project_code": "testproject",
+        "attributes": {}
+    }
+    response = test_client.post(f"/v1/files/manifest/validate", json=payload)
+    assert response.status_code == 200
+
+    # making the attribute required must drop the cached validator
+    attribute = {"name": "test123", "value": "1", "optional": False, "project_code": "testproject", "type": None}
+    test_client.put(f"/v1/attribute/1", json=attribute)
+
+    response = test_client.post(f"/v1/files/manifest/validate", json=payload)
+    assert response.status_code == 400
+    assert response.json()["result"] == "Missing required attribute"
+
+
 def test_v1_validate_input_to_attach_to_file_manifest_with_invalid_attribute_return_400(test_client, httpx_mock,
                                                                                         create_db_manifest, mocker):
     mocker.patch('api.api_files.files.check_attributes', return_value=(True, ""))
@@ -18,6 +18,13 @@
 # permissions and limitations under the Licence.
 # 
 
+import json
+
+from models.meta import routing_cache
+from resources.node_ids import node_ids
+from tests import async_return
+
+
 def test_v1_get_folder_info_by_condition_return_200(test_client, httpx_mock):
     # query node
     httpx_mock.add_response(
@@ -103,6 +110,39 @@ def test_v1_create_folders_via_batch_return_200(test_client, httpx_mock):
     assert response.status_code == 200
 
 
+def test_v1_create_folders_via_batch_does_not_cache_unlinked_routing_return_200(test_client, httpx_mock):
+    routing_cache.set("112345abcdefg", [{"global_entity_id": "112345abcdefg"}])
+
+    httpx_mock.add_response(
+        method='POST',
+        url="http://neo4j_service/v1/neo4j/nodes/Folder/batch",
+        status_code=200,
+        json=[{"global_entity_id": "112345abcdefg456", "name": "testfolder"}, {"name": "nogeid"}]
+    )
+
+    payload = {
+        "payload": [{
+            "global_entity_id": "112345abcdefg456",
+            "folder_name": "testfolder",
+            "folder_level": 1,
+            "folder_parent_geid": "112345abcdefg",
+            "folder_parent_name": "parentfolder",
+            "uploader": "admin",
+            "folder_relative_path": "",
+            "zone": "greenroom",
+            "project_code": "testproject",
+            "folder_tags": [],
+        }],
+        "zone": "greenroom",
+        "link_container": False}
+
+    response = test_client.post(f"/v1/folders/batch", json=payload)
+    assert response.status_code == 200
+    # the batch never links a folder to its parent, so no ancestry may be assumed for it
+    assert routing_cache.get("112345abcdefg456") is None
+    assert routing_cache.get(None) is None
+
+
 def test_v1_create_folders_via_batch_using_elastic_search_return_200(test_client, httpx_mock):
     # create folder in elastic search
     httpx_mock.add_response(
@@ -173,10 +213,59 @@ def test_v1_create_folders_via_batch_failed_elastic_search_return_500(test_clien
     assert response.status_code == 500
 
 
+def test_v1_create_folders_via_batch_reports_failed_elastic_search_items_return_200(test_client, httpx_mock):
+    httpx_mock.add_response(
+        method='POST',
+        url="http://audit_trail_service/v1/entity/file",
+        status_code=200,
+        json={}
+    )
+    httpx_mock.add_response(
+        method='POST',
+        url="http://audit_trail_service/v1/entity/file",
+        status_code=500,
+        json={}
+    )
+
+    # the nodes are still created while the documents are indexed
+    httpx_mock.add_response(
+        method='POST',
+        url="http://neo4j_service/v1/neo4j/nodes/Folder/batch",
+        status_code=200,
+        json={}
+    )
+
+    def folder(geid):
+        return {
+            "global_entity_id": geid,
+            "folder_name": geid,
+            "folder_level": 1,
+            "folder_parent_geid": "112345abcdefg",
+            "folder_parent_name": "parentfolder",
+            "uploader": "admin",
+            "folder_relative_path": "/test/path",
+            "zone": "greenroom",
+            "project_code": "testproject",
+            "folder_tags": [],
+            "extra_labels": [],
+            "extra_attrs": {}
+        }
+
+    payload = {"payload": [folder("folder-1"), folder("folder-2")], "zone": "greenroom", "link_container": False}
+    response = test_client.post(f"/v1/folders/batch", json=payload)
+    # the folders exist, so the batch must not be reported as failed and retried
+    assert response.status_code == 200
+    assert response.json()["error_msg"] == "Error while creating folder node in elastic search"
+    res = response.json()["result"]
+    assert res["result"] == "success"
+    assert len(res["failed"]) == 1
+    assert res["failed"][0]["error_msg"] == "Error while creating folder node in elastic search"
+
+
 def test_v1_creating_folders_via_batch_failed_relation_creation_raise_exception_returns_500(test_client, httpx_mock,
                                                                                             mocker):
     # bulk node create via neo4j
-    mocker.patch('api.api_folders.folders.models.http_bulk_post_node')
+    mocker.patch('api.api_folders.folders.models.http_bulk_post_node', side_effect=async_return(mocker.MagicMock()))
 
     # bulk create links in neo4j
     mocker.patch('api.api_folders.folders.models.bulk_link_project',
@@ -213,7 +302,7 @@ def test_v1_creating_folders_via_batch_failed_relation_creation_returns_500(test
     )
 
     # bulk create links in neo4j
-    mocker.patch('api.api_folders.folders.models.bulk_link_project')
+    mocker.patch('api.api_folders.folders.models.bulk_link_project', side_effect=async_return(mocker.MagicMock()))
     mocker.patch.value = 500
 
     payload = {
@@ -241,7 +330,7 @@ def test_v1_creating_folders_via_batch_failed_relation_creation_returns_500(test
 
 
 def test_v1_creating_folders_via_batch_failed_node_query_returns_500(test_client, httpx_mock, mocker):
-    mocker.patch('api.api_folders.folders.models.http_bulk_post_node')
+    mocker.patch('api.api_folders.folders.models.http_bulk_post_node', side_effect=async_return(mocker.MagicMock()))
     mocker.patch.value = 500
 
     payload = {
@@ -283,7 +372,7 @@ def test_v1_creating_folders_entity_return_200(test_client, httpx_mock, mocker):
         json=[{"global_entity_id": "1234"}]
     )
 
-    mocker.patch('api.api_folders.folders.models.link_folder_parent')
+    mocker.patch('api.api_folders.folders.models.link_folder_parent', side_effect=async_return(mocker.MagicMock()))
 
     payload = {
         "global_entity_id": "112345abcdefg123",
@@ -304,6 +393,88 @@ def test_v1_creating_folders_entity_return_200(test_client, httpx_mock, mocker):
     assert response.status_code == 200
 
 
+def test_v1_creating_folders_entity_caches_routing_from_parent_return_200(test_client, httpx_mock, mocker):
+    parent_routing = [{"global_entity_id": "project-geid"}, {"global_entity_id": "112345abcdefg"}]
+    routing_cache.set("112345abcdefg", parent_routing)
+
+    httpx_mock.add_response(
+        method='POST',
+        url="http://audit_trail_service/v1/entity/file",
+        status_code=200,
+        json={}
+    )
+
+    httpx_mock.add_response(
+        method='POST',
+        url="http://neo4j_service/v1/neo4j/nodes/Folder",
+        status_code=200,
+        json=[{"global_entity_id": "112345abcdefg123", "name": "testfolder"}]
+    )
+
+    mocker.patch('api.api_folders.folders.models.link_folder_parent', side_effect=async_return(mocker.MagicMock()))
+
+    payload = {
+        "global_entity_id": "112345abcdefg123",
+        "folder_name": "testfolder",
+        "folder_level": 1,
+        "folder_parent_geid": "112345abcdefg",
+        "folder_parent_name": "parentfolder",
+        "uploader": "admin",
+        "folder_relative_path": "/test/path",
+        "project_code": "testproject",
+        "zone": "greenroom",
+        "link_container": True}
+
+    response = test_client.post(f"/v1/folders", json=payload)
+    assert response.status_code == 200
+    assert routing_cache.get("112345abcdefg123") == parent_routing + [
+        {"global_entity_id": "112345abcdefg123", "name": "testfolder"}]
+
+    stats = test_client.get("/v1/stats/cache").json()["result"]["routing"]
+    assert stats["size"] == 2
+    assert stats["memory_bytes"] > 0
+
+
+def test_v1_creating_folders_entity_links_known_nodes_without_lookup_return_200(test_client, httpx_mock):
+    node_ids.remember([{"global_entity_id": "112345abcdefg", "id": 7}])
+    httpx_mock.add_response(
+        method='POST',
+        url="http://audit_trail_service/v1/entity/file",
+        status_code=200,
+        json={}
+    )
+    httpx_mock.add_response(
+        method='POST',
+        url="http://neo4j_service/v1/neo4j/nodes/Folder",
+        status_code=200,
+        json=[{"id": 8, "global_entity_id": "112345abcdefg123"}]
+    )
+    # both ids are known, so the link is the only other neo4j call
+    httpx_mock.add_response(
+        method='POST',
+        url="http://neo4j_service/v1/neo4j/relations/own",
+        status_code=200,
+        json={}
+    )
+
+    payload = {
+        "global_entity_id": "112345abcdefg123",
+        "folder_name": "testfolder",
+        "folder_level": 1,
+        "folder_parent_geid": "112345abcdefg",
+        "folder_parent_name": "parentfolder",
+        "uploader": "admin",
+        "folder_relative_path": "/test/path",
+        "project_code": "testproject",
+        "zone": "greenroom",
+        "link_container": True}
+
+    response = test_client.post(f"/v1/folders", json=payload)
+    assert response.status_code == 200
+    relation = json.loads(httpx_mock.get_requests(url="http://neo4j_service/v1/neo4j/relations/own")[0].read())
+    assert relation == {"start_id": 7, "end_id": 8}
+
+
 def test_v1_create_folders_failed_elastic_search_return_500(test_client, httpx_mock):
     # create folder in elastic search
     httpx_mock.add_response(
@@ -348,7 +519,7 @@ def test_v1_creating_folders_entity_with_trashbin_root_return_200(test_client, h
         json=[{"global_entity_id": "1234"}]
     )
 
-    mocker.patch('api.api_folders.folders.models.link_project')
+    mocker.patch('api.api_folders.folders.models.link_project', side_effect=async_return(mocker.MagicMock()))
 
     payload = {
         "global_entity_id": "112345abcdefg123",
@@ -19,6 +19,10 @@
 # 
 
 import json
+
+from api.api_manifest.service import Manifest
+from api.api_manifest.service import validator_cache
+
 manifest_id = 1
 
 
@@ -51,6 +55,34 @@ def test_v1_update_manifest_name_with_manifest_id_return_200(test_client, create
     assert res["result"]["name"] == "unittest_manifest"
 
 
+def test_v1_get_manifest_is_cached_until_updated(test_client, create_db_manifest):
+    before = test_client.get(f"/v1/stats/cache").json()["result"]["manifest"]
+    response = test_client.get(f"/v1/manifest/{manifest_id}")
+    assert response.json()["result"]["name"] == "test123"
+    response = test_client.get(f"/v1/manifest/{manifest_id}")
+    assert response.json()["result"]["name"] == "test123"
+    after = test_client.get(f"/v1/stats/cache").json()["result"]["manifest"]
+    assert after["hits"] - before["hits"] == 1
+    assert after["misses"] - before["misses"] == 1
+
+    payload = {
+        "name": "unittest_manifest",
+    }
+    test_client.put(f"/v1/manifest/{manifest_id}", json=payload)
+    response = test_client.get(f"/v1/manifest/{manifest_id}")
+    assert response.json()["result"]["name"] == "unittest_manifest"
+
+
+def test_v1_list_manifests_reflects_deleted_attribute(request, test_client, create_db_manifest):
+    project_code = request.getfixturevalue('create_db_manifest')
+    response = test_client.get(f"/v1/manifests", params={"project_code": project_code})
+    assert len(response.json()["result"][0]["attributes"]) == 1
+
+    test_client.delete(f"/v1/attribute/1")
+    response = test_client.get(f"/v1/manifests", params={"project_code": project_code})
+    assert response.json()["result"][0]["attributes"] == []
+
+
 def test_v1_export_manifest_with_respective_attributes_return_200(test_client, create_db_manifest):
     payload = {
         "manifest_id": manifest_id,
@@ -132,9 +164,10 @@ def test_v1_get_manifest_by_geid_query_return_200(test_client, create_db_manifes
     # get dataset node with project_geid
     httpx_mock.add_response(
         method='POST',
-        url="http://neo4j_service/v1/neo4j/nodes/File/query",
+        url="http://neo4j_service/v1/neo4j/nodes/query/geids",
         status_code=200,
-        json=[{"code": "testproject", "manifest_id": 1}]
+        json={"result": [{"global_entity_id": "b38c26d0-1d51-44f1-9ab6-3175bd41ccc9-111111", "labels": ["File"],
+                          "code": "testproject", "manifest_id": 1, "attr_test123": "1"}]}
 
     )
 
@@ -145,6 +178,34 @@ def test_v1_get_manifest_by_geid_query_return_200(test_client, create_db_manifes
     assert response.status_code == 200
     res = response.json()
     assert len(res["result"]) == 1
+    attributes = res["result"]["b38c26d0-1d51-44f1-9ab6-3175bd41ccc9-111111"]
+    assert attributes == [{"id": 1, "name": "test123", "manifest_name": "test123", "value": "1", "type": "text",
+                           "optional": True, "manifest_id": 1}]
+
+
+def test_v1_query_manifests_for_many_geids_return_200(test_client, create_db_manifest, httpx_mock):
+    # every geid is resolved by a single bulk lookup
+    httpx_mock.add_response(
+        method='POST',
+        url="http://neo4j_service/v1/neo4j/nodes/query/geids",
+        status_code=200,
+        json={"result": [
+            {"global_entity_id": "geid-1", "labels": ["Greenroom", "File"], "manifest_id": 1},
+            {"global_entity_id": "geid-2", "labels": ["Core", "TrashFile"], "manifest_id": 2},
+            {"global_entity_id": "geid-3", "labels": ["Greenroom", "File"]},
+        ]}
+    )
+
+    payload = {
+        "geid_list": ["geid-1", "geid-2", "geid-3", "geid-4"],
+    }
+    response = test_client.post(f"/v1/manifest/query", json=payload)
+    assert response.status_code == 200
+    res = response.json()["result"]
+    assert [attribute["manifest_name"] for attribute in res["geid-1"]] == ["test123"]
+    assert [attribute["manifest_name"] for attribute in res["geid-2"]] == ["test1234"]
+    assert res["geid-3"] == {}
+    assert res["geid-4"] == {}
 
 
 def test_v1_get_manifest_list_with_missing_project_code_return_422(test_client):
@@ -338,3 +399,16 @@ def test_v1_cannot_create_manifest_due_to_missing_attribute_key_return_400(test_
     assert response.status_code == 400
     res = response.json()
     assert res["result"] == f"Missing required field optional"
+
+
+def test_manifest_validator_read_before_invalidate_is_not_cached(mocker):
+    manifest = {"id": 99, "name": "racing", "attributes": []}
+
+    def read_then_write(id):
+        # a write lands between reading the manifest and storing its validator
+        Manifest.invalidate(manifest_id=id)
+        return manifest
+
+    mocker.patch.object(Manifest, "get_by_id", side_effect=read_then_write)
+    assert Manifest.get_validator(99).manifest_name == "racing"
+    assert validator_cache.get("99") is None
@@ -33,3 +33,10 @@ def test_v1_get_system_metrics_with_invalid_date_return_500(test_client, create_
     res = response.json()
     assert response.status_code == 500
     assert res["error_msg"] == "Retrieval of metrics failed: Failure to query metrics from database table"
+
+
+def test_v1_get_cache_stats_return_200(test_client):
+    response = test_client.get("/v1/stats/cache")
+    assert response.status_code == 200
+    res = response.json()
+    assert {"hits", "misses", "hit_ratio"} <= set(res["result"]["manifest"])